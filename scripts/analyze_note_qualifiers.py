@@ -8,19 +8,28 @@ Usage:
 Output:
     - qualifier_analysis.csv: Detailed breakdown of multi-word patterns
     - Console: Summary statistics and recommendations
+    - Console: Cleaned note frequencies, if etl_v5.py has saved a note matrix
 """
 
+import os
 import pandas as pd
 import re
 from collections import Counter
 from typing import List, Set
 
+from catalog_cache import load_cached_frame
+
 # Configuration
 CSV_PATH = '../data/dataset.csv'
+NOTE_MATRIX_PATH = '../data/cache/note_matrix.npz'
 DELIMITER = ';'
+NOTE_COLUMNS = ['Top Notes', 'Middle Notes', 'Base Notes']
 
 def load_data():
-    """Load dataset with proper encoding."""
+    """Load dataset with proper encoding (from the etl_v5.py Parquet cache when it is fresh)."""
+    df = load_cached_frame(CSV_PATH, 'raw', columns=NOTE_COLUMNS)
+    if df is not None:
+        return df
     return pd.read_csv(CSV_PATH, delimiter=DELIMITER, encoding='utf-8')
 
 def extract_items(text: str) -> List[str]:
@@ -85,9 +94,30 @@ def analyze_multiword_items(items: List[str]) -> dict:
     
     return results
 
+def summarize_note_matrix(path: str = NOTE_MATRIX_PATH, top: int = 25):
+    """Print frequencies of cleaned notes from the ETL's incidence matrix (no CSV re-parse)."""
+    from note_matrix import NoteIncidenceMatrix
+
+    matrix = NoteIncidenceMatrix.load(path)
+    doc_freq = matrix.document_frequency()
+    idf = matrix.idf()
+
+    print("\n" + "="*80)
+    print("CLEANED NOTES (from ETL note matrix)")
+    print("="*80)
+    print(f"Perfumes: {matrix.shape[0]}, distinct cleaned notes: {matrix.shape[1]}")
+
+    order = doc_freq.argsort()[::-1]
+    print(f"\nTop {top} most common cleaned notes (perfumes containing the note):")
+    for i in order[:top]:
+        print(f"  '{matrix.vocabulary[i]}': {doc_freq[i]} (idf {idf[i]:.2f})")
+
+    singletons = int((doc_freq == 1).sum())
+    print(f"\nNotes used by a single perfume: {singletons} (candidates for qualifier leftovers or typos)")
+
 def main():
     print("Loading dataset...")
-    df = pd.read_csv(CSV_PATH, delimiter=DELIMITER, encoding='utf-8')
+    df = load_data()
     
     print(f"Total rows: {len(df)}")
     
@@ -97,7 +127,7 @@ def main():
     print("="*80)
     
     all_notes = []
-    for column in ['Top Notes', 'Middle Notes', 'Base Notes']:
+    for column in NOTE_COLUMNS:
         column_notes = []
         for idx, row in df.iterrows():
             notes = extract_items(row[column])
@@ -180,5 +210,8 @@ def main():
     for word in sorted(high_freq_suffixes):
         print(f"  - {word}")
 
+    if os.path.exists(NOTE_MATRIX_PATH):
+        summarize_note_matrix()
+
 if __name__ == '__main__':
     main()
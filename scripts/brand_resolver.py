@@ -0,0 +1,106 @@
+"""
+Fuzzy matching of incoming brand spellings to existing brands.
+
+The resolver keeps every known brand (and every brand_aliases entry) in
+memory, keyed by its unaccented form for exact matches and in a trigram
+inverted index for fuzzy ones. Trigrams and similarity follow pg_trgm, so a
+score here is what `similarity(a, b)` returns in Postgres for the same keys.
+
+    resolver = BrandResolver()
+    resolver.add_brand('maison francis kurkdjian')
+    resolver.lookup('Maison Francis Kurkdijan')   # BrandMatch('maison francis kurkdjian', 0.7241)
+
+Brands are identified by their normalize_text form, the key ETLPipelineV5
+uses in db_cache['brands'].
+"""
+
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, List, NamedTuple, Optional, Set
+
+# At or above: the spelling is taken as an alias of the existing brand
+AUTO_MATCH_THRESHOLD = 0.8
+# Between this and AUTO_MATCH_THRESHOLD: a new brand is created and queued for review
+REVIEW_THRESHOLD = 0.5
+
+
+class BrandMatch(NamedTuple):
+    brand: str
+    similarity: float
+
+
+def brand_key(text: str) -> str:
+    """Lowercase, unaccented, alphanumeric words; the brand_aliases.alias_norm form."""
+    if not isinstance(text, str):
+        return ''
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def trigrams(key: str) -> Set[str]:
+    """pg_trgm trigrams: each word padded with two leading spaces and one trailing space."""
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class BrandResolver:
+    def __init__(self, threshold: float = AUTO_MATCH_THRESHOLD, review_threshold: float = REVIEW_THRESHOLD):
+        self.threshold = threshold
+        self.review_threshold = review_threshold
+        # Unaccented key -> brand, for brand names and their aliases
+        self._exact: Dict[str, str] = {}
+        self._brands: List[str] = []
+        self._sizes: List[int] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self._brands)
+
+    def add_brand(self, brand: str):
+        key = brand_key(brand)
+        if not key or key in self._exact:
+            return
+        self._exact[key] = brand
+        grams = trigrams(key)
+        position = len(self._brands)
+        self._brands.append(brand)
+        self._sizes.append(len(grams))
+        for gram in grams:
+            self._postings[gram].append(position)
+
+    def add_alias(self, alias: str, brand: str):
+        """Another spelling of `brand`; matched exactly, not indexed for fuzzy search."""
+        key = brand_key(alias)
+        if key:
+            self._exact.setdefault(key, brand)
+
+    def lookup(self, value: str) -> Optional[BrandMatch]:
+        """Best known brand for `value` with similarity >= review_threshold, else None."""
+        key = brand_key(value)
+        if not key:
+            return None
+        exact = self._exact.get(key)
+        if exact is not None:
+            return BrandMatch(exact, 1.0)
+
+        grams = trigrams(key)
+        shared = Counter(chain.from_iterable(self._postings.get(gram, ()) for gram in grams))
+
+        best, best_score = None, 0.0
+        for position, common in shared.items():
+            score = common / (len(grams) + self._sizes[position] - common)
+            # Ties go to the brand indexed first
+            if score > best_score or (score == best_score and best is not None and position < best):
+                best, best_score = position, score
+        if best is None or best_score < self.review_threshold:
+            return None
+        return BrandMatch(self._brands[best], round(best_score, 4))
+
+    def is_alias(self, match: Optional[BrandMatch]) -> bool:
+        return match is not None and match.similarity >= self.threshold
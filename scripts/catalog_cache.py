@@ -0,0 +1,150 @@
+"""
+Parquet cache of the parsed catalog, keyed by the SHA-256 of the source CSV.
+
+etl_v5.py writes two stages next to the CSV:
+
+    raw     every CSV row, typed, with fingerprint columns (before deduplication)
+    scored  the deduplicated catalog with parsed note pyramids and xsolve scores
+
+Analysis scripts call `load_cached_frame` first and only fall back to parsing
+the semicolon CSV when no artifact matches the current file contents.
+
+Settings that change an artifact's contents without changing the CSV (the
+scored stage depends on the dedup strategy) are stored in its Parquet
+metadata; loading with different `meta` is a miss.
+
+    df = load_cached_frame('../data/dataset.csv', 'raw')
+    if df is None:
+        df = pd.read_csv('../data/dataset.csv', sep=';', decimal=',')
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Optional, Sequence
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('raw', 'scored')
+# Bump when cleaning or fingerprinting changes, so old artifacts stop matching
+CACHE_VERSION = 3
+DIGEST_INDEX = 'digests.json'
+META_KEY = b'catalog_cache'
+HASH_CHUNK = 1 << 20
+
+
+def cache_dir(csv_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), 'cache')
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def csv_digest(csv_path: str) -> str:
+    """SHA-256 of the CSV; remembered per (size, mtime) so unchanged files are not re-hashed."""
+    st = os.stat(csv_path)
+    index_path = os.path.join(cache_dir(csv_path), DIGEST_INDEX)
+    key = os.path.abspath(csv_path)
+
+    index = {}
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, encoding='utf-8') as f:
+                index = json.load(f)
+        except ValueError:
+            index = {}
+    entry = index.get(key)
+    if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+        return entry['sha256']
+
+    digest = _file_sha256(csv_path)
+    index[key] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': digest}
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+    os.replace(index_path + '.tmp', index_path)
+    return digest
+
+
+def _stage_prefix(csv_path: str, stage: str) -> str:
+    if stage not in STAGES:
+        raise ValueError(f"Unknown cache stage {stage!r}, expected one of {STAGES}")
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir(csv_path), f"{stem}.{stage}.v{CACHE_VERSION}.")
+
+
+def cache_path(csv_path: str, stage: str, digest: Optional[str] = None) -> str:
+    digest = digest or csv_digest(csv_path)
+    return f"{_stage_prefix(csv_path, stage)}{digest[:16]}.parquet"
+
+
+def save_cached_frame(df: pd.DataFrame, csv_path: str, stage: str,
+                      meta: Optional[Dict[str, str]] = None) -> Optional[str]:
+    """Write `df` as the `stage` artifact for the current CSV (tagged with `meta`). Returns the path, or None if unavailable."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = cache_path(csv_path, stage)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(df)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               META_KEY: json.dumps(meta or {}).encode()})
+        pq.write_table(table, path + '.tmp')
+        os.replace(path + '.tmp', path)
+    except ImportError as e:
+        logger.warning(f"Catalog cache disabled ({e})")
+        return None
+
+    # Artifacts of earlier CSV (or cache format) versions can never match again
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    for old in glob.glob(os.path.join(cache_dir(csv_path), f"{stem}.{stage}.v*.parquet")):
+        if old != path:
+            os.remove(old)
+    logger.info(f"Cached {stage} catalog ({len(df)} rows) at {path}")
+    return path
+
+
+def load_cached_frame(csv_path: str, stage: str, columns: Optional[Sequence[str]] = None,
+                      meta: Optional[Dict[str, str]] = None) -> Optional[pd.DataFrame]:
+    """The `stage` artifact if it matches the CSV's current contents (and has `columns` and `meta`), else None."""
+    if not os.path.exists(csv_path):
+        return None
+    path = cache_path(csv_path, stage)
+    if not os.path.exists(path):
+        return None
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+
+    schema = pq.read_schema(path)
+    if columns is not None and not set(columns) <= set(schema.names):
+        return None
+    stored = json.loads((schema.metadata or {}).get(META_KEY, b'{}'))
+    if any(stored.get(key) != value for key, value in (meta or {}).items()):
+        logger.info(f"Cached {stage} catalog was built with {stored}, not {meta}; ignoring it")
+        return None
+
+    table = pq.read_table(path, columns=list(columns) if columns is not None else None)
+    df = table.to_pandas()
+    # List columns come back as numpy arrays; the pipeline (and JSON encoding) expects lists
+    for field in table.schema:
+        if field.name in df.columns and str(field.type).startswith(('list', 'large_list')):
+            df[field.name] = [list(v) if v is not None else [] for v in df[field.name]]
+    # Computed string columns (fingerprints, slugs) are object dtype in the pipeline; keep them that way
+    for column in (table.schema.pandas_metadata or {}).get('columns', []):
+        name = column.get('name')
+        if name in df.columns and column.get('numpy_type') == 'object' and df[name].dtype != object:
+            df[name] = df[name].astype(object)
+    logger.info(f"Loaded {stage} catalog ({len(df)} rows) from {path}")
+    return df
@@ -2,15 +2,9 @@ import pandas as pd
 import hashlib
 import re
 
-# Load
-df = pd.read_csv('e:/fragrance-game/fragrance-webapp/data/dataset.csv', sep=';', decimal=',')
-print(f'Total CSV rows: {len(df)}')
+from catalog_cache import load_cached_frame
 
-# Clean
-df['Release Year'] = pd.to_numeric(df['Release Year'], errors='coerce').fillna(0).astype(int)
-df['Brand'] = df['Brand'].fillna('Unknown')
-df['Name'] = df['Name'].fillna('Unknown')
-df['Concentration'] = df['Concentration'].fillna('Unknown')
+CSV_PATH = 'e:/fragrance-game/fragrance-webapp/data/dataset.csv'
 
 # Fingerprint
 def norm(x):
@@ -21,7 +15,23 @@ def fp(b, n, c, y):
     year_str = str(int(y)) if y > 0 else '0'
     return hashlib.sha256(f'{norm(b)}|{norm(n)}|{norm(c)}|{year_str}'.encode()).hexdigest()
 
-df['fp'] = df.apply(lambda x: fp(x['Brand'], x['Name'], x['Concentration'], x['Release Year']), axis=1)
+# The etl_v5.py cache already holds the cleaned columns and fingerprints for this exact CSV
+df = load_cached_frame(CSV_PATH, 'raw', columns=['Brand', 'Rating Count', 'fingerprint_strict'])
+if df is not None:
+    print(f'Total CSV rows: {len(df)} (catalog cache)')
+    df['fp'] = df['fingerprint_strict']
+else:
+    # Load
+    df = pd.read_csv(CSV_PATH, sep=';', decimal=',')
+    print(f'Total CSV rows: {len(df)}')
+
+    # Clean
+    df['Release Year'] = pd.to_numeric(df['Release Year'], errors='coerce').fillna(0).astype(int)
+    df['Brand'] = df['Brand'].fillna('Unknown')
+    df['Name'] = df['Name'].fillna('Unknown')
+    df['Concentration'] = df['Concentration'].fillna('Unknown')
+
+    df['fp'] = df.apply(lambda x: fp(x['Brand'], x['Name'], x['Concentration'], x['Release Year']), axis=1)
 
 # Dedup
 df_dedup = df.sort_values('Rating Count', ascending=False).drop_duplicates('fp', keep='first')
@@ -0,0 +1,141 @@
+"""
+Concurrent PostgREST upload for etl_v5.py.
+
+A producer builds record batches and puts them on a bounded queue while N
+workers upsert them over one shared httpx.AsyncClient. The queue bound is the
+backpressure: record building pauses once `queue_size` batches are waiting.
+
+Usage:
+    uploader = AsyncBatchUploader(SUPABASE_URL, SUPABASE_KEY, concurrency=8)
+    stats = uploader.run(batches)   # batches: any iterable of lists of records
+    stats.summary()
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import httpx
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PERFUME_CONFLICT_COLUMNS = 'brand_id,name,concentration_id,release_year'
+
+
+@dataclass
+class UploadStats:
+    batches: int = 0
+    rows: int = 0
+    failed_batches: int = 0
+    failed_rows: int = 0
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        lat = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'failed_batches': self.failed_batches,
+            'failed_rows': self.failed_rows,
+            'elapsed_s': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows / self.elapsed, 1) if self.elapsed else 0.0,
+            'latency_p50_ms': round(float(np.percentile(lat, 50)) * 1000, 1),
+            'latency_p95_ms': round(float(np.percentile(lat, 95)) * 1000, 1),
+            'latency_max_ms': round(float(lat.max()) * 1000, 1),
+        }
+
+
+class AsyncBatchUploader:
+    def __init__(self, base_url: str, api_key: str, table: str = 'perfumes',
+                 on_conflict: str = PERFUME_CONFLICT_COLUMNS, concurrency: int = 4,
+                 queue_size: Optional[int] = None, timeout: float = 60.0,
+                 on_failed_batch: Optional[Callable[[List[Dict], Exception], None]] = None,
+                 on_batch_done: Optional[Callable[[int, int], None]] = None):
+        self.url = f"{base_url.rstrip('/')}/rest/v1/{table}"
+        self.params = {'on_conflict': on_conflict}
+        self.headers = {
+            'apikey': api_key,
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json',
+            'Prefer': 'resolution=merge-duplicates,return=minimal',
+        }
+        self.concurrency = max(1, concurrency)
+        self.queue_size = queue_size or 2 * self.concurrency
+        self.timeout = timeout
+        # Called (in a thread) with the batch and the error when an upload fails
+        self.on_failed_batch = on_failed_batch
+        # Called with (batch sequence number, rows) once a batch is written or handed off as failed.
+        # Batches finish out of order; the sequence number lets callers track the finished prefix.
+        self.on_batch_done = on_batch_done
+
+    async def _upsert(self, client: httpx.AsyncClient, batch: List[Dict]):
+        res = await client.post(self.url, params=self.params, json=batch, headers=self.headers)
+        res.raise_for_status()
+
+    async def _worker(self, client: httpx.AsyncClient, queue: asyncio.Queue, stats: UploadStats):
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                seq, batch = item
+                start = time.perf_counter()
+                try:
+                    await self._upsert(client, batch)
+                    stats.latencies.append(time.perf_counter() - start)
+                    stats.batches += 1
+                    stats.rows += len(batch)
+                except Exception as e:
+                    logger.error(f"Batch upsert failed: {e}")
+                    stats.failed_batches += 1
+                    stats.failed_rows += len(batch)
+                    if self.on_failed_batch is not None:
+                        await asyncio.to_thread(self.on_failed_batch, batch, e)
+                if self.on_batch_done is not None:
+                    self.on_batch_done(seq, len(batch))
+            finally:
+                queue.task_done()
+
+    async def upload(self, batches: Iterable[List[Dict]]) -> UploadStats:
+        stats = UploadStats()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        iterator: Iterator[List[Dict]] = iter(batches)
+        start = time.perf_counter()
+
+        limits = httpx.Limits(max_connections=self.concurrency)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits) as client:
+            workers = [asyncio.create_task(self._worker(client, queue, stats)) for _ in range(self.concurrency)]
+            try:
+                seq = 0
+                while True:
+                    # Record building is CPU work; run it off the loop so uploads keep flowing
+                    batch = await asyncio.to_thread(next, iterator, None)
+                    if batch is None:
+                        break
+                    await queue.put((seq, batch))
+                    seq += 1
+            finally:
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+    def run(self, batches: Iterable[List[Dict]]) -> UploadStats:
+        return asyncio.run(self.upload(batches))
+
+
+def batched(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,126 @@
+"""
+Local checkpoints for resumable etl_v5.py runs.
+
+Each run (keyed by its import_runs id) gets a directory holding a snapshot of
+the pipeline frame and a small state file with the last completed stage and
+the number of perfume records already committed by the sync.
+
+    etl_checkpoints/<run_id>/frame.pkl
+    etl_checkpoints/<run_id>/state.json
+
+The directory is removed once the run completes; only failed or interrupted
+runs keep theirs for --resume.
+"""
+
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_ROOT = os.path.join(os.path.dirname(__file__), 'etl_checkpoints')
+
+# In pipeline order
+STAGES = ['started', 'scored', 'resolved', 'synced', 'linked', 'staged']
+
+
+class RunCheckpoint:
+    def __init__(self, run_id: str, root: str = CHECKPOINT_ROOT, state: Optional[Dict[str, Any]] = None):
+        self.run_id = run_id
+        self.dir = os.path.join(root, run_id)
+        self.state = state or {'run_id': run_id, 'stage': 'started', 'batch_offset': 0}
+
+    @classmethod
+    def create(cls, run_id: str, root: str = CHECKPOINT_ROOT, **info) -> 'RunCheckpoint':
+        checkpoint = cls(run_id, root)
+        checkpoint.state.update(info)
+        checkpoint.state['created_at'] = datetime.now(timezone.utc).isoformat()
+        checkpoint._write_state()
+        return checkpoint
+
+    @classmethod
+    def load(cls, run_id: str, root: str = CHECKPOINT_ROOT) -> 'RunCheckpoint':
+        path = os.path.join(root, run_id, 'state.json')
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No checkpoint for run {run_id} in {root}")
+        with open(path, encoding='utf-8') as f:
+            return cls(run_id, root, state=json.load(f))
+
+    @property
+    def stage(self) -> str:
+        return self.state['stage']
+
+    @property
+    def batch_offset(self) -> int:
+        return self.state['batch_offset']
+
+    def reached(self, stage: str) -> bool:
+        return STAGES.index(self.stage) >= STAGES.index(stage)
+
+    def _write_state(self):
+        os.makedirs(self.dir, exist_ok=True)
+        path = os.path.join(self.dir, 'state.json')
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        # Atomic on POSIX and Windows, so a crash never leaves a torn state file
+        os.replace(tmp, path)
+
+    def advance(self, stage: str):
+        self.state['stage'] = stage
+        self.state['updated_at'] = datetime.now(timezone.utc).isoformat()
+        self._write_state()
+        logger.info(f"Checkpoint {self.run_id}: stage '{stage}'")
+
+    def save_frame(self, df: pd.DataFrame, stage: str):
+        """Snapshot the frame, then record the stage (the snapshot is complete before the stage says so)."""
+        os.makedirs(self.dir, exist_ok=True)
+        path = os.path.join(self.dir, 'frame.pkl')
+        df.to_pickle(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self.advance(stage)
+
+    def load_frame(self) -> pd.DataFrame:
+        return pd.read_pickle(os.path.join(self.dir, 'frame.pkl'))
+
+    def discard(self):
+        """Remove the run's directory (frame snapshot and state) once nothing needs to resume it."""
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def commit_offset(self, offset: int):
+        """Number of perfume records (in sync order) that are safely written."""
+        self.state['batch_offset'] = offset
+        self._write_state()
+
+
+class BatchProgress:
+    """Committed prefix of the record stream, persisted to a checkpoint.
+
+    Sequential backends call `advance` after each batch. The async backend
+    finishes batches out of order, so it reports them with `batch_done` and
+    the offset only moves once every earlier batch is done as well.
+    """
+
+    def __init__(self, checkpoint: RunCheckpoint, start: int = 0):
+        self.checkpoint = checkpoint
+        self.offset = start
+        self._next_seq = 0
+        self._finished: Dict[int, int] = {}
+
+    def advance(self, rows: int):
+        self.offset += rows
+        self.checkpoint.commit_offset(self.offset)
+
+    def batch_done(self, seq: int, rows: int):
+        self._finished[seq] = rows
+        moved = 0
+        while self._next_seq in self._finished:
+            moved += self._finished.pop(self._next_seq)
+            self._next_seq += 1
+        if moved:
+            self.advance(moved)
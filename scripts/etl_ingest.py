@@ -0,0 +1,115 @@
+"""
+Declared schema for the semicolon catalog export and a memory-lean reader.
+
+Only the columns the pipeline uses are parsed (`usecols`). Low-cardinality
+identity columns become `category` and numerics get fixed-width nullable
+types, instead of every column being inferred as Python objects.
+
+    df = read_catalog_csv('../data/dataset.csv')                  # C engine
+    df = read_catalog_csv('../data/dataset.csv', engine='pyarrow')  # multithreaded
+    logger.info(f"Peak RSS: {peak_rss_mb():.0f} MB")
+"""
+
+import logging
+import resource
+import sys
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CSV_ENGINES = ['c', 'pyarrow']
+
+# Repeated a few thousand times at most across the catalog
+CATEGORY_COLUMNS = ['Brand', 'Concentration', 'Manufacturer', 'Gender']
+NUMERIC_COLUMNS = {
+    'Release Year': 'Int32',
+    'Rating Count': 'Int32',
+    'Rating Value': 'Float32',
+}
+# Free text, kept with the default string dtype. Image URL is only used by
+# gen_exclusion_report.py, which reads it from the raw cache; the other
+# display-only columns are never read.
+TEXT_COLUMNS = [
+    'Name', 'URL', 'Image URL', 'Top Notes', 'Middle Notes', 'Base Notes', 'Perfumers', 'Main Accords',
+    'Is Uncertain', 'Is Linear',
+]
+SCHEMA_COLUMNS = CATEGORY_COLUMNS + list(NUMERIC_COLUMNS) + TEXT_COLUMNS
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _header(path: str, sep: str) -> List[str]:
+    return list(pd.read_csv(path, sep=sep, nrows=0).columns)
+
+
+def _to_declared(values: pd.Series, dtype: str) -> pd.Series:
+    """Coerce a parsed column to its declared nullable type; unparseable entries become missing."""
+    if values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+        text = values.astype(object).where(values.notna(), None)
+        if dtype.startswith('Float'):
+            text = text.str.replace(',', '.', regex=False)
+        values = pd.to_numeric(text, errors='coerce')
+    if dtype.startswith('Int'):
+        # Fractional years or counts are truncated, as the previous astype(int) cleaning did,
+        # so their fingerprints do not change
+        values = np.trunc(values)
+    return values.astype(dtype)
+
+
+def _read_options(path: str, engine: str, sep: str) -> Dict:
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV engine {engine!r}, expected one of {CSV_ENGINES}")
+
+    # Headers may carry stray spaces; project and type by the raw names
+    raw_names: Dict[str, str] = {raw: raw.strip() for raw in _header(path, sep) if raw.strip() in SCHEMA_COLUMNS}
+    dtypes = {raw: 'category' for raw, name in raw_names.items() if name in CATEGORY_COLUMNS}
+
+    options = {'sep': sep, 'usecols': list(raw_names), 'engine': engine}
+    if engine == 'c':
+        # A native float parse fails the whole read on one stray token; read the
+        # decimal-comma ratings as text and let _to_declared coerce them
+        dtypes.update({raw: str for raw, name in raw_names.items() if name == 'Rating Value'})
+    else:
+        # With a dtype mapping, pandas casts the remaining pyarrow columns to their
+        # inferred type, which fails for integer columns with nulls; read numerics
+        # as text instead (this also covers the missing decimal option)
+        dtypes.update({raw: str for raw, name in raw_names.items() if name in NUMERIC_COLUMNS})
+    options['dtype'] = dtypes
+    return options
+
+
+def _apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = [c.strip() for c in df.columns]
+    for name, dtype in NUMERIC_COLUMNS.items():
+        if name in df.columns:
+            df[name] = _to_declared(df[name], dtype)
+    return df
+
+
+def read_catalog_csv(path: str, engine: str = 'c', sep: str = ';') -> pd.DataFrame:
+    """Read the schema columns of the export with declared dtypes; column names come back stripped.
+
+    Numeric columns are parsed natively by the engine and then converted to
+    their declared type. Stray text (a year like "n/a") becomes missing, as
+    with the previous to_numeric(errors='coerce') cleaning.
+    """
+    return _apply_schema(pd.read_csv(path, **_read_options(path, engine, sep)))
+
+
+def iter_catalog_csv(path: str, chunksize: int, sep: str = ';') -> Iterator[pd.DataFrame]:
+    """`read_catalog_csv` in chunks of `chunksize` rows (C engine; pyarrow cannot stream).
+
+    Chunk indexes continue across chunks, so `chunk.index` is the row offset in the file.
+    Categories are per chunk.
+    """
+    with pd.read_csv(path, chunksize=chunksize, **_read_options(path, 'c', sep)) as reader:
+        for chunk in reader:
+            yield _apply_schema(chunk)
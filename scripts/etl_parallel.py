@@ -0,0 +1,130 @@
+"""
+Multi-process execution of the per-row stages of etl_v5.py.
+
+The input columns of a stage are written once to an Arrow IPC file; every
+worker memory-maps it and materializes only its own row range, so the frame is
+never pickled to the pool. Shards are contiguous row ranges and results are
+concatenated in shard order, so the output is identical to the serial run no
+matter which worker finishes first.
+
+    stages = ParallelStages(workers=4)
+    columns = stages.note_pyramids(df)          # {'top_notes': [...], ..., 'note_count': [...]}
+    records = list(stages.perfume_records(df))
+"""
+
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Raw text in, cleaned lists out (see ETLPipelineV5.extract_note_pyramids)
+PYRAMID_INPUT_COLUMNS = ['Top Notes', 'Middle Notes', 'Base Notes', 'Perfumers', 'Main Accords']
+PYRAMID_OUTPUT_COLUMNS = ['top_notes', 'middle_notes', 'base_notes', 'perfumers', 'notes_list', 'note_count']
+# Everything ETLPipelineV5._build_perfume_record reads
+RECORD_COLUMNS = [
+    'fingerprint_strict', 'fingerprint_loose', 'Name', 'brand_id', 'concentration_id', 'manufacturer_id',
+    'Release Year', 'Gender', 'top_notes', 'middle_notes', 'base_notes', 'perfumers',
+    'xsolve_score', 'is_active', 'Is Uncertain', 'Is Linear', 'source_record_slug',
+]
+# More shards than workers evens out shards that happen to be slow
+SHARDS_PER_WORKER = 4
+
+_worker_pipeline = None
+
+
+def _pipeline():
+    """One serial pipeline per worker process, used only for its row-level methods."""
+    global _worker_pipeline
+    if _worker_pipeline is None:
+        from etl_v5 import ETLPipelineV5
+        _worker_pipeline = ETLPipelineV5('')
+    return _worker_pipeline
+
+
+def _read_shard(path: str, start: int, stop: int) -> pd.DataFrame:
+    import pyarrow as pa
+
+    # Zero-copy view of the mapped file; only this slice is converted
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all().slice(start, stop - start)
+    df = table.to_pandas()
+    for field in table.schema:
+        if str(field.type).startswith(('list', 'large_list')):
+            df[field.name] = [list(v) if v is not None else [] for v in df[field.name]]
+    return df
+
+
+def _pyramid_shard(path: str, start: int, stop: int) -> Dict[str, List[Any]]:
+    pipeline = _pipeline()
+    pipeline.df = _read_shard(path, start, stop)
+    try:
+        pipeline.extract_note_pyramids()
+        return {c: pipeline.df[c].tolist() for c in PYRAMID_OUTPUT_COLUMNS}
+    finally:
+        pipeline.df = None
+
+
+def _record_shard(path: str, start: int, stop: int) -> List[Dict[str, Any]]:
+    pipeline = _pipeline()
+    records = []
+    for _, row in _read_shard(path, start, stop).iterrows():
+        record = pipeline._build_perfume_record(row)
+        if record is not None:
+            records.append(record)
+    return records
+
+
+class ParallelStages:
+    def __init__(self, workers: int, tmp_dir: Optional[str] = None):
+        self.workers = workers
+        self.tmp_dir = tmp_dir
+
+    def _shards(self, n_rows: int) -> List[Tuple[int, int]]:
+        n_shards = max(1, min(n_rows, self.workers * SHARDS_PER_WORKER))
+        bounds = [n_rows * i // n_shards for i in range(n_shards + 1)]
+        return [(bounds[i], bounds[i + 1]) for i in range(n_shards)]
+
+    def _export(self, df: pd.DataFrame, columns: Sequence[str]) -> str:
+        import pyarrow as pa
+
+        frame = df[[c for c in columns if c in df.columns]].reset_index(drop=True)
+        for column in frame.columns:
+            # Arrow needs one type per column; the flag columns can mix bools and text
+            if frame[column].dtype == object and frame[column].map(type).nunique() > 1 \
+                    and not frame[column].map(lambda v: isinstance(v, list)).any():
+                frame[column] = frame[column].where(frame[column].isna(), frame[column].astype(str))
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+
+        fd, path = tempfile.mkstemp(suffix='.arrow', dir=self.tmp_dir)
+        os.close(fd)
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        return path
+
+    def _map(self, func, df: pd.DataFrame, columns: Sequence[str]) -> Iterator[Any]:
+        """Run `func(path, start, stop)` over the shards, yielding results in shard order."""
+        path = self._export(df, columns)
+        # fork keeps worker start-up cheap and inherits the parent's configuration
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+                shards = self._shards(len(df))
+                yield from pool.map(func, [path] * len(shards), *zip(*shards))
+        finally:
+            os.remove(path)
+
+    def note_pyramids(self, df: pd.DataFrame) -> Dict[str, List[Any]]:
+        merged: Dict[str, List[Any]] = {c: [] for c in PYRAMID_OUTPUT_COLUMNS}
+        for result in self._map(_pyramid_shard, df, PYRAMID_INPUT_COLUMNS):
+            for column, values in result.items():
+                merged[column].extend(values)
+        return merged
+
+    def perfume_records(self, df: pd.DataFrame) -> Iterator[Dict[str, Any]]:
+        for records in self._map(_record_shard, df, RECORD_COLUMNS):
+            yield from records
@@ -0,0 +1,208 @@
+"""
+Direct Postgres backend for etl_v5.py.
+
+Streams prepared perfume records into a temp table with COPY FROM STDIN and
+merges them into `perfumes` with a single INSERT ... ON CONFLICT, instead of
+one PostgREST round-trip per 100 rows.
+
+Connection settings follow apply_migration_m5.py (SUPABASE_DB_HOST and
+SUPABASE_DB_PASSWORD); a full DSN in SUPABASE_DB_URL takes precedence, which
+is the easy way to point at a local Postgres.
+"""
+
+import io
+import os
+import logging
+from typing import Any, Dict, Iterable, List, Sequence
+
+import psycopg2
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# Columns written by ETLPipelineV5, with the staging type for each
+PERFUME_COLUMNS = [
+    ('fingerprint_strict', 'text'),
+    ('fingerprint_loose', 'text'),
+    ('name', 'text'),
+    ('brand_id', 'uuid'),
+    ('concentration_id', 'uuid'),
+    ('manufacturer_id', 'uuid'),
+    ('release_year', 'int'),
+    ('gender', 'text'),
+    ('top_notes', 'text[]'),
+    ('middle_notes', 'text[]'),
+    ('base_notes', 'text[]'),
+    ('perfumers', 'text[]'),
+    ('xsolve_score', 'float8'),
+    ('xsolve_model_version', 'int'),
+    ('is_active', 'boolean'),
+    ('is_uncertain', 'boolean'),
+    ('is_linear', 'boolean'),
+    ('source_record_slug', 'text'),
+]
+
+# UNIQUE NULLS NOT DISTINCT (brand_id, name, concentration_id, release_year)
+CONFLICT_COLUMNS = ['brand_id', 'name', 'concentration_id', 'release_year']
+
+
+def connect_from_env():
+    """Open a psycopg2 connection using the same env vars as the migration scripts."""
+    load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../.env'))
+    load_dotenv('.env.local')
+
+    dsn = os.getenv('SUPABASE_DB_URL')
+    if dsn:
+        return psycopg2.connect(dsn)
+
+    password = os.getenv('SUPABASE_DB_PASSWORD')
+    if not password:
+        raise RuntimeError("Missing SUPABASE_DB_URL or SUPABASE_DB_PASSWORD for the copy backend")
+
+    return psycopg2.connect(
+        host=os.getenv('SUPABASE_DB_HOST'),
+        database='postgres',
+        user='postgres',
+        password=password,
+        port=os.getenv('SUPABASE_DB_PORT', '5432'),
+    )
+
+
+def _pg_array(items: Sequence[Any]) -> str:
+    """Postgres array literal for a list of strings."""
+    quoted = []
+    for item in items:
+        s = str(item).replace('\\', '\\\\').replace('"', '\\"')
+        quoted.append(f'"{s}"')
+    return '{' + ','.join(quoted) + '}'
+
+
+def copy_text_value(value: Any) -> str:
+    """Encode one value for COPY ... (FORMAT text)."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (list, tuple)):
+        value = _pg_array(value)
+    s = str(value)
+    return s.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def encode_copy_rows(records: Iterable[Dict[str, Any]], columns: Sequence[str]) -> io.StringIO:
+    buf = io.StringIO()
+    for record in records:
+        buf.write('\t'.join(copy_text_value(record.get(c)) for c in columns))
+        buf.write('\n')
+    buf.seek(0)
+    return buf
+
+
+class PostgresCopyLoader:
+    """Bulk upsert of perfume records through COPY + one merge statement."""
+
+    def __init__(self, conn, table: str = 'perfumes'):
+        self.conn = conn
+        self.table = table
+        self.columns = [name for name, _ in PERFUME_COLUMNS]
+
+    def _stage_sql(self) -> str:
+        cols = ', '.join(f'{name} {pg_type}' for name, pg_type in PERFUME_COLUMNS)
+        return f"CREATE TEMP TABLE perfumes_stage (stage_order bigserial, {cols}) ON COMMIT DROP"
+
+    def _merge_sql(self) -> str:
+        cols = ', '.join(self.columns)
+        keys = ', '.join(CONFLICT_COLUMNS)
+        updates = ', '.join(f'{c} = EXCLUDED.{c}' for c in self.columns if c not in CONFLICT_COLUMNS)
+        # DISTINCT ON keeps the last staged row per key, like consecutive REST upserts would,
+        # and avoids "ON CONFLICT DO UPDATE command cannot affect row a second time"
+        return (
+            f"INSERT INTO {self.table} ({cols}) "
+            f"SELECT DISTINCT ON ({keys}) {cols} FROM perfumes_stage "
+            f"ORDER BY {keys}, stage_order DESC "
+            f"ON CONFLICT ({keys}) DO UPDATE SET {updates}"
+        )
+
+    def upsert_perfumes(self, records: List[Dict[str, Any]]) -> int:
+        """Stage and merge all records in one transaction. Returns the number of rows merged."""
+        if not records:
+            return 0
+
+        buf = encode_copy_rows(records, self.columns)
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(self._stage_sql())
+                cur.copy_expert(f"COPY perfumes_stage ({', '.join(self.columns)}) FROM STDIN", buf)
+                cur.execute(self._merge_sql())
+                merged = cur.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        logger.info(f"COPY merge: staged {len(records)} rows, merged {merged} into {self.table}")
+        return merged
+
+    def replace_links(self, table: str, columns: Sequence[str], rows: Iterable[Dict[str, Any]],
+                      perfume_ids: Sequence[str]) -> int:
+        """Make `table` hold exactly `rows` for the given perfumes: COPY, delete stale links, insert new ones.
+
+        Links that already exist are left alone, so a re-run with unchanged data writes nothing.
+        Returns the number of links inserted.
+        """
+        cols = ', '.join(columns)
+        match = ' AND '.join(f's.{c} = t.{c}' for c in columns)
+        buf = encode_copy_rows(rows, columns)
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(f"CREATE TEMP TABLE links_stage (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+                cur.copy_expert(f"COPY links_stage ({cols}) FROM STDIN", buf)
+                cur.execute(
+                    f"DELETE FROM {table} t WHERE t.perfume_id = ANY(%s::uuid[]) "
+                    f"AND NOT EXISTS (SELECT 1 FROM links_stage s WHERE {match})",
+                    (list(perfume_ids),),
+                )
+                deleted = cur.rowcount
+                cur.execute(f"INSERT INTO {table} ({cols}) SELECT DISTINCT {cols} FROM links_stage ON CONFLICT DO NOTHING")
+                inserted = cur.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        logger.info(f"COPY links: {inserted} inserted, {deleted} stale removed in {table}")
+        return inserted
+
+    def update_rows(self, table: str, key: str, columns: Sequence[str], rows: Iterable[Dict[str, Any]]) -> int:
+        """Set `columns` of the rows of `table` matched on `key`: COPY into a temp table + one UPDATE ... FROM."""
+        names = [key] + list(columns)
+        cols = ', '.join(names)
+        sets = ', '.join(f'{c} = s.{c}' for c in columns)
+        buf = encode_copy_rows(rows, names)
+        try:
+            with self.conn.cursor() as cur:
+                # Same column types as the target, without listing them
+                cur.execute(f"CREATE TEMP TABLE update_stage ON COMMIT DROP AS SELECT {cols} FROM {table} WITH NO DATA")
+                cur.copy_expert(f"COPY update_stage ({cols}) FROM STDIN", buf)
+                cur.execute(f"UPDATE {table} t SET {sets} FROM update_stage s WHERE t.{key} = s.{key}")
+                updated = cur.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        logger.info(f"COPY update: {updated} rows of {table} updated")
+        return updated
+
+    def copy_rows(self, table: str, columns: Sequence[str], rows: Iterable[Dict[str, Any]]) -> int:
+        """Append rows to `table` with a plain COPY (no staging table, no conflict handling)."""
+        buf = encode_copy_rows(rows, columns)
+        try:
+            with self.conn.cursor() as cur:
+                cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+                copied = cur.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return copied
@@ -0,0 +1,245 @@
+"""
+Per-stage timing and memory instrumentation for etl_v5.py runs (--profile).
+
+Pipeline methods marked with @profiled are timed whenever the pipeline has a
+profiler; without one the decorator is a plain call. For every stage the
+report holds:
+
+    calls          times the stage ran (lookups and upsert batches run many times)
+    wall_s, cpu_s  elapsed and process CPU time, summed over calls
+    rows, rows_per_sec
+    peak_rss_mb    process peak RSS when the stage last finished
+    rss_growth_mb  how much the stage raised that peak
+    network_calls  sink queries (REST requests / SQL statements) issued inside it
+    cache_hits, cache_misses, cache_hit_rate
+
+Nested stages are reported separately and also counted in their parents (a
+_batch_upsert is part of sync_to_supabase). At the end of the run the report
+is written as JSON to PROFILE_DIR/<run id>.json and stored in
+import_runs.stats. With dump='cprofile' (or 'pyinstrument', if installed)
+the whole run is also profiled per function, next to the JSON.
+
+    pipeline.profiler = StageProfiler(dump='cprofile')
+    pipeline.profiler.start()
+    pipeline.run()
+"""
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from etl_ingest import peak_rss_mb
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.path.join(os.path.dirname(__file__), 'etl_profiles')
+PROFILE_DUMPS = ['cprofile', 'pyinstrument']
+# Sink methods that issue one query (or one bulk statement) per call
+SINK_QUERY_METHODS = ['rpc', 'bulk_insert', 'bulk_update']
+COUNTERS = ['network_calls', 'cache_hits', 'cache_misses']
+
+
+class _CountedQuery:
+    """A query builder whose execute() is counted; chained builder calls stay counted."""
+
+    def __init__(self, query, on_query: Callable[[], None]):
+        self._query = query
+        self._on_query = on_query
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if not callable(attr):
+            return attr
+        if name == 'execute':
+            def execute(*args, **kwargs):
+                self._on_query()
+                return attr(*args, **kwargs)
+            return execute
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return _CountedQuery(result, self._on_query) if hasattr(result, 'execute') else result
+        return chained
+
+
+class StageProfiler:
+    def __init__(self, dump: Optional[str] = None, output_dir: str = PROFILE_DIR):
+        if dump is not None and dump not in PROFILE_DUMPS:
+            raise ValueError(f"Unknown profile dump {dump!r}, expected one of {PROFILE_DUMPS}")
+        self.dump = dump
+        self.output_dir = output_dir
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # Open stages of each thread, innermost last
+        self._local = threading.local()
+        self._sinks: List[Any] = []
+        self._dumper = None
+        self.started_at: Optional[datetime] = None
+        self._start_wall = self._start_cpu = 0.0
+
+    def start(self):
+        """Start the run clock (and the function-level profiler, if any)."""
+        self.started_at = datetime.now(timezone.utc)
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        if self.dump == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning("pyinstrument is not installed, profiling with cProfile instead")
+                self.dump = 'cprofile'
+            else:
+                self._dumper = Profiler()
+                self._dumper.start()
+        if self.dump == 'cprofile':
+            import cProfile
+            self._dumper = cProfile.Profile()
+            self._dumper.enable()
+
+    def _stack(self) -> List[str]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _stage(self, name: str) -> Dict[str, Any]:
+        if name not in self.stages:
+            self.stages[name] = {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows': 0,
+                                 'peak_rss_mb': 0.0, 'rss_growth_mb': 0.0, **dict.fromkeys(COUNTERS, 0)}
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time one run of `name`. Yields a dict whose 'rows' the caller may set."""
+        stack = self._stack()
+        if name in stack:
+            # Recursion (bisected upsert batches) is part of the outer call's time and rows
+            yield {'rows': 0}
+            return
+        stack.append(name)
+        run = {'rows': 0}
+        rss = peak_rss_mb()
+        wall = time.perf_counter()
+        # Process CPU time, so worker threads of the stage count too
+        cpu = time.process_time()
+        try:
+            yield run
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            peak = peak_rss_mb()
+            stack.pop()
+            with self._lock:
+                stats = self._stage(name)
+                stats['calls'] += 1
+                stats['wall_s'] += wall
+                stats['cpu_s'] += cpu
+                stats['rows'] += run['rows']
+                stats['peak_rss_mb'] = peak
+                stats['rss_growth_mb'] += peak - rss
+
+    def count(self, counter: str, n: int = 1):
+        """Add `n` to `counter` of every stage open in this thread."""
+        stack = self._stack()
+        if not stack:
+            return
+        with self._lock:
+            for name in set(stack):
+                self._stage(name)[counter] += n
+
+    def cache(self, hit: bool):
+        self.count('cache_hits' if hit else 'cache_misses')
+
+    def watch(self, sink):
+        """Count the queries issued through `sink` (patched on the instance, so isinstance checks still hold)."""
+        if any(s is sink for s in self._sinks):
+            return sink
+        on_query = functools.partial(self.count, 'network_calls')
+        table = sink.table
+        sink.table = lambda name: _CountedQuery(table(name), on_query)
+        for method in SINK_QUERY_METHODS:
+            original = getattr(sink, method, None)
+            if callable(original):
+                setattr(sink, method, self._counted(original, on_query))
+        self._sinks.append(sink)
+        return sink
+
+    @staticmethod
+    def _counted(method, on_query):
+        @functools.wraps(method)
+        def counted(*args, **kwargs):
+            result = method(*args, **kwargs)
+            if hasattr(result, 'execute'):
+                return _CountedQuery(result, on_query)
+            on_query()
+            return result
+        return counted
+
+    def report(self, **extra) -> Dict[str, Any]:
+        stages = {}
+        for name, stats in self.stages.items():
+            stats = dict(stats)
+            stats['rows_per_sec'] = round(stats['rows'] / stats['wall_s'], 1) if stats['wall_s'] > 0 else None
+            lookups = stats['cache_hits'] + stats['cache_misses']
+            stats['cache_hit_rate'] = round(stats['cache_hits'] / lookups, 4) if lookups else None
+            for key in ('wall_s', 'cpu_s'):
+                stats[key] = round(stats[key], 4)
+            for key in ('peak_rss_mb', 'rss_growth_mb'):
+                stats[key] = round(stats[key], 1)
+            stages[name] = stats
+        return {
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'wall_s': round(time.perf_counter() - self._start_wall, 4),
+            'cpu_s': round(time.process_time() - self._start_cpu, 4),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            **extra,
+            'stages': stages,
+        }
+
+    def finish(self, name: str, **extra) -> Dict[str, Any]:
+        """Stop the function profiler and write <name>.json (and the dump) to output_dir."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, name)
+        report = self.report(**extra)
+        if self._dumper is not None:
+            if self.dump == 'cprofile':
+                self._dumper.disable()
+                report['dump'] = base + '.prof'
+                self._dumper.dump_stats(report['dump'])
+            else:
+                self._dumper.stop()
+                report['dump'] = base + '.html'
+                with open(report['dump'], 'w', encoding='utf-8') as f:
+                    f.write(self._dumper.output_html())
+            self._dumper = None
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        logger.info(f"Profile of {len(report['stages'])} stages written to {base}.json")
+        return report
+
+
+def profiled(name: Optional[str] = None, rows: Optional[Callable[..., int]] = None):
+    """Time the decorated pipeline method as stage `name` when `self.profiler` is set.
+
+    `rows(self, result, *args, **kwargs)` gives the rows the call processed.
+    """
+    def decorate(method):
+        stage_name = name or method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = self.profiler
+            if profiler is None:
+                return method(self, *args, **kwargs)
+            with profiler.stage(stage_name) as run:
+                result = method(self, *args, **kwargs)
+                if rows is not None:
+                    run['rows'] = rows(self, result, *args, **kwargs)
+            return result
+        return wrapper
+    return decorate
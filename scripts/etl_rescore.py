@@ -0,0 +1,111 @@
+"""
+xsolve_score recomputation for etl_v5.py without a full import.
+
+The score is a weighted sum of four per-perfume components (obscurity_raw,
+gender_adj_raw, note_count_factor_raw, note_rarity_raw). The components
+depend on Rating Count, which perfumes no longer stores, so they are read from
+the scored catalog cache (catalog_cache.py): only fingerprint_strict and the
+component columns of the parquet file. Without a cache for the current CSV the
+catalog is scored once, and cached for the next run.
+
+From perfumes only id, fingerprint_strict, xsolve_score and
+xsolve_model_version are read. Perfumes whose score (at content_hash
+precision) and model version are unchanged are not written; the others get a
+narrow update of those two columns:
+
+    postgres / sqlite sink   sink.bulk_update (COPY + UPDATE ... FROM / executemany)
+    copy backend             the same COPY + UPDATE ... FROM over SUPABASE_DB_URL
+    otherwise                update_xsolve_scores() RPC with RESCORE_BATCH_SIZE rows per call
+
+    rescorer = XsolveRescorer(pipeline, weights, model_version=2)
+    rescorer.run(backend='copy')
+"""
+
+import logging
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from catalog_cache import load_cached_frame
+from etl_postgres import PostgresCopyLoader, connect_from_env
+from etl_revisions import changed_mask
+from etl_sinks import SQLSink
+
+logger = logging.getLogger(__name__)
+
+SCORE_COLUMNS = ['xsolve_score', 'xsolve_model_version']
+# Rows per update_xsolve_scores() call
+RESCORE_BATCH_SIZE = 1000
+
+
+class XsolveRescorer:
+    def __init__(self, pipeline, weights: Dict[str, float], model_version: int,
+                 batch_size: int = RESCORE_BATCH_SIZE):
+        self.pipeline = pipeline
+        self.weights = weights
+        self.model_version = model_version
+        self.batch_size = batch_size
+        self.matched = 0
+
+    def load_components(self) -> pd.DataFrame:
+        """fingerprint_strict and the score components of the deduplicated catalog."""
+        columns = ['fingerprint_strict'] + list(self.weights)
+        pipeline = self.pipeline
+        cached = (load_cached_frame(pipeline.csv_path, 'scored', columns=columns, meta=pipeline.scored_cache_meta())
+                  if pipeline.use_cache else None)
+        if cached is not None:
+            logger.info(f"Loaded score components of {len(cached)} perfumes from the catalog cache")
+            return cached
+        logger.info("No scored catalog cache for this CSV, scoring it")
+        return pipeline.build_scored_catalog()[columns]
+
+    def score(self) -> pd.DataFrame:
+        components = self.load_components()
+        return pd.DataFrame({
+            'fingerprint_strict': components['fingerprint_strict'].to_numpy(dtype=object),
+            'xsolve_score': self.pipeline.combine_xsolve_components(components, self.weights),
+            'xsolve_model_version': self.model_version,
+        }).drop_duplicates('fingerprint_strict', keep='last')
+
+    def changed_rows(self, scores: pd.DataFrame, current: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """id and new score columns of the perfumes in `current` whose score or model version differ."""
+        remote = pd.DataFrame(current, columns=['id', 'fingerprint_strict'] + SCORE_COLUMNS, dtype=object)
+        remote = remote.dropna(subset=['fingerprint_strict']).drop_duplicates('fingerprint_strict')
+        joined = scores.merge(remote, on='fingerprint_strict', how='inner', suffixes=('', '_old'))
+        old = joined[[c + '_old' for c in SCORE_COLUMNS]].set_axis(SCORE_COLUMNS, axis=1)
+        changed = joined[changed_mask(joined[SCORE_COLUMNS].astype(object), old, SCORE_COLUMNS).any(axis=1)]
+        self.matched = len(joined)
+        new_scores = changed['xsolve_score'].to_numpy(dtype=float)
+        return [{'id': perfume_id, 'xsolve_score': None if np.isnan(score) else float(score),
+                 'xsolve_model_version': self.model_version}
+                for perfume_id, score in zip(changed['id'].tolist(), new_scores.tolist())]
+
+    def write(self, rows: List[Dict[str, Any]], backend: str):
+        db = self.pipeline.db
+        if isinstance(db, SQLSink):
+            db.bulk_update('perfumes', 'id', SCORE_COLUMNS, [[r['id']] + [r[c] for c in SCORE_COLUMNS] for r in rows])
+        elif backend == 'copy':
+            conn = connect_from_env()
+            try:
+                PostgresCopyLoader(conn).update_rows('perfumes', 'id', SCORE_COLUMNS, rows)
+            finally:
+                conn.close()
+        else:
+            for start in range(0, len(rows), self.batch_size):
+                db.rpc('update_xsolve_scores', {'scores': rows[start:start + self.batch_size]}).execute()
+
+    def run(self, backend: str = 'rest') -> Dict[str, int]:
+        """Rescore and write back the changes. Returns scored / matched / updated counts."""
+        scores = self.score()
+        current = self.pipeline._fetch_all('perfumes', 'id, fingerprint_strict, ' + ', '.join(SCORE_COLUMNS))
+        rows = self.changed_rows(scores, current)
+        if rows:
+            self.write(rows, backend)
+        stats = {'scored': len(scores), 'matched': self.matched, 'updated': len(rows)}
+        eligible = scores['xsolve_score'].dropna()
+        if len(eligible):
+            logger.info(f"Mean Score (Eligible): {eligible.mean():.4f}")
+        logger.info(f"Rescore (model version {self.model_version}): {stats['updated']} of {stats['matched']} "
+                    f"perfumes in the database changed, {stats['scored'] - stats['matched']} not imported yet")
+        return stats
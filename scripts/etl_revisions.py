@@ -0,0 +1,113 @@
+"""
+Field-level change history for etl_v5.py syncs.
+
+Before records are upserted, they are joined on fingerprint_strict against a
+snapshot of the current perfumes rows (one paged read of the table) and
+compared column by column. Each perfume with at least one real change gets a
+perfume_revisions row whose diff_json maps the field to its old and new value:
+
+    {"xsolve_score": {"old": 41.2, "new": 43.0}, "top_notes": {"old": [...], "new": [...]}}
+
+New perfumes and unchanged ones produce nothing. Tracking is opt-in
+(etl_v5.py --track-revisions), since it needs every record and the snapshot
+in memory before the first upsert.
+
+    revisions = field_diffs(records, snapshot, CONTENT_HASH_FIELDS)
+"""
+
+import logging
+import operator
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Array columns: compared by their elements, in order
+LIST_FIELDS = {'top_notes', 'middle_notes', 'base_notes', 'perfumers'}
+# Float columns: compared at the precision content_hash uses, since the DB round-trips them through text
+FLOAT_FIELDS = {'xsolve_score'}
+FLOAT_DECIMALS = 10
+# Elementwise == over object arrays (lists compare by their elements)
+_EQUAL = np.frompyfunc(operator.eq, 2, 1)
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and np.isnan(value)) \
+        or (isinstance(value, (list, tuple)) and not value)
+
+
+def _same(left: np.ndarray, right: np.ndarray, field: str) -> np.ndarray:
+    """Elementwise "same value in the database" for two aligned object columns."""
+    if field in FLOAT_FIELDS:
+        left = pd.to_numeric(pd.Series(left), errors='coerce').round(FLOAT_DECIMALS).to_numpy(dtype=float)
+        right = pd.to_numeric(pd.Series(right), errors='coerce').round(FLOAT_DECIMALS).to_numpy(dtype=float)
+        return (left == right) | (np.isnan(left) & np.isnan(right))
+    same = _EQUAL(left, right).astype(bool) | (pd.isna(left) & pd.isna(right))
+    if field in LIST_FIELDS:
+        # Missing and empty arrays are the same to the pipeline (records always send a list);
+        # only the few cells that differ are looked at one by one
+        for i in np.flatnonzero(~same).tolist():
+            same[i] = _is_empty(left[i]) and _is_empty(right[i])
+    return same
+
+
+def changed_mask(local: pd.DataFrame, remote: pd.DataFrame, fields: Sequence[str]) -> np.ndarray:
+    """(n, len(fields)) bool matrix: True where the aligned local and remote rows differ."""
+    mask = np.zeros((len(local), len(fields)), dtype=bool)
+    for j, field in enumerate(fields):
+        mask[:, j] = ~_same(local[field].to_numpy(dtype=object), remote[field].to_numpy(dtype=object), field)
+    return mask
+
+
+def _json_value(value: Any, field: str) -> Any:
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        if np.isnan(value):
+            return None
+        # Integer columns with missing values come out of the frame as floats
+        if field not in FLOAT_FIELDS and value.is_integer():
+            return int(value)
+    return value
+
+
+def field_diffs(records: Iterable[Dict[str, Any]], snapshot: Iterable[Dict[str, Any]],
+                fields: Sequence[str]) -> pd.DataFrame:
+    """Changed fields of `records` relative to the `snapshot` rows with the same fingerprint_strict.
+
+    Returns one row per changed perfume: fingerprint_strict, perfume_id (the
+    snapshot row's id) and diff ({field: {'old': ..., 'new': ...}}).
+    """
+    fields = list(fields)
+    # Object columns: values stay as the Python objects that were (or will be) sent
+    local = pd.DataFrame(list(records), columns=['fingerprint_strict'] + fields, dtype=object)
+    remote = pd.DataFrame(list(snapshot), columns=['id', 'fingerprint_strict'] + fields, dtype=object)
+    remote = remote.dropna(subset=['fingerprint_strict']).drop_duplicates('fingerprint_strict')
+    # Last record wins, as with consecutive upserts of the same key
+    local = local.drop_duplicates('fingerprint_strict', keep='last')
+
+    joined = local.merge(remote, on='fingerprint_strict', how='inner', suffixes=('', '_old'))
+    old = joined[[f + '_old' for f in fields]].set_axis(fields, axis=1)
+    mask = changed_mask(joined[fields], old, fields)
+
+    diffs: Dict[int, Dict[str, Any]] = defaultdict(dict)
+    new_values = joined[fields].to_numpy(dtype=object)
+    old_values = old.to_numpy(dtype=object)
+    # Only the changed cells are visited; np.nonzero yields them row by row
+    for i, j in zip(*(axis.tolist() for axis in np.nonzero(mask))):
+        field = fields[j]
+        diffs[i][field] = {'old': _json_value(old_values[i, j], field), 'new': _json_value(new_values[i, j], field)}
+
+    changed = np.flatnonzero(mask.any(axis=1))
+    result = pd.DataFrame({
+        'fingerprint_strict': joined['fingerprint_strict'].to_numpy()[changed],
+        'perfume_id': joined['id'].to_numpy()[changed],
+        'diff': [diffs[i] for i in changed.tolist()],
+    })
+    logger.info(f"Revisions: {len(result)} of {len(joined)} existing perfumes changed")
+    return result
@@ -0,0 +1,483 @@
+"""
+Destinations for etl_v5.py.
+
+The pipeline talks to its database through the postgrest query builder
+subset it has always used:
+
+    sink.table('brands').select('id, name').order('id').range(0, 999).execute().data
+    sink.table('perfumes').upsert(rows, on_conflict='brand_id,name', ignore_duplicates=False).execute()
+
+Three sinks provide that interface:
+
+    supabase  Supabase REST (PostgREST); the client is created on first use
+    postgres  the same statements as SQL over a direct psycopg2 connection
+    sqlite    a local file mirroring the ETL tables, for offline runs, CI and benchmarks
+
+    sink = make_sink('sqlite', path='etl_local.db')
+    ETLPipelineV5('../data/dataset.csv', sink=sink).run()
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import uuid
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+SINKS = ['supabase', 'postgres', 'sqlite']
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(__file__), 'etl_local.db')
+
+# Conflict targets whose columns are UNIQUE NULLS NOT DISTINCT in Postgres. SQLite
+# treats NULLs as distinct, so its unique index (and ON CONFLICT target) uses IFNULL.
+SQLITE_NULLS_NOT_DISTINCT = {
+    'concentration_id': "IFNULL(concentration_id, '')",
+    'release_year': 'IFNULL(release_year, -1)',
+}
+
+# The tables etl_v5.py reads and writes. Arrays and jsonb are stored as JSON
+# text; the declared JSON / BOOLEAN / BLOB types tell the sink how to decode them.
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS concentrations (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL UNIQUE, slug TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS manufacturers (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS brands (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL UNIQUE, slug TEXT NOT NULL UNIQUE,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS perfumes (
+    id TEXT PRIMARY KEY,
+    fingerprint_strict TEXT, fingerprint_loose TEXT,
+    name TEXT NOT NULL, brand_id TEXT NOT NULL REFERENCES brands(id),
+    concentration_id TEXT REFERENCES concentrations(id), manufacturer_id TEXT REFERENCES manufacturers(id),
+    release_year INTEGER, gender TEXT,
+    top_notes JSON, middle_notes JSON, base_notes JSON, perfumers JSON,
+    xsolve_score REAL DEFAULT 0, xsolve_model_version INTEGER DEFAULT 1,
+    is_active BOOLEAN DEFAULT 1, is_uncertain BOOLEAN DEFAULT 0, is_linear BOOLEAN DEFAULT 0,
+    source_record_slug TEXT NOT NULL UNIQUE,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS perfumes_unique_perfume
+    ON perfumes (brand_id, name, IFNULL(concentration_id, ''), IFNULL(release_year, -1));
+CREATE INDEX IF NOT EXISTS perfumes_fingerprint_strict ON perfumes (fingerprint_strict);
+CREATE TABLE IF NOT EXISTS brand_aliases (
+    alias_norm TEXT PRIMARY KEY, brand_id TEXT NOT NULL REFERENCES brands(id)
+);
+CREATE TABLE IF NOT EXISTS notes (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL UNIQUE, slug TEXT NOT NULL UNIQUE,
+    display_name TEXT NOT NULL, hints JSON DEFAULT '[]'
+);
+CREATE TABLE IF NOT EXISTS perfume_notes (
+    perfume_id TEXT NOT NULL, note_id TEXT NOT NULL, type TEXT NOT NULL, qualifiers JSON DEFAULT '[]',
+    PRIMARY KEY (perfume_id, note_id, type)
+);
+CREATE TABLE IF NOT EXISTS perfumers (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS perfume_perfumers (
+    perfume_id TEXT NOT NULL, perfumer_id TEXT NOT NULL, PRIMARY KEY (perfume_id, perfumer_id)
+);
+CREATE TABLE IF NOT EXISTS import_runs (
+    id TEXT PRIMARY KEY, catalog_version TEXT NOT NULL, created_at TEXT DEFAULT CURRENT_TIMESTAMP, stats JSON
+);
+CREATE TABLE IF NOT EXISTS raw_import_rows (
+    id TEXT PRIMARY KEY, import_run_id TEXT NOT NULL REFERENCES import_runs(id),
+    brand_raw TEXT, name_raw TEXT, concentration_raw TEXT, release_year INTEGER,
+    fp_strict BLOB NOT NULL, fp_loose BLOB NOT NULL, raw_json JSON,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS raw_import_rows_run_fp_strict ON raw_import_rows (import_run_id, fp_strict);
+CREATE TABLE IF NOT EXISTS perfume_revisions (
+    id TEXT PRIMARY KEY, perfume_id TEXT REFERENCES perfumes(id) ON DELETE CASCADE,
+    fingerprint_strict TEXT NOT NULL, diff_json JSON NOT NULL, reason TEXT,
+    import_run_id TEXT REFERENCES import_runs(id),
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS import_conflicts (
+    id TEXT PRIMARY KEY, import_run_id TEXT NOT NULL REFERENCES import_runs(id),
+    raw_row_id TEXT NOT NULL REFERENCES raw_import_rows(id),
+    conflict_type TEXT NOT NULL, details JSON, resolved BOOLEAN DEFAULT 0
+);
+"""
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def bytea_text(value: bytes) -> str:
+    """bytea in the hex text form PostgREST returns and accepts ('\\x' + hex)."""
+    return '\\x' + bytes(value).hex()
+
+
+class SQLQuery:
+    """One postgrest-style request, compiled to a single SQL statement on execute()."""
+
+    def __init__(self, sink: 'SQLSink', table: str):
+        self.sink = sink
+        self.table = table
+        self.action = 'select'
+        self.columns = '*'
+        self.payload: Any = None
+        self.options: Dict[str, Any] = {}
+        self.filters: List[tuple] = []
+        self.ordering: List[tuple] = []
+        self.window: Optional[tuple] = None
+
+    # Builders
+    def select(self, columns: str = '*'):
+        self.action, self.columns = 'select', columns
+        return self
+
+    def insert(self, rows, **options):
+        self.action, self.payload, self.options = 'insert', rows, options
+        return self
+
+    def upsert(self, rows, on_conflict: str = '', ignore_duplicates: bool = False, **options):
+        self.action, self.payload = 'upsert', rows
+        self.options = dict(options, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates)
+        return self
+
+    def update(self, values: Dict[str, Any]):
+        self.action, self.payload = 'update', values
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    def eq(self, column: str, value: Any):
+        self.filters.append(('=', column, value))
+        return self
+
+    def in_(self, column: str, values: Sequence[Any]):
+        self.filters.append(('in', column, list(values)))
+        return self
+
+    def order(self, column: str, desc: bool = False, **_):
+        self.ordering.append((column, desc))
+        return self
+
+    def range(self, start: int, end: int):
+        self.window = (start, end - start + 1)
+        return self
+
+    def limit(self, n: int):
+        self.window = (0, n)
+        return self
+
+    # Compilation
+    def _where(self, params: List[Any]) -> str:
+        clauses = []
+        for op, column, value in self.filters:
+            if op == 'in':
+                if not value:
+                    clauses.append('FALSE')
+                    continue
+                clauses.append(f"{_quote(column)} IN ({', '.join([self.sink.placeholder] * len(value))})")
+                params.extend(self.sink.adapt(self.table, column, v) for v in value)
+            else:
+                clauses.append(f"{_quote(column)} = {self.sink.placeholder}")
+                params.append(self.sink.adapt(self.table, column, value))
+        return f" WHERE {' AND '.join(clauses)}" if clauses else ''
+
+    def _select_list(self) -> str:
+        if self.columns.strip() == '*':
+            return '*'
+        return ', '.join(_quote(c.strip()) for c in self.columns.split(','))
+
+    def _insert_sql(self, rows: List[Dict[str, Any]], params: List[Any]) -> str:
+        rows = [self.sink.with_id(self.table, dict(r)) for r in rows]
+        columns = list(dict.fromkeys(c for r in rows for c in r))
+        values = []
+        for row in rows:
+            values.append(f"({', '.join([self.sink.placeholder] * len(columns))})")
+            params.extend(self.sink.adapt(self.table, c, row.get(c)) for c in columns)
+        sql = f"INSERT INTO {_quote(self.table)} ({', '.join(map(_quote, columns))}) VALUES {', '.join(values)}"
+
+        if self.action == 'upsert':
+            keys = [k.strip() for k in self.options['on_conflict'].split(',') if k.strip()]
+            target = ', '.join(self.sink.conflict_column(k) for k in keys)
+            updates = [c for c in columns if c not in keys and c != 'id']
+            if self.options['ignore_duplicates'] or not updates:
+                sql += f" ON CONFLICT ({target}) DO NOTHING"
+            else:
+                sql += f" ON CONFLICT ({target}) DO UPDATE SET " + ', '.join(
+                    f"{_quote(c)} = excluded.{_quote(c)}" for c in updates)
+        return sql + self._returning()
+
+    def _returning(self) -> str:
+        # returning=ReturnMethod.minimal, as in postgrest: write without reading the rows back
+        return '' if self.options.get('returning') == 'minimal' else ' RETURNING *'
+
+    def compile(self):
+        params: List[Any] = []
+        table = _quote(self.table)
+        if self.action == 'select':
+            sql = f"SELECT {self._select_list()} FROM {table}{self._where(params)}"
+            if self.ordering:
+                sql += ' ORDER BY ' + ', '.join(f"{_quote(c)}{' DESC' if d else ''}" for c, d in self.ordering)
+            if self.window:
+                sql += f" LIMIT {int(self.window[1])} OFFSET {int(self.window[0])}"
+        elif self.action in ('insert', 'upsert'):
+            rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            sql = self._insert_sql(rows, params)
+        elif self.action == 'update':
+            assignments = []
+            for column, value in self.payload.items():
+                assignments.append(f"{_quote(column)} = {self.sink.placeholder}")
+                params.append(self.sink.adapt(self.table, column, value))
+            sql = f"UPDATE {table} SET {', '.join(assignments)}{self._where(params)}{self._returning()}"
+        else:
+            sql = f"DELETE FROM {table}{self._where(params)} RETURNING *"
+        return sql, params
+
+    def execute(self):
+        if self.action in ('insert', 'upsert') and not self.payload:
+            return SimpleNamespace(data=[])
+        sql, params = self.compile()
+        return SimpleNamespace(data=self.sink.run(self.table, sql, params))
+
+
+class SQLSink(ABC):
+    """Query builder sink over a DB-API connection; subclasses fill in the dialect."""
+
+    placeholder = '%s'
+
+    def table(self, name: str) -> SQLQuery:
+        return SQLQuery(self, name)
+
+    def adapt(self, table: str, column: str, value: Any) -> Any:
+        return value
+
+    def with_id(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        return row
+
+    def conflict_column(self, column: str) -> str:
+        return _quote(column)
+
+    @abstractmethod
+    def run(self, table: str, sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+        """Execute `sql` and return the rows it produced as dicts."""
+
+    @abstractmethod
+    def bulk_insert(self, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+        """Append `rows` (values in `columns` order) without reading them back; the audit-scale path."""
+
+    @abstractmethod
+    def bulk_update(self, table: str, key: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+        """Set `columns` of the rows matched on `key`; each row is the key value followed by the new values."""
+
+
+class PostgresSink(SQLSink):
+    """Direct Postgres; the connection is opened on first use."""
+
+    def __init__(self, connect: Optional[Callable[[], Any]] = None):
+        self._connect = connect
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            if self._connect is None:
+                from etl_postgres import connect_from_env
+                self._connect = connect_from_env
+            self._conn = self._connect()
+        return self._conn
+
+    def adapt(self, table: str, column: str, value: Any) -> Any:
+        if isinstance(value, dict):
+            from psycopg2.extras import Json
+            return Json(value)
+        return value
+
+    def run(self, table: str, sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+        from psycopg2.extras import RealDictCursor
+
+        try:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(sql, params)
+                rows = [dict(r) for r in cur.fetchall()] if cur.description else []
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        # uuid and bytea columns come back as strings from the REST API; keep the pipeline's view the same
+        return [{k: str(v) if isinstance(v, uuid.UUID) else bytea_text(v) if isinstance(v, memoryview) else v
+                 for k, v in r.items()} for r in rows]
+
+    def bulk_insert(self, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+        from etl_postgres import PostgresCopyLoader
+        return PostgresCopyLoader(self.conn).copy_rows(table, columns, (dict(zip(columns, r)) for r in rows))
+
+    def bulk_update(self, table: str, key: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+        from etl_postgres import PostgresCopyLoader
+        names = [key] + list(columns)
+        return PostgresCopyLoader(self.conn).update_rows(table, key, columns, (dict(zip(names, r)) for r in rows))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class SQLiteSink(SQLSink):
+    """Local SQLite mirror of the ETL tables; created on first use."""
+
+    placeholder = '?'
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        # table -> {column: declared type}, for decoding JSON and BOOLEAN columns
+        self._types: Dict[str, Dict[str, str]] = {}
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # The async uploader and worker threads share the sink
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.executescript(SQLITE_SCHEMA)
+            for (table,) in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                info = self._conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+                self._types[table] = {row['name']: row['type'].upper() for row in info}
+            logger.info(f"SQLite sink at {self.path}")
+        return self._conn
+
+    def with_id(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        # Postgres fills ids with uuid_generate_v4(); do it here for tables keyed by id
+        if 'id' not in row and 'id' in self.column_types(table):
+            row['id'] = str(uuid.uuid4())
+        return row
+
+    def column_types(self, table: str) -> Dict[str, str]:
+        self.conn  # the schema is read on connect
+        return self._types.get(table, {})
+
+    def adapt(self, table: str, column: str, value: Any) -> Any:
+        if isinstance(value, (list, tuple, dict)):
+            return json.dumps(value, ensure_ascii=False)
+        if isinstance(value, str) and value.startswith('\\x') and self.column_types(table).get(column) == 'BLOB':
+            return bytes.fromhex(value[2:])
+        if isinstance(value, bool):
+            return int(value)
+        return value
+
+    def conflict_column(self, column: str) -> str:
+        return SQLITE_NULLS_NOT_DISTINCT.get(column, _quote(column))
+
+    def _decode(self, table: str, row: sqlite3.Row) -> Dict[str, Any]:
+        types = self.column_types(table)
+        decoded = {}
+        for key in row.keys():
+            value = row[key]
+            kind = types.get(key)
+            if value is not None and kind == 'JSON':
+                value = json.loads(value)
+            elif value is not None and kind == 'BOOLEAN':
+                value = bool(value)
+            elif isinstance(value, bytes):
+                value = bytea_text(value)
+            decoded[key] = value
+        return decoded
+
+    def run(self, table: str, sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+        conn = self.conn
+        with conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [self._decode(table, r) for r in rows]
+
+    def bulk_insert(self, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+        types = self.column_types(table)
+        columns = list(columns)
+        # Convert only the columns whose values need it, instead of adapt() per value
+        converters = [(i, self._converter(types.get(c))) for i, c in enumerate(columns)]
+        converters = [(i, f) for i, f in converters if f is not None]
+        add_id = 'id' in types and 'id' not in columns
+
+        def prepared(row):
+            row = list(row)
+            for i, convert in converters:
+                if row[i] is not None:
+                    row[i] = convert(row[i])
+            if add_id:
+                row.append(str(uuid.uuid4()))
+            return row
+
+        names = columns + ['id'] if add_id else columns
+        sql = (f"INSERT INTO {_quote(table)} ({', '.join(map(_quote, names))}) "
+               f"VALUES ({', '.join([self.placeholder] * len(names))})")
+        conn = self.conn
+        with conn:
+            return conn.executemany(sql, map(prepared, rows)).rowcount
+
+    def bulk_update(self, table: str, key: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+        types = self.column_types(table)
+        converters = [self._converter(types.get(c)) for c in [key] + list(columns)]
+
+        def prepared(row):
+            # The key leads the row but binds last, after the SET values
+            values = [v if f is None or v is None else f(v) for f, v in zip(converters, row)]
+            return values[1:] + values[:1]
+
+        sets = ', '.join(f'{_quote(c)} = {self.placeholder}' for c in columns)
+        sql = f"UPDATE {_quote(table)} SET {sets} WHERE {_quote(key)} = {self.placeholder}"
+        conn = self.conn
+        with conn:
+            return conn.executemany(sql, map(prepared, rows)).rowcount
+
+    @staticmethod
+    def _converter(kind: Optional[str]) -> Optional[Callable[[Any], Any]]:
+        if kind == 'BLOB':
+            return lambda v: bytes.fromhex(v[2:]) if isinstance(v, str) and v.startswith('\\x') else v
+        if kind == 'JSON':
+            return lambda v: v if isinstance(v, str) else json.dumps(v, ensure_ascii=False)
+        return None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class SupabaseSink:
+    """Supabase REST; create_client runs on the first table() call, not at import."""
+
+    def __init__(self, url: Optional[str] = None, key: Optional[str] = None):
+        self.url = url
+        self.key = key
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            if not self.url or not self.key:
+                raise RuntimeError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY in .env")
+            from supabase import create_client
+            self._client = create_client(self.url, self.key)
+        return self._client
+
+    def table(self, name: str):
+        return self.client.table(name)
+
+    def rpc(self, fn: str, params: Dict[str, Any]):
+        return self.client.rpc(fn, params)
+
+
+def make_sink(kind: str = 'supabase', url: Optional[str] = None, key: Optional[str] = None,
+              path: Optional[str] = None):
+    """Sink by name. Nothing connects until the first query."""
+    if kind == 'supabase':
+        return SupabaseSink(url, key)
+    if kind == 'postgres':
+        return PostgresSink()
+    if kind == 'sqlite':
+        return SQLiteSink(path or DEFAULT_SQLITE_PATH)
+    raise ValueError(f"Unknown sink {kind!r}, expected one of {SINKS}")
@@ -0,0 +1,203 @@
+"""
+Out-of-core mode for etl_v5.py, for catalogs larger than RAM.
+
+Pass 1 streams the CSV in chunks and keeps one entry per fingerprint: the
+rating, row offset, gender code and note ids of its current winner (a
+duplicate replaces them only if it is rated higher). The xSolve statistics are
+then computed over the winners exactly as the in-memory mode does.
+
+Pass 2 streams the CSV again, keeps each chunk's winning rows, scores them
+against those statistics and uploads them chunk by chunk.
+
+Duplicates are resolved keep-first (the top-rated row wins); the note union of
+--dedup merge would need every duplicate's lists at once. perfume_revisions are
+not recorded: the diff needs a snapshot of the whole perfumes table in memory.
+etl_v5.py rejects --stream with --dedup merge or --track-revisions; when the
+pipeline is driven directly, both settings are ignored with a warning.
+
+Memory is therefore not bounded by the chunk size alone: on top of one chunk,
+pass 1 holds about 200 bytes per distinct perfume plus 4 bytes per note
+occurrence of the winning rows, i.e. O(distinct perfumes + their notes).
+Duplicate source rows cost nothing once they have lost.
+
+Usage:
+    python etl_v5.py --stream --chunk-size 50000
+"""
+
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from etl_ingest import iter_catalog_csv, peak_rss_mb
+from note_matrix import NoteIncidenceMatrix
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+class StreamingCatalog:
+    def __init__(self, pipeline, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.pipeline = pipeline
+        self.chunk_size = chunk_size
+        # sha256 digest of fingerprint_strict -> (best Rating Count, row offset, gender code, int32 note ids
+        # as bytes) of the row currently winning that fingerprint; ties keep the first row
+        self.best: Dict[bytes, Tuple[int, int, int, bytes]] = {}
+        # Winner row offsets, sorted, and their rank in the deduplicated frame
+        self.winner_offsets: Optional[np.ndarray] = None
+        self.winner_ranks: Optional[np.ndarray] = None
+        self.stats: Optional[Dict] = None
+        self.note_matrix: Optional[NoteIncidenceMatrix] = None
+
+    def _chunks(self) -> Iterator[pd.DataFrame]:
+        return iter_catalog_csv(self.pipeline.csv_path, self.chunk_size)
+
+    def _update_dedup(self, chunk: pd.DataFrame, gender_codes: np.ndarray, note_ids: np.ndarray):
+        """Record the rows of `chunk` that beat the current winner of their fingerprint."""
+        best = self.best
+        ends = np.cumsum(chunk['note_count'].to_numpy(dtype=np.int64)).tolist()
+        start = 0
+        for fp, rating, offset, gender, end in zip(chunk['fingerprint_strict'], chunk['Rating Count'].tolist(),
+                                                   chunk.index.tolist(), gender_codes.tolist(), ends):
+            key = bytes.fromhex(fp)
+            current = best.get(key)
+            if current is None or rating > current[0]:
+                best[key] = (rating, offset, gender, note_ids[start:end].tobytes())
+            start = end
+
+    def collect_statistics(self) -> Dict:
+        """Pass 1: the winning row of every fingerprint and the xSolve statistics over the winners."""
+        pipeline = self.pipeline
+        vocabulary: Dict[str, int] = {}
+        gender_codes: Dict[str, int] = {}
+        rows = 0
+
+        for chunk in self._chunks():
+            pipeline.clean_frame(chunk)
+            pipeline.df = chunk
+            pipeline.extract_note_pyramids()
+
+            g_norm = pipeline.normalize_series(chunk['Gender'])
+            genders = np.fromiter((gender_codes.setdefault(g, len(gender_codes)) for g in g_norm),
+                                  dtype=np.int32, count=len(g_norm))
+            note_ids = np.fromiter((vocabulary.setdefault(n, len(vocabulary))
+                                    for notes in chunk['notes_list'] for n in notes), dtype=np.int32)
+            self._update_dedup(chunk, genders, note_ids)
+            rows = chunk.index[-1] + 1
+            logger.info(f"Pass 1: {rows} rows read, {len(self.best)} distinct, "
+                        f"peak RSS {peak_rss_mb():.0f} MB")
+        pipeline.df = None
+
+        # Winners in the in-memory row order: Rating Count descending, then file order
+        keys = list(self.best)
+        winners = list(self.best.values())
+        ratings = np.fromiter((w[0] for w in winners), dtype=np.int64, count=len(winners))
+        offsets = np.fromiter((w[1] for w in winners), dtype=np.int64, count=len(winners))
+        order = np.lexsort((offsets, -ratings))
+        by_offset = np.argsort(offsets[order])
+        self.winner_offsets = offsets[order][by_offset]
+        self.winner_ranks = by_offset
+
+        notes = [winners[i][3] for i in order]
+        self.note_matrix = self._winner_matrix(notes, vocabulary, keys=[keys[i].hex() for i in order])
+        gender_names = np.array(list(gender_codes), dtype=object)
+        genders = np.fromiter((winners[i][2] for i in order), dtype=np.int64, count=len(order))
+        self.stats = pipeline.score_statistics(
+            ratings[order].astype(np.int32),
+            gender_names[genders] if len(gender_names) else np.array([], dtype=object),
+            np.fromiter((len(n) // 4 for n in notes), dtype=np.int64, count=len(notes)),
+            self.note_matrix,
+        )
+        logger.info(f"Pass 1 done: {rows} rows, {len(order)} after dedup, {self.note_matrix.shape[1]} notes")
+        return self.stats
+
+    @staticmethod
+    def _winner_matrix(notes: List[bytes], vocabulary: Dict[str, int], keys: List[str]) -> NoteIncidenceMatrix:
+        """The matrix NoteIncidenceMatrix.from_note_lists builds for the deduplicated frame.
+
+        `notes` holds each winner's note ids (int32 bytes), in frame order.
+        """
+        indptr = np.zeros(len(notes) + 1, dtype=np.int64)
+        np.cumsum([len(n) // 4 for n in notes], out=indptr[1:])
+        indices = np.frombuffer(b''.join(notes), dtype=np.int32)
+
+        # Keep only notes some winner uses, in sorted order like a fresh vocabulary
+        used = np.unique(indices)
+        words = list(vocabulary)
+        sorted_used = sorted(used.tolist(), key=words.__getitem__)
+        remap = np.full(len(words), -1, dtype=np.int32)
+        remap[sorted_used] = np.arange(len(sorted_used), dtype=np.int32)
+
+        matrix = sparse.csr_matrix((np.ones(len(indices)), remap[indices], indptr),
+                                   shape=(len(notes), len(sorted_used)))
+        matrix.sum_duplicates()
+        return NoteIncidenceMatrix(matrix, [words[i] for i in sorted_used], keys=keys)
+
+    def _winner_ranks(self, offsets: np.ndarray) -> np.ndarray:
+        """Rank in the deduplicated frame of each row offset, or -1 for rows that lost to a duplicate."""
+        positions = np.searchsorted(self.winner_offsets, offsets)
+        found = positions < len(self.winner_offsets)
+        found[found] = self.winner_offsets[positions[found]] == offsets[found]
+        return np.where(found, self.winner_ranks[np.minimum(positions, len(self.winner_ranks) - 1)], -1)
+
+    def iter_scored_chunks(self) -> Iterator[pd.DataFrame]:
+        """Pass 2: the winning rows of each chunk, scored like calculate_xsolve_score would."""
+        if self.stats is None:
+            self.collect_statistics()
+        pipeline = self.pipeline
+        avg_note_rarity = self.stats['avg_note_rarity']
+
+        for chunk in self._chunks():
+            ranks = self._winner_ranks(chunk.index.to_numpy())
+            keep = ranks >= 0
+            if not keep.any():
+                continue
+            chunk = chunk[keep].copy()
+            ranks = ranks[keep]
+
+            pipeline.clean_frame(chunk)
+            pipeline.df = chunk
+            pipeline.extract_note_pyramids()
+            chunk['gender_norm'] = pipeline.normalize_series(chunk['Gender'])
+            pipeline.apply_xsolve_score(chunk, self.stats,
+                                        avg_note_rarity[ranks] if avg_note_rarity is not None else None)
+            pipeline.df = None
+            yield chunk
+
+    def run(self, backend: str = 'rest', concurrency: int = 4):
+        pipeline = self.pipeline
+        backend = pipeline.sync_backend(backend)
+        if pipeline.dedup_strategy != 'keep-first':
+            logger.warning(f"Streaming resolves duplicates keep-first; ignoring dedup strategy "
+                           f"'{pipeline.dedup_strategy}'")
+        if pipeline.track_revisions:
+            logger.warning("Streaming does not record perfume_revisions; ignoring track_revisions")
+        self.collect_statistics()
+        pipeline.note_matrix = self.note_matrix
+        pipeline.save_note_matrix()
+
+        pipeline.prepoulate_cache()
+        if pipeline.write_links:
+            pipeline.prefetch_link_vocabularies()
+        for chunk in self.iter_scored_chunks():
+            pipeline.df = chunk
+            pipeline.resolve_dimensions(refresh=False)
+            records = pipeline.iter_perfume_records()
+            if backend == 'copy':
+                pipeline._sync_copy(records)
+            elif backend == 'async':
+                pipeline._sync_async(records, concurrency)
+            else:
+                pipeline._sync_rest(records)
+            if pipeline.write_links:
+                pipeline.sync_note_links(backend=backend, refresh=False)
+            logger.info(f"Pass 2: synced {len(chunk)} perfumes, peak RSS {peak_rss_mb():.0f} MB")
+        pipeline.df = None
+        if pipeline.stage_raw_rows:
+            pipeline.stage_raw_import_rows(backend=backend)
+        pipeline.record_dead_letters()
+        pipeline.record_brand_reviews()
+        logger.info("Streaming ETL completed successfully.")
@@ -1,17 +1,40 @@
 import os
 import re
+import sys
 import hashlib
 import json
 import logging
 import asyncio
+import argparse
+import threading
+import time
+import httpx
 import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from postgrest import ReturnMethod
+from postgrest.exceptions import APIError
 from tqdm import tqdm
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
 from typing import List, Dict, Any, Optional
 
+from note_matrix import NoteIncidenceMatrix
+from etl_postgres import PostgresCopyLoader, connect_from_env
+from etl_async import AsyncBatchUploader, batched
+from etl_checkpoint import CHECKPOINT_ROOT, BatchProgress, RunCheckpoint
+from catalog_cache import cache_dir, load_cached_frame, save_cached_frame
+from etl_ingest import CSV_ENGINES, peak_rss_mb, read_catalog_csv
+from etl_parallel import ParallelStages
+from near_duplicates import NearDuplicateFinder
+from brand_resolver import BrandResolver, brand_key
+from etl_sinks import SINKS, SQLiteSink, SupabaseSink, make_sink
+from etl_staging import RawRowStager, fingerprint_bytea
+from etl_revisions import field_diffs
+from etl_rescore import XsolveRescorer
+from etl_profiling import PROFILE_DIR, PROFILE_DUMPS, StageProfiler, profiled
+
 # Setup Logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,7 +48,74 @@ logger = logging.getLogger(__name__)
 
 # Constants
 XSOLVE_MODEL_VERSION = 1
+# xSolve component weights; after changing them, bump XSOLVE_MODEL_VERSION and run --rescore
+W_OBSCURITY = 0.40
+W_GENDER = 0.30
+W_COUNT = 0.15
+W_RARITY = 0.15
+XSOLVE_WEIGHTS = {
+    'obscurity_raw': W_OBSCURITY,
+    'gender_adj_raw': W_GENDER,
+    'note_count_factor_raw': W_COUNT,
+    'note_rarity_raw': W_RARITY,
+}
+# Perfumes with at least this many ratings get a score (User Rule: "Obliczaj xSolve tylko dla eligible")
+ELIGIBLE_MIN_RATINGS = 400
+# ...unless fewer than MIN_ELIGIBLE_PERFUMES qualify (small test exports), then this many
+FALLBACK_MIN_RATINGS = 10
+MIN_ELIGIBLE_PERFUMES = 50
 BATCH_SIZE = 100
+SYNC_BACKENDS = ['rest', 'async', 'copy']
+DEFAULT_CONCURRENCY = 4
+# Below this many rows, process start-up costs more than --workers saves
+PARALLEL_MIN_ROWS = 20000
+PAGE_SIZE = 1000  # PostgREST default max rows per response
+
+# Synced perfume fields compared by delta mode (everything we write except the key)
+CONTENT_HASH_FIELDS = [
+    'fingerprint_loose', 'name', 'brand_id', 'concentration_id', 'manufacturer_id',
+    'release_year', 'gender', 'top_notes', 'middle_notes', 'base_notes', 'perfumers',
+    'xsolve_score', 'xsolve_model_version', 'is_active', 'is_uncertain', 'is_linear',
+    'source_record_slug',
+]
+DEACTIVATE_CHUNK = 100  # fingerprints per PATCH (keeps the in.() filter URL short)
+REVISION_BATCH_SIZE = 1000
+REVISION_REASON = 'etl_v5 import'
+
+# Batch failure handling
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 0.5  # seconds, doubled on every attempt
+DEAD_LETTER_PATH = os.path.join(os.path.dirname(__file__), 'etl_v5_dead_letter.jsonl')
+MERGE_REPORT_PATH = os.path.join(os.path.dirname(__file__), 'etl_v5_merge_report.csv')
+# merge: union note lists across duplicate rows; keep-first: drop everything but the top-rated row
+DEDUP_STRATEGIES = ['merge', 'keep-first']
+# SQLSTATE classes worth retrying: connection, transaction rollback, resources, operator intervention
+TRANSIENT_SQLSTATE_CLASSES = ('08', '40', '53', '57')
+
+# (table, lookup column, source CSV column, has_slug, resolved id column)
+DIMENSIONS = [
+    ('brands', 'name', 'Brand', True, 'brand_id'),
+    ('concentrations', 'name', 'Concentration', True, 'concentration_id'),
+    ('manufacturers', 'name', 'Manufacturer', False, 'manufacturer_id'),
+]
+NOTE_CACHE_SIZE = 65536
+
+# Parsed pyramid columns -> source CSV columns
+PYRAMID_COLUMNS = {
+    'top_notes': 'Top Notes',
+    'middle_notes': 'Middle Notes',
+    'base_notes': 'Base Notes',
+    'perfumers': 'Perfumers',
+}
+NOTE_TIERS = ['top_notes', 'middle_notes', 'base_notes']
+# Junction rows per REST request when writing perfume_notes / perfume_perfumers
+LINK_BATCH_SIZE = 1000
+
+# Marketing qualifiers removed from note names (User defined)
+NOTE_REMOVE_WORDS = [
+    'absolute', 'scenttrek', 'orpur', 'co2', 'concrete', 'otto', 'nectar',
+    'material', 'resinoid', 'oxide'
+]
 
 # Load Environment Variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../.env'))
@@ -33,22 +123,157 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../.env'))
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") # Helper key for complete access
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    logger.error("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY in .env")
-    exit(1)
+def _frame_rows(pipeline, result, *args, **kwargs) -> int:
+    """Rows of the working frame, for @profiled stages that process all of it."""
+    return len(pipeline.df) if pipeline.df is not None else 0
+
+def is_transient_error(e: Exception) -> bool:
+    """Network failures, timeouts, 408/429/5xx and retryable SQLSTATEs; data errors are not transient."""
+    if isinstance(e, httpx.TransportError):
+        return True
+    if isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+    elif isinstance(e, APIError):
+        code = str(e.code) if e.code is not None else ''
+        if len(code) == 3 and code.isdigit():
+            # Non-JSON responses (e.g. a gateway error page) carry the HTTP status as code
+            status = int(code)
+        else:
+            return code.startswith(TRANSIENT_SQLSTATE_CLASSES)
+    else:
+        return False
+    return status in (408, 429) or status >= 500
+
+class NoteNormalizer:
+    """Note cleaner with precompiled patterns and a bounded LRU cache keyed on the raw note.
+
+    The vocabulary of distinct notes is tiny compared to the number of occurrences,
+    so almost every call after the first pass over the catalog is a cache hit.
+    """
+
+    def __init__(self, remove_words: List[str] = NOTE_REMOVE_WORDS, cache_size: int = NOTE_CACHE_SIZE):
+        # Sort by length to ensure longer phrases match first
+        words = sorted(remove_words, key=len, reverse=True)
+
+        self._special_chars = re.compile(r'[™®]')
+        self._prefixes = re.compile(r'\bLa Réunion\b', re.IGNORECASE)
+        self._qualifiers = re.compile(r'\b(' + '|'.join(map(re.escape, words)) + r')\b', re.IGNORECASE)
+        self._parentheses = re.compile(r'\(.*?\)')
+        self._spaces = re.compile(r'\s+')
+        self._trailing_punct = re.compile(r'[,\-]$')
+
+        self._clean_cached = lru_cache(maxsize=cache_size)(self._clean)
+
+    def _clean(self, text: str) -> str:
+        t = text.strip()
+
+        # 1. Remove Special Characters
+        t = self._special_chars.sub('', t)
+
+        # 2. Remove Specific Prefixes
+        t = self._prefixes.sub('', t)
+
+        # 3. Remove marketing qualifiers / Suffixes
+        t = self._qualifiers.sub('', t)
+
+        # Remove parentheses content
+        t = self._parentheses.sub('', t)
+
+        # Collapse spaces and remove punctuation
+        t = self._spaces.sub(' ', t).strip()
+        t = self._trailing_punct.sub('', t).strip()
+        # Interned so every occurrence of a note shares one string object
+        return sys.intern(t)
 
-# Initialize Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    def clean(self, note_text: Any) -> str:
+        """Clean individual note text removing marketing terms."""
+        if not note_text: return ""
+        return self._clean_cached(str(note_text))
+
+    def cache_stats(self) -> Dict[str, Any]:
+        info = self._clean_cached.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'maxsize': info.maxsize,
+            'hit_rate': info.hits / lookups if lookups else 0.0,
+        }
+
+    def log_cache_stats(self):
+        stats = self.cache_stats()
+        logger.info(
+            f"Note cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.1%} hit rate, {stats['size']} distinct notes)"
+        )
 
 class ETLPipelineV5:
-    def __init__(self, csv_path: str):
+    def __init__(self, csv_path: str, sink=None):
         self.csv_path = csv_path
+        # Destination (see etl_sinks.py); built from sink_kind on first use
+        self.sink_kind = 'supabase'
+        self._sink = sink
         self.df = None
+        self.note_normalizer = NoteNormalizer()
+        self.note_matrix: Optional[NoteIncidenceMatrix] = None
+        self.import_run_id: Optional[str] = None
+        self.dead_letter_path = DEAD_LETTER_PATH
+        self.dead_letters: List[Dict[str, Any]] = []
+        self.delta_stats: Optional[Dict[str, int]] = None
+        self.checkpoint_root = CHECKPOINT_ROOT
+        self.checkpoint: Optional[RunCheckpoint] = None
+        # Parquet artifacts keyed by the CSV hash (see catalog_cache.py)
+        self.use_cache = True
+        self.dedup_strategy = 'merge'
+        # MinHash/LSH pass over the deduplicated catalog (see near_duplicates.py)
+        self.detect_near_duplicates = False
+        self.near_duplicates: Optional[pd.DataFrame] = None
+        # Match new brand spellings to existing brands (see brand_resolver.py)
+        self.fuzzy_brands = True
+        self.brand_resolver: Optional[BrandResolver] = None
+        self.brand_reviews: List[Dict[str, Any]] = []
+        # Normalized notes / perfumers tables and their junctions (sync_note_links)
+        self.write_links = True
+        self.link_cache: Dict[str, Dict[str, str]] = {'notes': {}, 'perfumers': {}}
+        # Set by delta syncs: only these perfumes were written, so only they are relinked
+        self.synced_fingerprints: Optional[List[str]] = None
+        # Every source row in raw_import_rows for audit (see etl_staging.py)
+        self.stage_raw_rows = True
+        # Field diffs of updated perfumes in perfume_revisions (see etl_revisions.py). Off by
+        # default: it materializes the records and reads the whole perfumes table before the sync
+        self.track_revisions = False
+        self.revisions: Optional[pd.DataFrame] = None
+        self.merge_report: Optional[pd.DataFrame] = None
+        self.merge_report_path = MERGE_REPORT_PATH
+        self.csv_engine = 'c'
+        # Per-stage timings, memory and call counts (see etl_profiling.py); None = off
+        self.profiler: Optional[StageProfiler] = None
+        # Processes for note extraction and record building (see etl_parallel.py)
+        self.workers = 1
+        self._dead_letter_lock = threading.Lock()
         self.db_cache = {
             'brands': {},
             'concentrations': {},
             'manufacturers': {}
         }
+
+    @property
+    def db(self):
+        """The sink; Supabase credentials are only needed once something is read or written."""
+        if self._sink is None:
+            self._sink = make_sink(self.sink_kind, url=SUPABASE_URL, key=SUPABASE_KEY)
+        if self.profiler is not None:
+            self.profiler.watch(self._sink)
+        return self._sink
+
+    def sync_backend(self, backend: str) -> str:
+        """`backend`, or 'rest' when the sink cannot serve it (async needs PostgREST, copy a Postgres DSN)."""
+        if backend == 'async' and not isinstance(self.db, SupabaseSink) \
+                or backend == 'copy' and isinstance(self.db, SQLiteSink):
+            logger.warning(f"The {backend} backend is not available with the {type(self.db).__name__}, using rest")
+            return 'rest'
+        return backend
     
     def normalize_text(self, text: Any) -> str:
         """Lowercase, strip, single internal spaces."""
@@ -57,17 +282,19 @@ class ETLPipelineV5:
         text = text.lower().strip()
         return re.sub(r'\s+', ' ', text)
 
+    def _year_token(self, year: Any) -> str:
+        """Year as used in fingerprints: integer string, '0' when missing or unparseable."""
+        try:
+            return str(int(float(year))) if pd.notnull(year) and year != "" else "0"
+        except:
+            return "0"
+
     def generate_fingerprint_strict(self, brand: str, name: str, concentration: str, year: Any) -> str:
         """SHA256(norm(Brand)|norm(Name)|norm(Concentration)|Year)"""
         norm_brand = self.normalize_text(brand)
         norm_name = self.normalize_text(name)
         norm_conc = self.normalize_text(concentration)
-        
-        # Handle Year
-        try:
-            year_val = str(int(float(year))) if pd.notnull(year) and year != "" else "0"
-        except:
-            year_val = "0"
+        year_val = self._year_token(year)
             
         raw_str = f"{norm_brand}|{norm_name}|{norm_conc}|{year_val}"
         return hashlib.sha256(raw_str.encode('utf-8')).hexdigest()
@@ -79,88 +306,125 @@ class ETLPipelineV5:
         raw_str = f"{norm_brand}|{norm_name}"
         return hashlib.sha256(raw_str.encode('utf-8')).hexdigest()
 
+    def _map_unique(self, values: pd.Series, func) -> pd.Series:
+        """Apply a scalar function once per distinct value and broadcast the result back."""
+        codes, uniques = pd.factorize(values.astype(object), use_na_sentinel=False)
+        # Filled element-wise so list results are not broadcast into a 2-D array
+        mapped = np.empty(len(uniques), dtype=object)
+        for i, u in enumerate(uniques):
+            mapped[i] = func(u)
+        return pd.Series(mapped[codes], index=values.index, dtype=object)
+
+    def normalize_series(self, values: pd.Series) -> pd.Series:
+        """Column-wise normalize_text. Runs on object dtype so results match the scalar path exactly."""
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Normalize each category once; missing values (code -1) pick up the trailing ''
+            norm = self.normalize_series(pd.Series(values.cat.categories, dtype=object)).to_numpy(dtype=object)
+            mapped = np.append(norm, '')
+            return pd.Series(mapped[values.cat.codes.to_numpy()], index=values.index, dtype=object)
+        codes, uniques = pd.factorize(values.astype(object))
+        uniques = pd.Series(uniques, dtype=object)
+        is_str = uniques.map(lambda v: isinstance(v, str)).astype(bool)
+        norm = uniques.where(is_str, '').str.lower().str.strip().str.replace(r'\s+', ' ', regex=True)
+        mapped = np.append(norm.to_numpy(dtype=object), '')
+        return pd.Series(mapped[codes], index=values.index, dtype=object)
+
+    @staticmethod
+    def _sha256_hex(keys: pd.Series) -> List[str]:
+        sha256 = hashlib.sha256
+        return [sha256(k.encode('utf-8')).hexdigest() for k in keys]
+
+    def compute_fingerprints(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Columnar equivalent of generate_fingerprint_strict/loose, plus source_record_slug.
+
+        Each identity column is normalized once and the result is shared by both
+        fingerprints and the slug, so the per-row work is reduced to one hash.
+        """
+        norm_brand = self.normalize_series(df['Brand'])
+        norm_name = self.normalize_series(df['Name'])
+        norm_conc = self.normalize_series(df['Concentration'])
+        year_token = self._map_unique(df['Release Year'], self._year_token)
+
+        brand_name = norm_brand + '|' + norm_name
+        df['fingerprint_strict'] = self._sha256_hex(brand_name + '|' + norm_conc + '|' + year_token)
+        df['fingerprint_loose'] = self._sha256_hex(brand_name)
+
+        # Matches the legacy f-string in sync: normalize_text(str(Release Year))
+        norm_year = self._map_unique(df['Release Year'], lambda y: self.normalize_text(str(y)))
+        slug = norm_brand + '-' + norm_name + '-' + norm_conc + '-' + norm_year
+        df['source_record_slug'] = slug.str.slice(0, 250)
+        return df
+
     def slugify(self, text: str) -> str:
         """Simple slugify: lowercase, strip, replace non-alphanum with -"""
         text = self.normalize_text(text)
         text = re.sub(r'[^a-z0-9]+', '-', text)
         return text.strip('-')
 
-    def load_and_clean_data(self):
-        logger.info(f"Loading data from {self.csv_path}...")
-        
-        # Read with specific separation and decimal handling for the dataset
-        self.df = pd.read_csv(self.csv_path, sep=';', decimal=',')
-        
-        logger.info(f"Loaded {len(self.df)} rows. Cleaning data...")
+    @profiled(rows=_frame_rows)
+    def load_and_clean_data(self, dedup: bool = True):
+        """Parsed, typed and fingerprinted catalog. With dedup=False all source rows are
+        kept, for merge_duplicate_rows to collapse after note extraction."""
+        cached = load_cached_frame(self.csv_path, 'raw') if self.use_cache else None
+        if cached is not None:
+            # Same CSV bytes as the cached parse: types and fingerprints are already there
+            self.df = cached
+        else:
+            self._parse_and_fingerprint()
+            if self.use_cache:
+                save_cached_frame(self.df, self.csv_path, 'raw')
+
+        if not dedup:
+            return
 
-        # 1. Clean Column Names
-        self.df.columns = [c.strip() for c in self.df.columns]
-        
-        # 2. Basic Conversions
-        self.df['Release Year'] = pd.to_numeric(self.df['Release Year'], errors='coerce').fillna(0).astype(int)
-        self.df['Rating Count'] = pd.to_numeric(self.df['Rating Count'], errors='coerce').fillna(0).astype(int)
-        self.df['Rating Value'] = pd.to_numeric(self.df['Rating Value'], errors='coerce').fillna(0.0)
-        
-        # 3. Missing Values
-        self.df['Brand'] = self.df['Brand'].fillna('Unknown')
-        self.df['Name'] = self.df['Name'].fillna('Unknown')
-        self.df['Concentration'] = self.df['Concentration'].fillna('Unknown')
-        self.df['Manufacturer'] = self.df['Manufacturer'].fillna('Unknown')
-        
-        # 4. Generate Fingerprints
-        logger.info("Generating fingerprints...")
-        self.df['fingerprint_strict'] = self.df.apply(
-            lambda x: self.generate_fingerprint_strict(x['Brand'], x['Name'], x['Concentration'], x['Release Year']), axis=1
-        )
-        self.df['fingerprint_loose'] = self.df.apply(
-            lambda x: self.generate_fingerprint_loose(x['Brand'], x['Name']), axis=1
-        )
-        
         # 5. Deduplication (Group by fingerprint_strict)
         logger.info("Deduplicating...")
         initial_len = len(self.df)
         
-        # Key Aggregation Logic:
-        # - Rating Count: max
-        # - Notes/Accords: combine (simple string concatenation for now, ideal would be set union)
-        # - Others: first
-        self.df = self.df.sort_values('Rating Count', ascending=False).drop_duplicates('fingerprint_strict', keep='first')
+        # Keep-first: the top-rated row only (merge_duplicate_rows also unions the note lists)
+        # Stable sort: on equal Rating Count the earliest CSV row wins, as in the streaming mode
+        self.df = self.df.sort_values('Rating Count', ascending=False, kind='stable').drop_duplicates('fingerprint_strict', keep='first')
         
         logger.info(f"Deduplication removed {initial_len - len(self.df)} rows. Current count: {len(self.df)}")
 
-    def _clean_note(self, note_text):
-        """Clean individual note text removing marketing terms."""
-        if not note_text: return ""
-        t = str(note_text).strip()
-
-        # 1. Remove Special Characters
-        t = re.sub(r'[™®]', '', t)
+    def _parse_and_fingerprint(self):
+        logger.info(f"Loading data from {self.csv_path} ({self.csv_engine} engine, peak RSS {peak_rss_mb():.0f} MB)...")
         
-        # 2. Remove Specific Prefixes
-        t = re.sub(r'\bLa Réunion\b', '', t, flags=re.IGNORECASE)
-
-        # 3. Remove marketing qualifiers / Suffixes
-        # List merging User findings + Standard noise
-        remove_words = [
-            # User defined
-            'absolute', 'scenttrek', 'orpur', 'co2', 'concrete', 'otto', 'nectar', 
-            'material', 'resinoid', 'oxide'
-        ]
-        
-        # Sort by length to ensure longer phrases match first
-        remove_words.sort(key=len, reverse=True)
+        # 1. Declared schema: projected columns, categoricals, nullable numerics, stripped names
+        self.df = read_catalog_csv(self.csv_path, engine=self.csv_engine)
         
-        # Compiled pattern
-        pattern = re.compile(r'\b(' + '|'.join(map(re.escape, remove_words)) + r')\b', re.IGNORECASE)
-        t = pattern.sub('', t)
+        logger.info(f"Loaded {len(self.df)} rows. Cleaning data...")
+        self.clean_frame(self.df)
+        logger.info(
+            f"Frame uses {self.df.memory_usage(deep=True).sum() / 2**20:.0f} MB, "
+            f"peak RSS {peak_rss_mb():.0f} MB"
+        )
+
+    def clean_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Type coercion, missing values and fingerprints, in place (also used per chunk by etl_stream)."""
+        # 2. Basic Conversions (unparseable values were read as missing)
+        df['Release Year'] = df['Release Year'].fillna(0).astype('int32')
+        df['Rating Count'] = df['Rating Count'].fillna(0).astype('int32')
+        df['Rating Value'] = df['Rating Value'].fillna(0.0).astype('float32')
         
-        # Remove parentheses content
-        t = re.sub(r'\(.*?\)', '', t)
+        # 3. Missing Values
+        for column in ['Brand', 'Name', 'Concentration', 'Manufacturer']:
+            df[column] = self._fill_unknown(df[column])
         
-        # Collapse spaces and remove punctuation
-        t = re.sub(r'\s+', ' ', t).strip()
-        t = re.sub(r'[,\-]$', '', t).strip()
-        return t
+        # 4. Generate Fingerprints
+        logger.info("Generating fingerprints...")
+        self.compute_fingerprints(df)
+        return df
+
+    @staticmethod
+    def _fill_unknown(values: pd.Series) -> pd.Series:
+        if isinstance(values.dtype, pd.CategoricalDtype) and 'Unknown' not in values.cat.categories:
+            values = values.cat.add_categories(['Unknown'])
+        return values.fillna('Unknown')
+
+    def _clean_note(self, note_text):
+        """Clean individual note text removing marketing terms."""
+        return self.note_normalizer.clean(note_text)
 
     def _extract_list_cleaned(self, text_blob):
         """Extract lists from CSV string and clean each item."""
@@ -179,190 +443,306 @@ class ETLPipelineV5:
                 seen.add(c)
         return final
 
-    def calculate_xsolve_score(self):
-        logger.info("Calculating xSolve scores...")
-        
-        # Helper for note cleaning
+    @profiled(rows=_frame_rows)
+    def extract_note_pyramids(self):
+        """Parse Top/Middle/Base notes and Perfumers once into cleaned per-tier lists.
 
+        Scoring and sync both read these columns. Rows with the same raw text share
+        one list object, so the lists must be treated as read-only.
+        """
+        logger.info("Extracting note pyramids...")
+        if self._use_workers():
+            columns = ParallelStages(self.workers).note_pyramids(self.df)
+            for name, values in columns.items():
+                self.df[name] = pd.Series(values, index=self.df.index, dtype=None if name == 'note_count' else object)
+            logger.info(f"Pyramids extracted by {self.workers} workers")
+            return
 
-        # Prepare columns required for stats
-        self.df['gender_norm'] = self.df['Gender'].apply(self.normalize_text)
+        for target, source in PYRAMID_COLUMNS.items():
+            if source in self.df.columns:
+                self.df[target] = self._map_unique(self.df[source], self._extract_list_cleaned)
+            else:
+                self.df[target] = [[] for _ in range(len(self.df))]
 
-        # --- 0. Construct Full Note Pyramid for Stats ---
-        # User Rule: Use notes (Top/Mid/Base) for stats, not just Main Accords.
-        # Compute this for ALL perfumes first.
-        
-        def get_all_notes(row):
-            # Combine Top, Middle, Base
-            all_n = []
-            for col in ['Top Notes', 'Middle Notes', 'Base Notes']:
-                val = row.get(col)
-                if pd.notnull(val):
-                    all_n.extend(self._extract_list_cleaned(val))
-            return all_n
+        self.df['notes_list'], mask_no_notes = self._notes_list(self.df)
+        self.df['note_count'] = self.df['notes_list'].map(len)
+        logger.info(
+            f"Pyramids: {int(self.df['note_count'].mean()) if len(self.df) else 0} notes/perfume on average, "
+            f"{int(mask_no_notes.sum())} rows fell back to Main Accords."
+        )
+        self.note_normalizer.log_cache_stats()
+
+    def _notes_list(self, df: pd.DataFrame):
+        """Full pyramid per row, plus the mask of rows that fell back to Main Accords."""
+        # Full pyramid for stats (User Rule: use notes, not just Main Accords)
+        notes_list = df['top_notes'] + df['middle_notes'] + df['base_notes']
 
-        logger.info("Extracting note pyramids...")
-        self.df['notes_list'] = self.df.apply(get_all_notes, axis=1)
-        
         # Fallback to Main Accords if pyramid is empty
-        mask_no_notes = self.df['notes_list'].apply(len) == 0
-        if mask_no_notes.any():
-            self.df.loc[mask_no_notes, 'notes_list'] = self.df.loc[mask_no_notes, 'Main Accords'].fillna('').astype(str).apply(
-                lambda x: [self._clean_note(s) for s in x.split(',') if self._clean_note(s)]
+        mask_no_notes = notes_list.map(len) == 0
+        if mask_no_notes.any() and 'Main Accords' in df.columns:
+            accords = df.loc[mask_no_notes, 'Main Accords'].fillna('').astype(str)
+            notes_list[mask_no_notes] = self._map_unique(
+                accords, lambda x: [self._clean_note(s) for s in x.split(',') if self._clean_note(s)]
             )
-            
-        self.df['note_count'] = self.df['notes_list'].apply(len)
+        return notes_list, mask_no_notes
+
+    @profiled(rows=_frame_rows)
+    def merge_duplicate_rows(self):
+        """Collapse rows sharing fingerprint_strict, unioning their cleaned note tiers and perfumers.
 
+        The row with the highest Rating Count (first in the CSV on ties) is the
+        primary and keeps all its scalar fields. Its lists are extended with the
+        items the other rows add, in Rating Count order, so the primary's own
+        order comes first. Runs after extract_note_pyramids on the undeduplicated
+        frame; the result has the same rows, in the same order, as keep-first.
+        """
+        logger.info("Merging duplicates...")
+        initial_len = len(self.df)
+        ordered = self.df.sort_values('Rating Count', ascending=False, kind='stable')
+        fingerprints = ordered['fingerprint_strict']
+        is_primary = (~fingerprints.duplicated(keep='first')).to_numpy()
+        in_cluster = fingerprints.map(fingerprints.value_counts()).to_numpy() > 1
+
+        # Only multi-row clusters go through the explode pass
+        clusters = ordered[in_cluster]
+        primaries = ordered[is_primary].copy()
+        merged = primaries[in_cluster[is_primary]]
+        positions = np.flatnonzero(in_cluster[is_primary])
+
+        report = pd.DataFrame({
+            'fingerprint_strict': merged['fingerprint_strict'].to_numpy(),
+            'name': merged['Name'].astype(object).to_numpy(),
+            'brand': merged['Brand'].astype(object).to_numpy(),
+            'rows_merged': merged['fingerprint_strict'].map(fingerprints.value_counts()).to_numpy(),
+            'primary_rating_count': merged['Rating Count'].to_numpy(),
+            'max_duplicate_rating_count': merged['fingerprint_strict'].map(
+                clusters[~is_primary[in_cluster]].groupby('fingerprint_strict')['Rating Count'].max()
+            ).to_numpy(),
+        })
+
+        for column in PYRAMID_COLUMNS:
+            exploded = clusters[['fingerprint_strict', column]].explode(column).dropna(subset=[column])
+            # First occurrence wins: primary items in their order, then each duplicate's new items
+            exploded = exploded.drop_duplicates(['fingerprint_strict', column])
+            union = exploded.groupby('fingerprint_strict', sort=False)[column].agg(list)
+            union = merged['fingerprint_strict'].map(union).tolist()
+
+            values = primaries[column].to_numpy(dtype=object).copy()
+            for pos, items in zip(positions, union):
+                values[pos] = items if isinstance(items, list) else []
+            report[f'{column}_added'] = [len(values[pos]) for pos in positions] - merged[column].map(len).to_numpy()
+            primaries[column] = pd.Series(values, index=primaries.index, dtype=object)
+
+        if len(positions):
+            notes_list, _ = self._notes_list(primaries.iloc[positions])
+            values = primaries['notes_list'].to_numpy(dtype=object).copy()
+            for pos, notes in zip(positions, notes_list):
+                values[pos] = notes
+            primaries['notes_list'] = pd.Series(values, index=primaries.index, dtype=object)
+            primaries['note_count'] = primaries['notes_list'].map(len)
+
+        self.df = primaries
+        self.merge_report = report
+        added = int(report.filter(like='_added').to_numpy().sum())
+        logger.info(
+            f"Merged {initial_len - len(self.df)} duplicate rows into {len(report)} perfumes "
+            f"({added} list items added). Current count: {len(self.df)}"
+        )
+        return report
+
+    def save_merge_report(self):
+        if self.merge_report is None or self.merge_report.empty:
+            return
+        self.merge_report.to_csv(self.merge_report_path, index=False, sep=';')
+        logger.info(f"Wrote merge report for {len(self.merge_report)} perfumes to {self.merge_report_path}")
+
+    @profiled(rows=_frame_rows)
+    def calculate_xsolve_score(self):
+        logger.info("Calculating xSolve scores...")
+
+        # Prepare columns required for stats
+        self.df['gender_norm'] = self.normalize_series(self.df['Gender'])
+
+        if 'notes_list' not in self.df.columns:
+            self.extract_note_pyramids()
+
+        # --- Component 4 input: Note Rarity (Complexity) ---
+        # Calculated on ALL data (as requested)
+        self.note_matrix = NoteIncidenceMatrix.from_note_lists(
+            self.df['notes_list'],
+            keys=self.df['fingerprint_strict'] if 'fingerprint_strict' in self.df.columns else None
+        )
+        stats = self.score_statistics(
+            self.df['Rating Count'].to_numpy(),
+            self.df['gender_norm'].to_numpy(),
+            self.df['note_count'].to_numpy(),
+            self.note_matrix,
+        )
+        self.apply_xsolve_score(self.df, stats, stats['avg_note_rarity'])
+
+    def score_statistics(self, rating_counts: np.ndarray, genders: np.ndarray, note_counts: np.ndarray,
+                         note_matrix: NoteIncidenceMatrix) -> Dict[str, Any]:
+        """Population statistics the xSolve components are normalized against.
+
+        Inputs cover the whole deduplicated catalog, row-aligned with the note
+        matrix. The in-memory and streaming modes share this, so both score
+        against identical statistics.
+        """
+        stats = self.rating_statistics(rating_counts, genders)
+
+        # --- Component 3: Note Count ---
+        # Note: Note Count is calculated for ALL, but we only score eligible
+        max_notes = note_counts.max() if len(note_counts) else 0
+        if max_notes == 0: max_notes = 1
+
+        # --- Component 4: Note Rarity (Complexity) ---
+        avg_note_rarity = None
+        p95_rarity = None
+        if note_matrix.occurrences().sum() > 0:
+            # Calculate average rarity for ALL (metrics) but score only for ELIGIBLE
+            avg_note_rarity = note_matrix.mean_note_rarity()
+            # Normalize against p95 of ALL data (User Rule: "przy ich obliczaniu bierz pod uwagę cały dataset")
+            p95_rarity = np.percentile(avg_note_rarity, 95)
+
+        stats.update({
+            'max_notes': max_notes,
+            'avg_note_rarity': avg_note_rarity,
+            'p95_rarity': p95_rarity,
+        })
+        return stats
+
+    def rating_statistics(self, rating_counts: np.ndarray, genders: np.ndarray,
+                          threshold: int = ELIGIBLE_MIN_RATINGS,
+                          fallback_threshold: Optional[int] = FALLBACK_MIN_RATINGS) -> Dict[str, Any]:
+        """Eligibility threshold and the rating distributions of the eligible perfumes.
+
+        With `fallback_threshold` None the threshold is used as given, however few perfumes pass it.
+        """
         # --- Base Population for Difficulty (Eligible Only) ---
-        # User Rule: "Obliczaj xSolve tylko dla eligible (Rating >= 400)"
-        eligible_mask = self.df['Rating Count'] >= 400
-        
         # Fallback if too few eligible
-        if eligible_mask.sum() < 50:
-            logger.warning(f"Only {eligible_mask.sum()} eligible perfumes (>=400). Lowering threshold to >=10 for testing.")
-            eligible_mask = self.df['Rating Count'] >= 10
-            
-        df_stats = self.df[eligible_mask]
-        logger.info(f"Eligible population for xSolve scoring: {len(df_stats)} perfumes")
+        if fallback_threshold is not None and (rating_counts >= threshold).sum() < MIN_ELIGIBLE_PERFUMES:
+            logger.warning(f"Only {(rating_counts >= threshold).sum()} eligible perfumes (>={threshold}). "
+                           f"Lowering threshold to >={fallback_threshold} for testing.")
+            threshold = fallback_threshold
+
+        eligible = rating_counts >= threshold
+        eligible_ratings = rating_counts[eligible]
+        logger.info(f"Eligible population for xSolve scoring: {len(eligible_ratings)} perfumes")
 
         # --- Component 1: Obscurity Bonus (Global Rarity) ---
         # Log-scale rarity 
-        p99_rating = np.percentile(df_stats['Rating Count'], 99)
+        p99_rating = np.percentile(eligible_ratings, 99) if len(eligible_ratings) else 1
         p99_rating = max(p99_rating, 1) # Avoid div 0
-        
-        # Calculate for ELIGIBLE rows only (others will be NULL)
-        p99_rating = np.percentile(df_stats['Rating Count'], 99)
-        p99_rating = max(p99_rating, 1) # Avoid div 0
-        
-        # Initialize column with NaN
-        self.df['obscurity_raw'] = np.nan
-        
-        # Apply score only to eligible rows
-        self.df.loc[eligible_mask, 'obscurity_raw'] = 1.0 - (
-            np.log1p(np.minimum(self.df.loc[eligible_mask, 'Rating Count'], p99_rating)) / np.log1p(p99_rating)
-        )
-        
+
         # --- Component 2: Gender Adjustment (Contextual Rarity) ---
-        
-        # Calculate ranks based ONLY on eligible stats
-        # Create a mapping of {gender: list_of_ratings} to compute rank
-        # This is strictly approximation if we want to apply to ALL rows 
-        # but using only eligible distribution.
-        # Simpler approach: Calculate rank percentile on ALL data but strictly? 
-        # User said "okreslajmy on eligible".
-        
-        # Let's compute p_ranks for the eligible set boundaries
-        # We can assign a percentile to each rating *as if* it was in the eligible distribution
-        # For simplicity/speed in MVP: We will stick to global rank for Gender adjustment 
-        # (as gender distribution is roughly similar in head vs tail), OR:
-        # We calculate the percentile score of each perfume's rating against the Eligible distribution of that gender.
-        
+        # Each perfume's rating is ranked against the Eligible distribution of its gender
+        # (User said "okreslajmy on eligible").
         gender_ratings = {}
+        eligible_genders = genders[eligible]
         for g in ['Male', 'Female', 'Unisex']:
             g_norm = self.normalize_text(g)
-            # Get ratings of eligible perfumes for this gender
-            # Note: df_stats is the eligible subset
-            ratings = df_stats[df_stats['gender_norm'] == g_norm]['Rating Count'].values
-            gender_ratings[g_norm] = np.sort(ratings)
-
-        def get_gender_rarity(row):
-            g = row['gender_norm']
-            r = row['Rating Count']
-            if g not in gender_ratings or len(gender_ratings[g]) == 0:
-                return 0.5 # Default
-            
-            # Find position of r in sorted eligible ratings
-            # If r is smaller than all eligible (e.g. 1 vote), it's index 0 -> rarity 1.0 (very obscure)
-            # If r is larger than all, it's index len -> rarity 0.0 (very popular)
-            idx = np.searchsorted(gender_ratings[g], r)
-            n = len(gender_ratings[g])
-            pct = idx / n
-            return 1.0 - pct
-
-        self.df['gender_adj_raw'] = np.nan
-        self.df.loc[eligible_mask, 'gender_adj_raw'] = self.df.loc[eligible_mask].apply(get_gender_rarity, axis=1)
-        
-        # Note: Note Count is calculated for ALL, but we only score eligible
-        max_notes = self.df['note_count'].max()
-        if max_notes == 0: max_notes = 1
-        
-        self.df['note_count_factor_raw'] = np.nan
-        self.df.loc[eligible_mask, 'note_count_factor_raw'] = np.log1p(self.df.loc[eligible_mask, 'note_count']) / np.log1p(max_notes)
-        
-        # --- Component 4: Note Rarity (Complexity) ---
-        # Calculated on ALL data (as requested)
-        all_notes = [note for sublist in self.df['notes_list'] for note in sublist]
-        total_occurrences = len(all_notes)
-        if total_occurrences > 0:
-            note_counts = pd.Series(all_notes).value_counts()
-            note_freqs = note_counts / total_occurrences
-            
-            # Calculate average rarity
-            def get_avg_rarity(notes):
-                if not notes: return 0.0
-                rarities = [1.0 - note_freqs.get(n, 0.0) for n in notes]
-                return np.mean(rarities)
-            
-            # Calculate average rarity for ALL (metrics) but score only for ELIGIBLE
-            self.df['avg_note_rarity'] = self.df['notes_list'].apply(get_avg_rarity)
-            
-            # Normalize against p95 of ALL data (User Rule: "przy ich obliczaniu bierz pod uwagę cały dataset")
-            p95_rarity = np.percentile(self.df['avg_note_rarity'], 95)
-            
-            self.df['note_rarity_raw'] = np.nan
-            # Vectorized operation instead of apply with lambda
-            if p95_rarity > 0:
-                normalized_values = self.df.loc[eligible_mask, 'avg_note_rarity'] / p95_rarity
-                self.df.loc[eligible_mask, 'note_rarity_raw'] = normalized_values.clip(0, 1)
-            else:
-                self.df.loc[eligible_mask, 'note_rarity_raw'] = 0.0
-        else:
-            self.df['note_rarity_raw'] = np.nan
+            gender_ratings[g_norm] = np.sort(eligible_ratings[eligible_genders == g_norm])
 
-        # Weights
-        W_OBSCURITY = 0.40
-        W_GENDER = 0.30
-        W_COUNT = 0.15
-        W_RARITY = 0.15
-        
-        def clamp(x):
-            return max(0.0, min(1.0, float(x)))
+        return {
+            'eligible_threshold': threshold,
+            'p99_rating': p99_rating,
+            'gender_ratings': gender_ratings,
+        }
+
+    def apply_xsolve_score(self, df: pd.DataFrame, stats: Dict[str, Any], avg_note_rarity: Optional[np.ndarray]):
+        """Score the rows of `df` (all or a chunk of the catalog) against `stats`.
+
+        `df` needs Rating Count, gender_norm, note_count, Name, Brand and URL;
+        `avg_note_rarity` is row-aligned with it (None when the catalog has no notes).
+        """
+        rating_counts = df['Rating Count'].to_numpy()
+        eligible = rating_counts >= stats['eligible_threshold']
+        if avg_note_rarity is not None:
+            df['avg_note_rarity'] = avg_note_rarity
+        components = self.xsolve_components(rating_counts, df['gender_norm'].to_numpy(),
+                                            df['note_count'].to_numpy(), avg_note_rarity, stats)
+        for column, values in components.items():
+            df[column] = values
 
-        
         # --- Set is_active ---
         # Rule: Technical validity only (Name + Brand + URL exists)
         # Eligibility for game (Rating >= 400, Image) is handled by 'eligible_perfumes' view
         
         # We need to ensure Name and Brand are not 'Unknown' or empty, and URL is present
         # Normalize first to check for 'unknown'
-        self.df['is_active'] = (
-            (self.df['Name'].str.lower() != 'unknown') & 
-            (self.df['Name'].str.strip() != '') &
-            (self.df['Brand'].str.lower() != 'unknown') &
-            (self.df['Brand'].str.strip() != '') &
-            (self.df['URL'].notnull()) &
-            (self.df['URL'].str.strip() != '')
+        df['is_active'] = (
+            (df['Name'].str.lower() != 'unknown') & 
+            (df['Name'].str.strip() != '') &
+            (df['Brand'].str.lower() != 'unknown') &
+            (df['Brand'].str.strip() != '') &
+            (df['URL'].notnull()) &
+            (df['URL'].str.strip() != '')
         )
 
-        self.df['xsolve_score'] = np.nan
-        
-        # Calculate Final Score for ELIGIBLE rows
-        # Weighted Sum
-        score_series = (
-            self.df.loc[eligible_mask, 'obscurity_raw'] * W_OBSCURITY + 
-            self.df.loc[eligible_mask, 'gender_adj_raw'] * W_GENDER + 
-            self.df.loc[eligible_mask, 'note_count_factor_raw'] * W_COUNT + 
-            ('note_rarity_raw' in self.df.columns and self.df.loc[eligible_mask, 'note_rarity_raw']) * W_RARITY
-        )
-        
-        # Normalize to 0-1 range if needed, but components are 0-1 already (mostly)
-        self.df.loc[eligible_mask, 'xsolve_score'] = score_series.apply(clamp)
+        # Calculate Final Score for ELIGIBLE rows (components are NaN elsewhere)
+        df['xsolve_score'] = self.combine_xsolve_components(df)
 
         # Log check
-        logger.info(f"Calculated xSolve scores for {eligible_mask.sum()} eligible perfumes.")
-        logger.info(f"Mean Score (Eligible): {self.df.loc[eligible_mask, 'xsolve_score'].mean():.4f}")
-        logger.info(f"Non-eligible set to NULL: {(~eligible_mask).sum()} rows.")
+        logger.info(f"Calculated xSolve scores for {eligible.sum()} eligible perfumes.")
+        if eligible.any():
+            logger.info(f"Mean Score (Eligible): {df.loc[eligible, 'xsolve_score'].mean():.4f}")
+        logger.info(f"Non-eligible set to NULL: {(~eligible).sum()} rows.")
+
+    @staticmethod
+    def xsolve_components(rating_counts: np.ndarray, genders: np.ndarray, note_counts: np.ndarray,
+                          avg_note_rarity: Optional[np.ndarray], stats: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """The four component columns (XSOLVE_WEIGHTS order) for row-aligned inputs; NaN for non-eligible rows."""
+        # Plain arrays for the component maths; non-eligible rows stay NaN (NULL)
+        eligible = rating_counts >= stats['eligible_threshold']
+
+        # --- Component 1: Obscurity Bonus (Global Rarity) ---
+        p99_rating = stats['p99_rating']
+        # Calculate for ELIGIBLE rows only (others will be NULL)
+        obscurity = 1.0 - np.log1p(np.minimum(rating_counts, p99_rating)) / np.log1p(p99_rating)
 
+        # --- Component 2: Gender Adjustment (Contextual Rarity) ---
+        # Default for genders without an eligible distribution
+        gender_adj = np.where(eligible, 0.5, np.nan)
+        for g_norm, sorted_ratings in stats['gender_ratings'].items():
+            n = len(sorted_ratings)
+            if n == 0:
+                continue
+            rows = eligible & (genders == g_norm)
+            # Position of each rating in the sorted eligible ratings of its gender:
+            # below all eligible -> index 0 -> rarity 1.0 (very obscure),
+            # above all -> index n -> rarity 0.0 (very popular)
+            gender_adj[rows] = 1.0 - np.searchsorted(sorted_ratings, rating_counts[rows]) / n
+
+        # --- Component 3: Note Count ---
+        note_count_factor = np.log1p(note_counts) / np.log1p(stats['max_notes'])
+
+        # --- Component 4: Note Rarity (Complexity) ---
+        if avg_note_rarity is not None:
+            p95_rarity = stats['p95_rarity']
+            if p95_rarity > 0:
+                note_rarity = np.clip(avg_note_rarity / p95_rarity, 0, 1)
+            else:
+                note_rarity = 0.0
+            note_rarity = np.where(eligible, note_rarity, np.nan)
+        else:
+            note_rarity = np.full(len(rating_counts), np.nan)
+
+        return {
+            'obscurity_raw': np.where(eligible, obscurity, np.nan),
+            'gender_adj_raw': gender_adj,
+            'note_count_factor_raw': np.where(eligible, note_count_factor, np.nan),
+            'note_rarity_raw': note_rarity,
+        }
+
+    @staticmethod
+    def combine_xsolve_components(df: pd.DataFrame, weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Weighted sum of the component columns, clipped to 0-1 (NaN where the components are)."""
+        weights = weights or XSOLVE_WEIGHTS
+        score = sum(df[column].to_numpy(dtype=float) * weight for column, weight in weights.items())
+        # Normalize to 0-1 range if needed, but components are 0-1 already (mostly)
+        return np.clip(score, 0.0, 1.0)
+
+    @profiled(rows=lambda self, result, *args, **kwargs: 1)
     def _get_or_create_lookup(self, table: str, column: str, value: str, has_slug: bool = False) -> Optional[str]:
         """Simple cache-backed lookup/create for auxiliary tables."""
         if not value or str(value).lower() == 'unknown':
@@ -373,11 +753,14 @@ class ETLPipelineV5:
             return None
             
         # Check cache
-        if norm_val in self.db_cache[table]:
+        hit = norm_val in self.db_cache[table]
+        if self.profiler is not None:
+            self.profiler.cache(hit)
+        if hit:
             return self.db_cache[table][norm_val]
         
         # Try finding in DB
-        res = supabase.table(table).select('id').eq(column, value).limit(1).execute()
+        res = self.db.table(table).select('id').eq(column, value).limit(1).execute()
         if res.data:
             uuid = res.data[0]['id']
             self.db_cache[table][norm_val] = uuid
@@ -389,7 +772,7 @@ class ETLPipelineV5:
             if has_slug:
                 insert_data['slug'] = self.slugify(value)
                 
-            res = supabase.table(table).insert(insert_data).execute()
+            res = self.db.table(table).insert(insert_data).execute()
             if res.data:
                 uuid = res.data[0]['id']
                 self.db_cache[table][norm_val] = uuid
@@ -397,7 +780,7 @@ class ETLPipelineV5:
         except Exception as e:
             logger.warning(f"Failed to insert into {table}: {e}")
             # Try fetching again in case of race condition
-            res = supabase.table(table).select('id').eq(column, value).limit(1).execute()
+            res = self.db.table(table).select('id').eq(column, value).limit(1).execute()
             if res.data:
                 uuid = res.data[0]['id']
                 self.db_cache[table][norm_val] = uuid
@@ -405,103 +788,911 @@ class ETLPipelineV5:
             
         return None
 
+    def _fetch_all(self, table: str, columns: str, order: str = 'id') -> List[Dict[str, Any]]:
+        """Select a whole table page by page so rows past the API row cap are not dropped."""
+        rows = []
+        start = 0
+        while True:
+            res = self.db.table(table).select(columns).order(order).range(start, start + PAGE_SIZE - 1).execute()
+            rows.extend(res.data)
+            if len(res.data) < PAGE_SIZE:
+                return rows
+            start += PAGE_SIZE
+
+    @profiled(rows=lambda self, result: sum(len(cache) for cache in self.db_cache.values()))
     def prepoulate_cache(self):
         """Pre-fetch existing lookups to minimize requests."""
         logger.info("Pre-populating caches...")
-        for table, col in [('brands', 'name'), ('concentrations', 'name'), ('manufacturers', 'name')]:
-            # Fetch all (careful with memory if HUGE, but usually these are small < 10k)
-            # Pagination might be needed for production
-            res = supabase.table(table).select(f'id, {col}').execute()
-            for row in res.data:
+        for table, col, _, _, _ in DIMENSIONS:
+            for row in self._fetch_all(table, f'id, {col}'):
                 self.db_cache[table][self.normalize_text(row[col])] = row['id']
+        if self.fuzzy_brands:
+            self.brand_resolver = self._load_brand_resolver()
 
-    def sync_to_supabase(self):
-        logger.info("Syncing to Supabase...")
-        self.prepoulate_cache()
-        
-        records_to_upsert = []
-        
-        for _, row in tqdm(self.df.iterrows(), total=len(self.df), desc="Processing Rows"):
-            # 1. Resolve Dependencies
-            brand_id = self._get_or_create_lookup('brands', 'name', row['Brand'], has_slug=True)
-            conc_id = self._get_or_create_lookup('concentrations', 'name', row['Concentration'], has_slug=True)
-            manuf_id = self._get_or_create_lookup('manufacturers', 'name', row['Manufacturer'], has_slug=False)
+    def _load_brand_resolver(self) -> BrandResolver:
+        """Index the cached brands and their brand_aliases for fuzzy matching."""
+        resolver = BrandResolver()
+        brands = self.db_cache['brands']
+        for norm_val in brands:
+            resolver.add_brand(norm_val)
+        by_id = {brand_id: norm_val for norm_val, brand_id in brands.items()}
+        try:
+            aliases = self._fetch_all('brand_aliases', 'alias_norm, brand_id', order='alias_norm')
+        except Exception as e:
+            logger.warning(f"Could not load brand_aliases ({e}), matching on brand names only")
+            aliases = []
+        for row in aliases:
+            if row['brand_id'] in by_id:
+                resolver.add_alias(row['alias_norm'], by_id[row['brand_id']])
+        logger.info(f"Brand resolver: {len(resolver)} brands, {len(aliases)} aliases")
+        return resolver
 
-            
-            if not brand_id:
-                # Critical fail, skip this record or handle as conflict
+    def _match_brand_spellings(self, missing: pd.Series, norm: pd.Series) -> Dict[str, str]:
+        """Split unknown brand spellings into aliases of known brands and brands to create.
+
+        Returns {spelling: brand} for the aliases and drops them from the caller's
+        insert. Brands created in this call are indexed first, so later variants
+        in the same batch resolve to them. Weaker matches are created as new
+        brands and queued for review.
+        """
+        resolver = self.brand_resolver
+        aliases: Dict[str, str] = {}
+        first_row = None
+        for norm_val, value in missing.items():
+            match = resolver.lookup(norm_val)
+            if resolver.is_alias(match):
+                aliases[norm_val] = match.brand
                 continue
-                
-            # 2. Build Perfume Record
-            # Only essential fields + xSolve
-            perfume_data = {
-                'fingerprint_strict': row['fingerprint_strict'],
-                'fingerprint_loose': row['fingerprint_loose'],
-                'name': row['Name'],
-                'brand_id': brand_id,
-                'concentration_id': conc_id,
-                'manufacturer_id': manuf_id,
-                'release_year': int(row['Release Year']) if row['Release Year'] > 0 else None,
-                'gender': row['Gender'] if row['Gender'] in ['Male', 'Female', 'Unisex'] else None,
-                
-                # NEW SCHEMA COLUMNS (Cleaned Lists)
-                'top_notes': self._extract_list_cleaned(row['Top Notes']),
-                'middle_notes': self._extract_list_cleaned(row['Middle Notes']),
-                'base_notes': self._extract_list_cleaned(row['Base Notes']),
-                'perfumers': self._extract_list_cleaned(row['Perfumers']),
-
-                # EXCLUDED BY USER REQUEST:
-                # 'image_url': row['Image URL'], 
-                # 'rating_count': row['Rating Count'],
-                # 'rating_value': row['Rating Value'],
-                # 'main_accords': row['notes_list'],
-                # 'origin_url': row['URL'],
-
-                'xsolve_score': float(row['xsolve_score']) if pd.notnull(row['xsolve_score']) else None,
-                'xsolve_model_version': XSOLVE_MODEL_VERSION,
-                'is_active': bool(row['is_active']),
-                # CRITICAL: is_uncertain affects eligible_perfumes view
-                'is_uncertain': str(row['Is Uncertain']).lower() == 'true' if pd.notnull(row['Is Uncertain']) else False,
-                'is_linear': str(row['Is Linear']).lower() == 'true' if pd.notnull(row['Is Linear']) else False,
-                # Slugs are handled by DB triggers/functions usually, but we need source_slug
-                # CRITICAL: Must include concentration for uniqueness (same brand/name/year with different concentrations)
-                'source_record_slug': f"{self.normalize_text(row['Brand'])}-{self.normalize_text(row['Name'])}-{self.normalize_text(row['Concentration'])}-{self.normalize_text(str(row['Release Year']))}"[:250]
-            }
+            if match is not None:
+                if first_row is None:
+                    first_row = pd.Series(np.arange(len(norm))).groupby(norm.to_numpy()).first()
+                row = self.df.iloc[first_row[norm_val]]
+                self.brand_reviews.append({
+                    'brand_raw': value,
+                    'fp_strict': row.get('fingerprint_strict'),
+                    'fp_loose': row.get('fingerprint_loose'),
+                    'candidate': match.brand,
+                    'similarity': match.similarity,
+                })
+            resolver.add_brand(norm_val)
+        return aliases
+
+    def _save_brand_aliases(self, aliases: Dict[str, str]):
+        """Persist accepted spellings so the next run matches them exactly."""
+        rows = {}
+        for spelling, brand in aliases.items():
+            brand_id = self.db_cache['brands'].get(brand)
+            if brand_id is None:
+                continue
+            self.db_cache['brands'][spelling] = brand_id
+            # Spellings that only differ in accents or punctuation already match the brand name
+            if brand_key(spelling) != brand_key(brand):
+                rows[brand_key(spelling)] = {'alias_norm': brand_key(spelling), 'brand_id': brand_id}
+        logger.info(f"Matched {len(aliases)} brand spellings to existing brands")
+        if not rows:
+            return
+        try:
+            self.db.table('brand_aliases').upsert(list(rows.values()), on_conflict='alias_norm',
+                                                   ignore_duplicates=True).execute()
+        except Exception as e:
+            logger.warning(f"Could not save brand aliases: {e}")
+
+    def _insert_missing(self, table: str, column: str, values: pd.Series, has_slug: bool):
+        """Insert all missing values of one dimension in a single call and cache the new IDs."""
+        rows = []
+        slugs = set()
+        for norm_val, value in values.items():
+            row = {column: value}
+            if has_slug:
+                row['slug'] = self.slugify(value)
+                if row['slug'] in slugs:
+                    # Slug is UNIQUE; leave the collision to the row-wise path below
+                    continue
+                slugs.add(row['slug'])
+            rows.append(row)
+
+        try:
+            res = self.db.table(table).insert(rows).execute()
+            for row in res.data:
+                self.db_cache[table][self.normalize_text(row[column])] = row['id']
+        except Exception as e:
+            logger.warning(f"Bulk insert into {table} failed ({e}), falling back to row-wise lookups")
+
+        # Anything still unresolved (slug collisions, failed bulk insert) goes through the old path
+        for norm_val, value in values.items():
+            if norm_val not in self.db_cache[table]:
+                self._get_or_create_lookup(table, column, value, has_slug=has_slug)
+
+    @profiled(rows=_frame_rows)
+    def resolve_dimensions(self, refresh: bool = True):
+        """Map brands, concentrations and manufacturers to IDs in O(tables) round-trips.
+
+        Distinct normalized values are collected from the frame, existing IDs come
+        from a paginated bulk fetch, all missing values are inserted with one call
+        per table, and the IDs are mapped back as brand_id / concentration_id /
+        manufacturer_id columns. With refresh=False the existing db_cache is
+        trusted (values inserted by earlier calls are already in it), which is
+        how the streaming mode resolves chunk after chunk.
+        """
+        if refresh:
+            self.prepoulate_cache()
+
+        for table, column, source, has_slug, id_column in DIMENSIONS:
+            raw = self.df[source].astype(object)
+            norm = self.normalize_series(raw)
+            # Same exclusions as _get_or_create_lookup
+            valid = raw.notna() & (raw.astype(str).str.lower() != 'unknown') & (norm != '')
+
+            # First raw spelling seen for each normalized value
+            distinct = pd.Series(raw[valid].to_numpy(), index=norm[valid].to_numpy())
+            distinct = distinct[~distinct.index.duplicated(keep='first')]
+            missing = distinct[~distinct.index.isin(list(self.db_cache[table].keys()))]
+
+            aliases = {}
+            if table == 'brands' and self.brand_resolver is not None and len(missing):
+                aliases = self._match_brand_spellings(missing, norm)
+                missing = missing[~missing.index.isin(list(aliases))]
+
+            if len(missing):
+                logger.info(f"Creating {len(missing)} new {table}...")
+                self._insert_missing(table, column, missing, has_slug)
+            if aliases:
+                self._save_brand_aliases(aliases)
+
+            ids = norm.map(self.db_cache[table])
+            # Explicit object dtype keeps None (pandas would otherwise infer a string column with NaN)
+            self.df[id_column] = pd.Series(np.where(valid & ids.notna(), ids.astype(object), None),
+                                           index=self.df.index, dtype=object)
+            logger.info(f"Resolved {table}: {len(distinct)} distinct values, {int(self.df[id_column].notna().sum())} rows mapped")
+
+    def _build_perfume_record(self, row: pd.Series) -> Optional[Dict[str, Any]]:
+        # 1. Dependencies (resolved in bulk by resolve_dimensions)
+        brand_id, conc_id, manuf_id = (
+            row[c] if pd.notnull(row[c]) else None for c in ('brand_id', 'concentration_id', 'manufacturer_id')
+        )
+
+        if not brand_id:
+            # Critical fail, skip this record or handle as conflict
+            return None
+
+        # 2. Build Perfume Record
+        # Only essential fields + xSolve
+        return {
+            'fingerprint_strict': row['fingerprint_strict'],
+            'fingerprint_loose': row['fingerprint_loose'],
+            'name': row['Name'],
+            'brand_id': brand_id,
+            'concentration_id': conc_id,
+            'manufacturer_id': manuf_id,
+            'release_year': int(row['Release Year']) if row['Release Year'] > 0 else None,
+            'gender': row['Gender'] if row['Gender'] in ['Male', 'Female', 'Unisex'] else None,
             
+            # NEW SCHEMA COLUMNS (Cleaned Lists)
+            'top_notes': row['top_notes'],
+            'middle_notes': row['middle_notes'],
+            'base_notes': row['base_notes'],
+            'perfumers': row['perfumers'],
+
+            # EXCLUDED BY USER REQUEST:
+            # 'image_url': row['Image URL'], 
+            # 'rating_count': row['Rating Count'],
+            # 'rating_value': row['Rating Value'],
+            # 'main_accords': row['notes_list'],
+            # 'origin_url': row['URL'],
+
+            'xsolve_score': float(row['xsolve_score']) if pd.notnull(row['xsolve_score']) else None,
+            'xsolve_model_version': XSOLVE_MODEL_VERSION,
+            'is_active': bool(row['is_active']),
+            # CRITICAL: is_uncertain affects eligible_perfumes view
+            'is_uncertain': str(row['Is Uncertain']).lower() == 'true' if pd.notnull(row['Is Uncertain']) else False,
+            'is_linear': str(row['Is Linear']).lower() == 'true' if pd.notnull(row['Is Linear']) else False,
+            # Slugs are handled by DB triggers/functions usually, but we need source_slug
+            # CRITICAL: Must include concentration for uniqueness (same brand/name/year with different concentrations)
+            'source_record_slug': row['source_record_slug']
+        }
+
+    def _use_workers(self) -> bool:
+        return self.workers > 1 and len(self.df) >= PARALLEL_MIN_ROWS
+
+    def iter_perfume_records(self):
+        if self._use_workers():
+            # Shards come back in order, so the record sequence matches the serial one
+            yield from ParallelStages(self.workers).perfume_records(self.df)
+            return
+        for _, row in tqdm(self.df.iterrows(), total=len(self.df), desc="Processing Rows"):
+            record = self._build_perfume_record(row)
+            if record is not None:
+                yield record
+
+    @staticmethod
+    def content_hash(record: Dict[str, Any]) -> str:
+        """Hash of the synced fields, computed the same way for local records and fetched rows."""
+        values = []
+        for field in CONTENT_HASH_FIELDS:
+            v = record.get(field)
+            if isinstance(v, float):
+                # DB round-trips floats through text; compare at a fixed precision
+                v = round(v, 10)
+            elif isinstance(v, (list, tuple)):
+                v = list(v)
+            values.append(v)
+        return hashlib.sha256(json.dumps(values, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+    def fetch_perfume_snapshot(self) -> List[Dict[str, Any]]:
+        """Current id, fingerprint and synced fields of every perfume, in one paged read."""
+        return self._fetch_all('perfumes', 'id, fingerprint_strict, ' + ', '.join(CONTENT_HASH_FIELDS))
+
+    def plan_delta(self, records: List[Dict[str, Any]], existing: Optional[List[Dict[str, Any]]] = None):
+        """Hash-join local records against perfumes on fingerprint_strict.
+
+        Returns (records to send, fingerprints that vanished from the export, counts).
+        """
+        if existing is None:
+            existing = self.fetch_perfume_snapshot()
+        remote = pd.DataFrame({
+            'fingerprint_strict': [r['fingerprint_strict'] for r in existing],
+            'remote_hash': [self.content_hash(r) for r in existing],
+            'remote_active': [bool(r.get('is_active')) for r in existing],
+        }).dropna(subset=['fingerprint_strict']).drop_duplicates('fingerprint_strict')
+        local = pd.DataFrame({
+            'fingerprint_strict': [r['fingerprint_strict'] for r in records],
+            'local_hash': [self.content_hash(r) for r in records],
+            'position': np.arange(len(records)),
+        })
+
+        joined = local.merge(remote, on='fingerprint_strict', how='outer', indicator=True)
+        is_new = joined['_merge'] == 'left_only'
+        is_changed = (joined['_merge'] == 'both') & (joined['local_hash'] != joined['remote_hash'])
+        is_removed = (joined['_merge'] == 'right_only') & joined['remote_active'].fillna(False).astype(bool)
+
+        counts = {
+            'new': int(is_new.sum()),
+            'changed': int(is_changed.sum()),
+            'unchanged': int(((joined['_merge'] == 'both') & ~is_changed).sum()),
+            'removed': int(is_removed.sum()),
+        }
+        positions = joined.loc[is_new | is_changed, 'position'].astype(int).sort_values()
+        to_send = [records[i] for i in positions]
+        removed = joined.loc[is_removed, 'fingerprint_strict'].tolist()
+        return to_send, removed, counts
+
+    def deactivate_fingerprints(self, fingerprints: List[str]):
+        """Mark perfumes that vanished from the export as inactive."""
+        for i in range(0, len(fingerprints), DEACTIVATE_CHUNK):
+            chunk = fingerprints[i:i + DEACTIVATE_CHUNK]
+            self.db.table('perfumes').update({'is_active': False}).in_('fingerprint_strict', chunk).execute()
+        logger.info(f"Marked {len(fingerprints)} vanished perfumes as inactive")
+
+    @profiled(rows=_frame_rows)
+    def sync_to_supabase(self, backend: str = 'rest', concurrency: int = DEFAULT_CONCURRENCY,
+                         delta: bool = False, deactivate_missing: bool = False):
+        backend = self.sync_backend(backend)
+        logger.info(f"Syncing to Supabase ({backend} backend{', delta' if delta else ''})...")
+        checkpoint = self.checkpoint
+        if checkpoint is not None and checkpoint.reached('resolved'):
+            logger.info("Dimension IDs restored from checkpoint")
+        else:
+            self.resolve_dimensions()
+            if checkpoint is not None:
+                checkpoint.save_frame(self.df, 'resolved')
+
+        records = self.iter_perfume_records()
+        progress = None
+        if checkpoint is not None and not delta:
+            # Records come out in frame order, so the committed offset is a stable resume point.
+            # Delta runs need no offset: re-planning already skips everything that was written.
+            progress = BatchProgress(checkpoint, start=checkpoint.batch_offset)
+            if progress.offset:
+                logger.info(f"Skipping {progress.offset} records committed before the restart")
+                records = islice(records, progress.offset, None)
+        snapshot = None
+        if delta or self.track_revisions:
+            # One read of the table serves both the delta plan and the revision diffs
+            records = list(records)
+            snapshot = self.fetch_perfume_snapshot()
+        if delta:
+            records, removed, counts = self.plan_delta(records, snapshot)
+            self.synced_fingerprints = [r['fingerprint_strict'] for r in records]
+            self.delta_stats = counts
+            logger.info(
+                f"Delta: {counts['new']} new, {counts['changed']} changed, "
+                f"{counts['unchanged']} unchanged, {counts['removed']} removed"
+            )
+            if deactivate_missing and removed:
+                self.deactivate_fingerprints(removed)
+        if self.track_revisions:
+            self.revisions = field_diffs(records, snapshot, CONTENT_HASH_FIELDS)
+            snapshot = None
+
+        if backend == 'copy':
+            self._sync_copy(records, progress)
+        elif backend == 'async':
+            self._sync_async(records, concurrency, progress)
+        else:
+            self._sync_rest(records, progress)
+        if self.track_revisions:
+            self.record_revisions()
+
+    def record_revisions(self):
+        """Insert the planned field diffs into perfume_revisions, except for perfumes whose upsert failed."""
+        if self.revisions is None or self.revisions.empty:
+            return
+        failed = {d['record'].get('fingerprint_strict') for d in self.dead_letters}
+        revisions = self.revisions[~self.revisions['fingerprint_strict'].isin(failed)]
+        run_id = self._ensure_import_run()
+        rows = [{
+            'perfume_id': perfume_id,
+            'fingerprint_strict': fingerprint,
+            'diff_json': diff,
+            'reason': REVISION_REASON,
+            'import_run_id': run_id,
+        } for fingerprint, perfume_id, diff in zip(revisions['fingerprint_strict'], revisions['perfume_id'],
+                                                   revisions['diff'])]
+        try:
+            for start in range(0, len(rows), REVISION_BATCH_SIZE):
+                self.db.table('perfume_revisions').insert(rows[start:start + REVISION_BATCH_SIZE],
+                                                          returning=ReturnMethod.minimal).execute()
+            logger.info(f"Recorded {len(rows)} perfume revisions")
+        except Exception as e:
+            logger.error(f"Could not record perfume revisions: {e}")
+
+    def _sync_rest(self, records, progress: Optional[BatchProgress] = None):
+        records_to_upsert = []
+        
+        for perfume_data in records:
             records_to_upsert.append(perfume_data)
             
             # Batch Insert/Upsert
             if len(records_to_upsert) >= BATCH_SIZE:
                 self._batch_upsert(records_to_upsert)
+                if progress is not None:
+                    progress.advance(len(records_to_upsert))
                 records_to_upsert = []
 
         # Flush remaining
         if records_to_upsert:
             self._batch_upsert(records_to_upsert)
+            if progress is not None:
+                progress.advance(len(records_to_upsert))
+
+    def _sync_async(self, records, concurrency: int, progress: Optional[BatchProgress] = None):
+        """Overlap record building with up to `concurrency` in-flight PostgREST upserts."""
+        # Failed batches get the same retry/bisect/dead-letter treatment as the REST path
+        uploader = AsyncBatchUploader(self.db.url, self.db.key, concurrency=concurrency,
+                                      on_failed_batch=lambda batch, err: self._batch_upsert(batch),
+                                      on_batch_done=progress.batch_done if progress is not None else None)
+        stats = uploader.run(batched(records, BATCH_SIZE))
+        summary = stats.summary()
+        if self.profiler is not None:
+            # The uploader has its own HTTP client, outside the watched sink
+            self.profiler.count('network_calls', summary['batches'])
+        logger.info(
+            f"Async sync: {summary['rows']} rows in {summary['batches']} batches, "
+            f"{summary['rows_per_sec']} rows/sec with concurrency {concurrency} "
+            f"(latency p50 {summary['latency_p50_ms']}ms, p95 {summary['latency_p95_ms']}ms), "
+            f"{summary['failed_batches']} failed batches"
+        )
+        return stats
 
+    def _sync_copy(self, records, progress: Optional[BatchProgress] = None):
+        """Single COPY + merge over a direct Postgres connection."""
+        records = list(records)
+        conn = connect_from_env()
+        try:
+            PostgresCopyLoader(conn).upsert_perfumes(records)
+            if self.profiler is not None:
+                self.profiler.count('network_calls')
+            if progress is not None:
+                progress.advance(len(records))
+        except Exception as e:
+            # One bad row aborts the whole COPY transaction; isolate it through the REST path
+            logger.error(f"COPY merge failed ({e}), falling back to REST batches")
+            for i in range(0, len(records), BATCH_SIZE):
+                batch = records[i:i + BATCH_SIZE]
+                self._batch_upsert(batch)
+                if progress is not None:
+                    progress.advance(len(batch))
+        finally:
+            conn.close()
+
+    def _exploded_links(self, columns: List[str]) -> pd.DataFrame:
+        """One row per (fingerprint_strict, item, column) across the given list columns, in frame order."""
+        df = self.df
+        if self.synced_fingerprints is not None:
+            df = df[df['fingerprint_strict'].isin(self.synced_fingerprints)]
+        parts = []
+        for column in columns:
+            exploded = df[['fingerprint_strict', column]].explode(column).dropna(subset=[column])
+            parts.append(pd.DataFrame({
+                'fingerprint_strict': exploded['fingerprint_strict'].to_numpy(),
+                'item': exploded[column].to_numpy(),
+                'column': column,
+            }))
+        return pd.concat(parts, ignore_index=True)
+
+    def _insert_vocabulary(self, table: str, key: str, rows: List[Dict[str, Any]]):
+        """Bulk insert new vocabulary rows (PAGE_SIZE per call) and cache their IDs under `key`."""
+        cache = self.link_cache[table]
+        for start in range(0, len(rows), PAGE_SIZE):
+            try:
+                res = self.db.table(table).insert(rows[start:start + PAGE_SIZE]).execute()
+                for row in res.data:
+                    cache[row[key]] = row['id']
+            except Exception as e:
+                logger.warning(f"Bulk insert into {table} failed ({e}), re-reading the table")
+        if any(row[key] not in cache for row in rows):
+            # Rows inserted concurrently or rejected as duplicates of another spelling
+            for row in self._fetch_all(table, f'id, {key}'):
+                cache[row[key]] = row['id']
+
+    def prefetch_link_vocabularies(self):
+        """Load the existing notes (by slug) and perfumers (by name)."""
+        self.link_cache = {
+            'notes': {r['slug']: r['id'] for r in self._fetch_all('notes', 'id, slug')},
+            'perfumers': {r['name']: r['id'] for r in self._fetch_all('perfumers', 'id, name')},
+        }
+
+    def resolve_link_vocabularies(self, notes: pd.DataFrame, perfumers: pd.DataFrame):
+        """Map every note and perfumer in the exploded links to an ID, creating missing ones."""
+
+        # First spelling seen for each slug becomes the note's name
+        vocabulary = notes.drop_duplicates('slug')
+        missing = vocabulary[(vocabulary['slug'] != '') & ~vocabulary['slug'].isin(list(self.link_cache['notes']))]
+        if len(missing):
+            logger.info(f"Creating {len(missing)} new notes...")
+            self._insert_vocabulary('notes', 'slug', [
+                {'name': name, 'slug': slug, 'display_name': name}
+                for name, slug in zip(missing['item'], missing['slug'])
+            ])
+
+        names = perfumers['item'].drop_duplicates()
+        missing = names[~names.isin(list(self.link_cache['perfumers']))]
+        if len(missing):
+            logger.info(f"Creating {len(missing)} new perfumers...")
+            self._insert_vocabulary('perfumers', 'name', [{'name': name} for name in missing])
+
+    def _perfume_ids(self, fingerprints: Optional[List[str]] = None) -> Dict[str, str]:
+        """fingerprint_strict -> perfumes.id, for the whole table or just `fingerprints`."""
+        if fingerprints is None:
+            rows = self._fetch_all('perfumes', 'id, fingerprint_strict')
+        else:
+            rows = []
+            for start in range(0, len(fingerprints), DEACTIVATE_CHUNK):
+                chunk = fingerprints[start:start + DEACTIVATE_CHUNK]
+                rows.extend(self.db.table('perfumes').select('id, fingerprint_strict')
+                            .in_('fingerprint_strict', chunk).execute().data)
+        return {r['fingerprint_strict']: r['id'] for r in rows}
+
+    def build_link_rows(self, refresh: bool = True):
+        """perfume_notes and perfume_perfumers rows for the frame, plus the perfume IDs they cover.
+
+        Vocabularies are resolved in bulk first; rows are then mapped column-wise.
+        A note listed twice in one tier yields one link. With refresh=False the
+        cached vocabularies are trusted and only the frame's perfumes are looked
+        up, which is how the streaming mode links chunk after chunk.
+        """
+        if refresh:
+            self.prefetch_link_vocabularies()
+        notes = self._exploded_links(NOTE_TIERS)
+        notes['slug'] = self._map_unique(notes['item'], self.slugify)
+        perfumers = self._exploded_links(['perfumers'])
+        self.resolve_link_vocabularies(notes, perfumers)
+
+        if self.synced_fingerprints is not None:
+            scope = self.synced_fingerprints
+        else:
+            scope = self.df['fingerprint_strict'].drop_duplicates().tolist()
+        # For a full import, paging through the table beats filtering by fingerprint
+        perfume_ids = self._perfume_ids(None if refresh and self.synced_fingerprints is None else scope)
+        covered = [perfume_ids[fp] for fp in scope if fp in perfume_ids]
+
+        note_rows = pd.DataFrame({
+            'perfume_id': notes['fingerprint_strict'].map(perfume_ids),
+            'note_id': notes['slug'].map(self.link_cache['notes']),
+            'type': notes['column'].str.replace('_notes', '', regex=False),
+        }).dropna().drop_duplicates()
+        perfumer_rows = pd.DataFrame({
+            'perfume_id': perfumers['fingerprint_strict'].map(perfume_ids),
+            'perfumer_id': perfumers['item'].map(self.link_cache['perfumers']),
+        }).dropna().drop_duplicates()
+        return note_rows, perfumer_rows, covered
+
+    def _replace_links_rest(self, table: str, rows: pd.DataFrame, perfume_ids: List[str]):
+        """Delete the perfumes' links, then insert the new set: 2 calls per BATCH_SIZE perfumes."""
+        by_perfume: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows.to_dict('records'):
+            by_perfume.setdefault(row['perfume_id'], []).append(row)
+        for start in range(0, len(perfume_ids), BATCH_SIZE):
+            chunk = perfume_ids[start:start + BATCH_SIZE]
+            self.db.table(table).delete().in_('perfume_id', chunk).execute()
+            links = [row for pid in chunk for row in by_perfume.get(pid, [])]
+            for offset in range(0, len(links), LINK_BATCH_SIZE):
+                self.db.table(table).insert(links[offset:offset + LINK_BATCH_SIZE]).execute()
+
+    @profiled(rows=_frame_rows)
+    def sync_note_links(self, backend: str = 'rest', refresh: bool = True):
+        """Write notes/perfumers and the perfume_notes/perfume_perfumers junctions for the synced perfumes."""
+        backend = self.sync_backend(backend)
+        logger.info("Syncing note and perfumer links...")
+        note_rows, perfumer_rows, perfume_ids = self.build_link_rows(refresh=refresh)
+        if backend == 'copy':
+            conn = connect_from_env()
+            try:
+                loader = PostgresCopyLoader(conn)
+                loader.replace_links('perfume_notes', ['perfume_id', 'note_id', 'type'],
+                                     note_rows.to_dict('records'), perfume_ids)
+                loader.replace_links('perfume_perfumers', ['perfume_id', 'perfumer_id'],
+                                     perfumer_rows.to_dict('records'), perfume_ids)
+            finally:
+                conn.close()
+        else:
+            self._replace_links_rest('perfume_notes', note_rows, perfume_ids)
+            self._replace_links_rest('perfume_perfumers', perfumer_rows, perfume_ids)
+        logger.info(f"Linked {len(perfume_ids)} perfumes: {len(note_rows)} note links, "
+                    f"{len(perfumer_rows)} perfumer links")
+
+    def _upsert_request(self, records: List[Dict]):
+        # Conflict target is the UNIQUE NULLS NOT DISTINCT (brand_id, name, concentration_id, release_year) constraint
+        self.db.table('perfumes').upsert(records, on_conflict='brand_id,name,concentration_id,release_year', ignore_duplicates=False).execute()
+
+    def _upsert_with_retry(self, records: List[Dict]):
+        """Retry transient failures with exponential backoff; re-raise anything else."""
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                return self._upsert_request(records)
+            except Exception as e:
+                if attempt == MAX_RETRIES or not is_transient_error(e):
+                    raise
+                delay = RETRY_BASE_DELAY * 2 ** attempt
+                logger.warning(f"Transient error on batch of {len(records)} ({e}), retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+                time.sleep(delay)
+
+    @profiled(rows=lambda self, result, records: len(records))
     def _batch_upsert(self, records: List[Dict]):
+        """Upsert a batch; on a data error, bisect so one bad row costs O(log n) extra calls."""
         try:
-            # Using fingerprint_strict as conflict target if possible, key constraint is needed
-            # Schema says: UNIQUE NULLS NOT DISTINCT (brand_id, name, concentration_id, release_year)
-            # But we also have fingerprint_strict.
-            # Best is to rely on ON CONFLICT logic. Supabase-js/py defaults to upsert.
-            # We must specify the column(s) that define conflict. 
-            # If the schema doesn't have a UNIQUE constraint on fingerprint_strict, using it here won't work for UPSERT in same way.
-            # Looking at schema.sql: UNIQUE NULLS NOT DISTINCT (brand_id, name, concentration_id, release_year)
-            # We should probably map that.
-            
-            # For this MVP, we will try standard upsert.
-            supabase.table('perfumes').upsert(records, on_conflict='brand_id,name,concentration_id,release_year', ignore_duplicates=False).execute()
+            self._upsert_with_retry(records)
         except Exception as e:
-            logger.error(f"Batch upsert failed: {e}")
-            # Fallback to single insert to isolate specific errors could be added here
-            
-    def run(self):
-        self.load_and_clean_data()
+            if is_transient_error(e) or len(records) == 1:
+                # Out of retries (or a single bad row): park it instead of losing it
+                logger.error(f"Batch upsert failed for {len(records)} records: {e}")
+                for record in records:
+                    self._dead_letter(record, e)
+                return
+            mid = len(records) // 2
+            logger.warning(f"Batch of {len(records)} rejected ({e}), bisecting")
+            self._batch_upsert(records[:mid])
+            self._batch_upsert(records[mid:])
+
+    def _dead_letter(self, record: Dict[str, Any], error: Exception):
+        entry = {
+            'failed_at': datetime.now(timezone.utc).isoformat(),
+            'error': str(error),
+            'error_code': str(getattr(error, 'code', '') or ''),
+            'record': record,
+        }
+        # Async workers report failures from threads
+        with self._dead_letter_lock:
+            self.dead_letters.append(entry)
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+
+    def _ensure_import_run(self) -> str:
+        """Register this run in import_runs (once) and return its id."""
+        if self.import_run_id is None:
+            catalog_version = f"{os.path.basename(self.csv_path)}@{datetime.now(timezone.utc):%Y-%m-%dT%H:%M:%S}"
+            res = self.db.table('import_runs').insert({'catalog_version': catalog_version}).execute()
+            self.import_run_id = res.data[0]['id']
+        return self.import_run_id
+
+    def _record_conflicts(self, conflict_type: str, raw_rows: List[Dict[str, Any]], details: List[Dict[str, Any]]):
+        """Insert import_conflicts rows, each with the raw_import_rows row it references, BATCH_SIZE at a time."""
+        run_id = self._ensure_import_run()
+        for start in range(0, len(raw_rows), BATCH_SIZE):
+            raws = [{'import_run_id': run_id, **raw,
+                     'fp_strict': fingerprint_bytea(raw.get('fp_strict')),
+                     'fp_loose': fingerprint_bytea(raw.get('fp_loose'))}
+                    for raw in raw_rows[start:start + BATCH_SIZE]]
+            res = self.db.table('raw_import_rows').insert(raws).execute()
+            conflicts = [{
+                'import_run_id': run_id,
+                'raw_row_id': raw['id'],
+                'conflict_type': conflict_type,
+                'details': d,
+            } for raw, d in zip(res.data, details[start:start + BATCH_SIZE])]
+            self.db.table('import_conflicts').insert(conflicts).execute()
+
+    @profiled(rows=lambda self, result, *args, **kwargs: result)
+    def stage_raw_import_rows(self, backend: str = 'rest', resume: bool = False) -> int:
+        """Stream every source row of the CSV into raw_import_rows under this run."""
+        run_id = self._ensure_import_run()
+        backend = self.sync_backend(backend)
+        if resume:
+            # An interrupted attempt may have staged part of the file
+            self.db.table('raw_import_rows').delete().eq('import_run_id', run_id).execute()
+        start = time.perf_counter()
+        staged = RawRowStager(self).run(run_id, backend=backend)
+        logger.info(f"Staged {staged} raw import rows in {time.perf_counter() - start:.1f}s")
+        return staged
+
+    def record_dead_letters(self):
+        """Copy dead-lettered rows into import_conflicts (via raw_import_rows, which it references)."""
+        if not self.dead_letters:
+            return
+        logger.warning(f"{len(self.dead_letters)} records failed to sync, see {self.dead_letter_path}")
+        try:
+            raw_rows = [{
+                'name_raw': d['record'].get('name'),
+                'release_year': d['record'].get('release_year'),
+                'fp_strict': d['record'].get('fingerprint_strict'),
+                'fp_loose': d['record'].get('fingerprint_loose'),
+                'raw_json': d['record'],
+            } for d in self.dead_letters]
+            details = [{'error': d['error'], 'error_code': d['error_code']} for d in self.dead_letters]
+            self._record_conflicts('upsert_failed', raw_rows, details)
+        except Exception as e:
+            logger.error(f"Could not record dead letters in import_conflicts: {e}")
+
+    def record_brand_reviews(self):
+        """Queue new brands that resemble an existing one in import_conflicts for a manual merge decision."""
+        if not self.brand_reviews:
+            return
+        try:
+            raw_rows = [{k: r[k] for k in ('brand_raw', 'fp_strict', 'fp_loose')} for r in self.brand_reviews]
+            details = [{'candidate_brand': r['candidate'], 'similarity': r['similarity']} for r in self.brand_reviews]
+            self._record_conflicts('brand_review', raw_rows, details)
+            logger.info(f"Queued {len(raw_rows)} new brands for alias review")
+        except Exception as e:
+            logger.error(f"Could not record brand reviews in import_conflicts: {e}")
+
+    @profiled(rows=_frame_rows)
+    def find_near_duplicates(self, finder: Optional[NearDuplicateFinder] = None) -> pd.DataFrame:
+        """Suspected duplicates among the deduplicated perfumes, as fingerprint pairs.
+
+        `fingerprint_strict` is the lower-rated perfume of each pair, the one a
+        reviewer would fold into `duplicate_of`.
+        """
+        finder = finder or NearDuplicateFinder()
+        pairs = finder.find(self.df)
+        left, right = self.df.iloc[pairs['left']], self.df.iloc[pairs['right']]
+        self.near_duplicates = pd.DataFrame({
+            'fingerprint_strict': right['fingerprint_strict'].to_numpy(),
+            'duplicate_of': left['fingerprint_strict'].to_numpy(),
+            'similarity': pairs['similarity'].to_numpy(),
+            'year_diff': pairs['year_diff'].to_numpy(),
+            'same_loose': pairs['same_loose'].to_numpy(),
+        })
+        return self.near_duplicates
+
+    def record_near_duplicates(self):
+        """Queue the near-duplicate pairs for review in import_conflicts."""
+        if self.near_duplicates is None:
+            self.find_near_duplicates()
+        if self.near_duplicates.empty:
+            return
+        rows = self.df.set_index('fingerprint_strict')
+        suspects = rows.loc[self.near_duplicates['fingerprint_strict']]
+        originals = rows.loc[self.near_duplicates['duplicate_of']]
+        raw_rows = [{
+            'brand_raw': str(s['Brand']),
+            'name_raw': str(s['Name']),
+            'concentration_raw': str(s['Concentration']),
+            'release_year': int(s['Release Year']) if pd.notnull(s['Release Year']) else None,
+            'fp_strict': fp,
+            'fp_loose': s['fingerprint_loose'],
+        } for fp, (_, s) in zip(self.near_duplicates['fingerprint_strict'], suspects.iterrows())]
+        details = [{
+            'duplicate_of': pair.duplicate_of,
+            'duplicate_of_name': str(o['Name']),
+            'duplicate_of_brand': str(o['Brand']),
+            'similarity': float(pair.similarity),
+            'year_diff': None if pd.isna(pair.year_diff) else int(pair.year_diff),
+            'same_fingerprint_loose': bool(pair.same_loose),
+        } for pair, (_, o) in zip(self.near_duplicates.itertuples(), originals.iterrows())]
+        try:
+            self._record_conflicts('near_duplicate', raw_rows, details)
+            logger.info(f"Queued {len(raw_rows)} suspected near duplicates in import_conflicts")
+        except Exception as e:
+            logger.error(f"Could not record near duplicates in import_conflicts: {e}")
+
+    def save_note_matrix(self):
+        """Persist the incidence matrix in the source CSV's cache directory for analysis scripts."""
+        path = os.path.join(cache_dir(self.csv_path), 'note_matrix.npz')
+        self.note_matrix.save(path)
+        logger.info(f"Saved {self.note_matrix.shape[0]}x{self.note_matrix.shape[1]} note matrix to {path}")
+
+    def build_scored_catalog(self) -> pd.DataFrame:
+        """Load, deduplicate and score the CSV into self.df (and the scored cache)."""
+        merge = self.dedup_strategy == 'merge'
+        self.load_and_clean_data(dedup=not merge)
+        self.extract_note_pyramids()
+        if merge:
+            self.merge_duplicate_rows()
+            self.save_merge_report()
         self.calculate_xsolve_score()
-        self.sync_to_supabase()
+        self.save_note_matrix()
+        if self.detect_near_duplicates:
+            self.find_near_duplicates()
+        if self.use_cache:
+            save_cached_frame(self.df, self.csv_path, 'scored', meta=self.scored_cache_meta())
+        return self.df
+
+    def scored_cache_meta(self) -> Dict[str, str]:
+        """Settings the scored catalog artifact depends on besides the CSV itself."""
+        return {'dedup_strategy': self.dedup_strategy}
+
+    @profiled(rows=lambda self, result, *args, **kwargs: result['scored'])
+    def rescore(self, backend: str = 'rest', weights: Optional[Dict[str, float]] = None,
+                model_version: int = XSOLVE_MODEL_VERSION) -> Dict[str, int]:
+        """Recompute xsolve_score with `weights` and write back only the scores that changed."""
+        rescorer = XsolveRescorer(self, weights or XSOLVE_WEIGHTS, model_version)
+        return rescorer.run(self.sync_backend(backend))
+
+    def save_profile(self, status: str = 'completed') -> Optional[Dict[str, Any]]:
+        """Write the profiler's report to PROFILE_DIR and to this run's import_runs.stats."""
+        if self.profiler is None:
+            return None
+        run_id = self.import_run_id
+        report = self.profiler.finish(
+            run_id or f"run-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}",
+            run_id=run_id,
+            status=status,
+            csv_path=self.csv_path,
+            note_cache=self.note_normalizer.cache_stats(),
+        )
+        if run_id is not None:
+            try:
+                self.db.table('import_runs').update({'stats': report}).eq('id', run_id).execute()
+            except Exception as e:
+                logger.error(f"Could not store the profile in import_runs: {e}")
+        return report
+
+    def open_checkpoint(self, resume: Optional[str] = None) -> RunCheckpoint:
+        """Register a new run (import_runs row + local checkpoint), or reopen `resume`."""
+        if resume:
+            self.checkpoint = RunCheckpoint.load(resume, root=self.checkpoint_root)
+            self.import_run_id = resume
+            if self.checkpoint.state.get('csv_path') != self.csv_path:
+                logger.warning(f"Run {resume} was started from {self.checkpoint.state.get('csv_path')}, "
+                               f"resuming with its checkpointed data")
+            logger.info(f"Resuming run {resume} after stage '{self.checkpoint.stage}' "
+                        f"({self.checkpoint.batch_offset} records committed)")
+        else:
+            run_id = self._ensure_import_run()
+            self.checkpoint = RunCheckpoint.create(run_id, root=self.checkpoint_root, csv_path=self.csv_path)
+            logger.info(f"Started import run {run_id} (resume with --resume {run_id})")
+        return self.checkpoint
+
+    def run(self, backend: str = 'rest', concurrency: int = DEFAULT_CONCURRENCY,
+            delta: bool = False, deactivate_missing: bool = False, resume: Optional[str] = None):
+        checkpoint = self.open_checkpoint(resume)
+
+        if checkpoint.reached('scored'):
+            self.df = checkpoint.load_frame()
+            logger.info(f"Loaded {len(self.df)} scored rows from checkpoint")
+        else:
+            self.build_scored_catalog()
+            checkpoint.save_frame(self.df, 'scored')
+
+        if checkpoint.reached('synced'):
+            logger.info(f"Run {checkpoint.run_id} was already synced")
+        else:
+            self.sync_to_supabase(backend=backend, concurrency=concurrency,
+                                  delta=delta, deactivate_missing=deactivate_missing)
+            checkpoint.advance('synced')
+        if self.write_links and not checkpoint.reached('linked'):
+            self.sync_note_links(backend=backend)
+            checkpoint.advance('linked')
+        if self.stage_raw_rows and not checkpoint.reached('staged'):
+            self.stage_raw_import_rows(backend=backend, resume=bool(resume))
+            checkpoint.advance('staged')
+        self.record_dead_letters()
+        self.record_brand_reviews()
+        if self.detect_near_duplicates:
+            self.record_near_duplicates()
+        checkpoint.discard()
         logger.info("ETL Pipeline completed successfully.")
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fragrance catalog ETL (v5)")
+    parser.add_argument('--csv', default=os.path.join(os.path.dirname(__file__), '../data/dataset.csv'),
+                        help="Source CSV export")
+    parser.add_argument('--backend', choices=SYNC_BACKENDS, default='rest',
+                        help="rest: PostgREST upserts in batches of BATCH_SIZE; "
+                             "async: the same upserts with several batches in flight; "
+                             "copy: COPY into a temp table + one merge over a direct Postgres connection")
+    parser.add_argument('--sink', choices=SINKS, default='supabase',
+                        help="supabase: REST API; postgres: direct connection (SUPABASE_DB_URL); "
+                             "sqlite: local mirror of the ETL tables at --sqlite-path, no network")
+    parser.add_argument('--sqlite-path', default=None,
+                        help="Database file for --sink sqlite (default scripts/etl_local.db)")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="In-flight batches for the async backend")
+    parser.add_argument('--delta', action='store_true',
+                        help="Only send perfumes that are new or whose synced fields changed")
+    parser.add_argument('--deactivate-missing', action='store_true',
+                        help="With --delta, set is_active = false for fingerprints missing from the export")
+    parser.add_argument('--csv-engine', choices=CSV_ENGINES, default='c',
+                        help="pandas CSV parser; pyarrow is multithreaded")
+    parser.add_argument('--dedup', choices=DEDUP_STRATEGIES, default=None,
+                        help="merge: union notes and perfumers of duplicate rows into the top-rated one; "
+                             "keep-first: drop the other rows. Default merge, or keep-first "
+                             "(the only one supported) with --stream")
+    parser.add_argument('--near-duplicates', action='store_true',
+                        help="Queue MinHash/LSH suspected duplicates (spelling, concentration or year "
+                             "variants) for review in import_conflicts")
+    parser.add_argument('--no-fuzzy-brands', dest='fuzzy_brands', action='store_false',
+                        help="Create a brand for every new spelling instead of matching it to existing brands")
+    parser.add_argument('--no-links', dest='write_links', action='store_false',
+                        help="Skip the notes / perfumers tables and their perfume_notes / perfume_perfumers links")
+    parser.add_argument('--track-revisions', action='store_true',
+                        help="Record field diffs of updated perfumes in perfume_revisions (reads the "
+                             "perfumes table before syncing and gives up streaming records into the upload)")
+    parser.add_argument('--no-raw-rows', dest='stage_raw_rows', action='store_false',
+                        help="Do not stage the source rows in raw_import_rows")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processes for note extraction and record building")
+    parser.add_argument('--stream', action='store_true',
+                        help="Out-of-core mode: two passes over the CSV in chunks instead of one in-memory frame")
+    parser.add_argument('--chunk-size', type=int, default=50000,
+                        help="Rows per chunk with --stream")
+    parser.add_argument('--resume', metavar='RUN_ID',
+                        help="Continue an interrupted run from its last checkpointed stage and batch")
+    parser.add_argument('--rescore', action='store_true',
+                        help="Only recompute xsolve_score from the cached score components and update "
+                             "the perfumes whose score or model version changed")
+    parser.add_argument('--weights', type=float, nargs=4, metavar=('OBSCURITY', 'GENDER', 'COUNT', 'RARITY'),
+                        help="xSolve component weights for --rescore (default W_OBSCURITY, W_GENDER, "
+                             "W_COUNT, W_RARITY)")
+    parser.add_argument('--model-version', type=int, default=XSOLVE_MODEL_VERSION,
+                        help="xsolve_model_version written by --rescore")
+    parser.add_argument('--profile', action='store_true',
+                        help="Record wall/CPU time, peak RSS, rows/sec, sink calls and cache hits per stage "
+                             "in a JSON report (--profile-dir) and in import_runs.stats")
+    parser.add_argument('--profile-dump', choices=PROFILE_DUMPS,
+                        help="Also profile every function with cProfile (.prof) or pyinstrument (.html); "
+                             "implies --profile")
+    parser.add_argument('--profile-dir', default=PROFILE_DIR,
+                        help="Where --profile writes <run id>.json and the dump")
+    args = parser.parse_args(argv)
+    if args.stream and (args.delta or args.resume or args.near_duplicates or args.track_revisions
+                        or args.dedup == 'merge'):
+        parser.error("--stream cannot be combined with --delta, --resume, --near-duplicates, "
+                     "--track-revisions or --dedup merge")
+    args.dedup = args.dedup or ('keep-first' if args.stream else 'merge')
+    if args.rescore and (args.stream or args.delta or args.resume):
+        parser.error("--rescore cannot be combined with --stream, --delta or --resume")
+    if args.weights and not args.rescore:
+        parser.error("--weights only applies to --rescore")
+    return args
+
 if __name__ == "__main__":
-    pipeline = ETLPipelineV5(os.path.join(os.path.dirname(__file__), '../data/dataset.csv'))
-    pipeline.run()
+    args = parse_args()
+    pipeline = ETLPipelineV5(args.csv, sink=make_sink(args.sink, url=SUPABASE_URL, key=SUPABASE_KEY,
+                                                      path=args.sqlite_path))
+    pipeline.csv_engine = args.csv_engine
+    pipeline.workers = args.workers
+    pipeline.dedup_strategy = args.dedup
+    pipeline.detect_near_duplicates = args.near_duplicates
+    pipeline.fuzzy_brands = args.fuzzy_brands
+    pipeline.write_links = args.write_links
+    pipeline.stage_raw_rows = args.stage_raw_rows
+    pipeline.track_revisions = args.track_revisions
+    if args.profile or args.profile_dump:
+        pipeline.profiler = StageProfiler(dump=args.profile_dump, output_dir=args.profile_dir)
+        pipeline.profiler.start()
+    # Failed and interrupted runs are the ones worth profiling, so the report is saved either way
+    status = 'failed'
+    try:
+        if args.rescore:
+            weights = dict(zip(XSOLVE_WEIGHTS, args.weights)) if args.weights else None
+            pipeline.rescore(backend=args.backend, weights=weights, model_version=args.model_version)
+        elif args.stream:
+            from etl_stream import StreamingCatalog
+            StreamingCatalog(pipeline, chunk_size=args.chunk_size).run(backend=args.backend, concurrency=args.concurrency)
+        else:
+            pipeline.run(backend=args.backend, concurrency=args.concurrency,
+                         delta=args.delta, deactivate_missing=args.deactivate_missing, resume=args.resume)
+        status = 'completed'
+    finally:
+        pipeline.save_profile(status)
@@ -2,6 +2,11 @@ import pandas as pd
 import hashlib
 import re
 
+from catalog_cache import load_cached_frame
+
+CSV_PATH = 'e:/fragrance-game/fragrance-webapp/data/dataset.csv'
+REPORT_COLUMNS = ['Name', 'Brand', 'Concentration', 'Release Year', 'Rating Count', 'Image URL', 'URL']
+
 # Same normalization as etl_v5.py
 def normalize_text(text):
     if pd.isna(text) or text is None:
@@ -18,12 +23,17 @@ def get_fingerprint(row):
     fp_str = f"{brand}|{name}|{conc}|{year}"
     return hashlib.sha256(fp_str.encode()).hexdigest()
 
-# Load
-df = pd.read_csv('e:/fragrance-game/fragrance-webapp/data/dataset.csv', sep=';', decimal=',')
-print(f"Total raw rows: {len(df)}")
+# Load (fingerprints come precomputed from the etl_v5.py cache when it matches the CSV)
+df = load_cached_frame(CSV_PATH, 'raw', columns=REPORT_COLUMNS + ['fingerprint_strict'])
+if df is not None:
+    print(f"Total raw rows: {len(df)} (catalog cache)")
+    df['temp_fp'] = df['fingerprint_strict']
+else:
+    df = pd.read_csv(CSV_PATH, sep=';', decimal=',')
+    print(f"Total raw rows: {len(df)}")
 
-# Apply temporary FP Column
-df['temp_fp'] = df.apply(get_fingerprint, axis=1)
+    # Apply temporary FP Column
+    df['temp_fp'] = df.apply(get_fingerprint, axis=1)
 
 # Sort by Rating Count to pick best
 df_sorted = df.sort_values(by='Rating Count', ascending=False)
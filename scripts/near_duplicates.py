@@ -0,0 +1,220 @@
+"""
+Near-duplicate perfumes that exact fingerprints miss ("EDP" vs "Eau de Parfum",
+flanker spelling variants, a release year off by one).
+
+Each perfume becomes the set of character shingles of its unaccented
+"brand name concentration" text. MinHash signatures approximate the Jaccard
+similarity of those sets, and LSH banding only pairs up perfumes that agree on
+a whole band of their signature, so the work grows with the catalog instead of
+with every pair of it.
+
+    finder = NearDuplicateFinder()
+    pairs = finder.find(df)    # DataFrame of left/right row positions and similarity
+
+Shingles are built and hashed with numpy over the concatenated texts; there is
+no per-perfume Python loop after the text normalization.
+"""
+
+import logging
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+# 16 bands of 4 rows: pairs above ~0.5 similarity collide in some band with high probability
+NUM_BANDS = 16
+# Reported pairs; the estimate's standard error at 64 permutations is about 0.06
+SIMILARITY_THRESHOLD = 0.8
+# LSH buckets with more rows than this are skipped: they come from boilerplate
+# names and would add quadratically many pairs. Rows that differ somewhere can
+# still meet in other bands, but identical signatures collide in every band, so
+# such groups are paired separately (each member with the group's first row)
+MAX_BUCKET = 50
+SEED = 20240501
+
+# Spelled-out forms, so abbreviations and full names shingle the same way
+CONCENTRATION_ALIASES: Dict[str, str] = {
+    'edp': 'eau de parfum',
+    'edt': 'eau de toilette',
+    'edc': 'eau de cologne',
+    'edf': 'eau fraiche',
+    'pdt': 'parfum de toilette',
+    'extrait': 'extrait de parfum',
+}
+_ALIAS_RE = re.compile(r'\b(' + '|'.join(CONCENTRATION_ALIASES) + r')\b')
+_NUMBER_RE = re.compile(r'\d+')
+
+
+def shingle_text(brand: str, name: str, concentration: str) -> str:
+    """Lowercase, unaccented, punctuation-free text the shingles are taken from."""
+    text = ' '.join(str(v) for v in (brand, name, concentration) if isinstance(v, str))
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r'[^a-z0-9]+', ' ', text).strip()
+    text = _ALIAS_RE.sub(lambda m: CONCENTRATION_ALIASES[m.group(1)], text)
+    # Texts shorter than one shingle still need a (single) shingle
+    return text.ljust(SHINGLE_SIZE)
+
+
+def number_tokens(text: str) -> str:
+    """Numbers in a shingle text. "No 5" and "No 19" shingle alike but are different perfumes."""
+    return ' '.join(sorted(_NUMBER_RE.findall(text)))
+
+
+def _shingle_codes(texts: List[str], k: int):
+    """Every k-character window of every text as one int64, and the start of each text's windows.
+
+    Code points are below 2**21, so k <= 3 windows pack losslessly.
+    """
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    chars = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+    starts = np.zeros(len(texts), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+
+    counts = lengths - k + 1
+    indptr = np.zeros(len(texts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=indptr[1:])
+    # Window start positions in `chars`, never crossing into the next text
+    positions = np.repeat(starts - indptr, counts) + np.arange(counts.sum())
+
+    codes = np.zeros(len(positions), dtype=np.int64)
+    for offset in range(k):
+        codes = (codes << 21) | chars[positions + offset]
+    return codes, indptr
+
+
+class NearDuplicateFinder:
+    def __init__(self, num_perm: int = NUM_PERM, num_bands: int = NUM_BANDS,
+                 threshold: float = SIMILARITY_THRESHOLD, max_bucket: int = MAX_BUCKET, seed: int = SEED):
+        if num_perm % num_bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of num_bands ({num_bands})")
+        self.num_perm = num_perm
+        self.num_bands = num_bands
+        self.threshold = threshold
+        self.max_bucket = max_bucket
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: odd 64-bit multipliers, top 32 bits of a*x + b (mod 2**64)
+        self._mult = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._add = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self._band_mix = rng.integers(1, 2 ** 63, size=num_perm // num_bands, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+    def signatures(self, texts: Iterable[str]) -> np.ndarray:
+        """(n, num_perm) uint32 MinHash signatures of the texts' shingle sets."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.num_perm), dtype=np.uint32)
+        codes, indptr = _shingle_codes(texts, SHINGLE_SIZE)
+        codes = codes.astype(np.uint64)
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        with np.errstate(over='ignore'):
+            for i in range(self.num_perm):
+                hashed = (self._mult[i] * codes + self._add[i]) >> np.uint64(32)
+                signatures[:, i] = np.minimum.reduceat(hashed, indptr)
+        return signatures
+
+    def candidate_pairs(self, signatures: np.ndarray) -> np.ndarray:
+        """(m, 2) row pairs, left < right, that share at least one LSH band."""
+        n = len(signatures)
+        rows = self.num_perm // self.num_bands
+        per_band: List[np.ndarray] = []
+        skipped = 0
+        with np.errstate(over='ignore'):
+            for band in range(self.num_bands):
+                block = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+                keys = (block * self._band_mix).sum(axis=1)
+                order = np.argsort(keys, kind='stable')
+                sorted_keys = keys[order]
+
+                # Bucket size of every row, in key order
+                bounds = np.flatnonzero(np.diff(sorted_keys)) + 1
+                sizes = np.diff(np.concatenate(([0], bounds, [n])))
+                size = np.repeat(sizes, sizes)
+                skipped += int(sizes[sizes > self.max_bucket].sum())
+                usable = (size > 1) & (size <= self.max_bucket)
+                order, sorted_keys = order[usable], sorted_keys[usable]
+
+                # Rows d apart in key order share a bucket iff their keys are equal
+                found = [np.zeros(0, dtype=np.int64)]
+                for d in range(1, min(int(sizes.max(initial=0)), self.max_bucket)):
+                    same = sorted_keys[d:] == sorted_keys[:-d]
+                    left, right = order[:-d][same], order[d:][same]
+                    found.append(np.minimum(left, right) * n + np.maximum(left, right))
+                per_band.append(np.unique(np.concatenate(found)))
+        if skipped:
+            logger.info(f"Skipped {skipped} band entries in LSH buckets over {self.max_bucket} rows")
+        per_band.append(self._identical_signature_pairs(signatures))
+        encoded = np.unique(np.concatenate(per_band))
+        return np.column_stack((encoded // n, encoded % n)) if n else np.zeros((0, 2), dtype=np.int64)
+
+    def _identical_signature_pairs(self, signatures: np.ndarray) -> np.ndarray:
+        """Encoded pairs (first row, member) of identical-signature groups over max_bucket rows.
+
+        Such groups fall in an oversized bucket of every band and are never paired there.
+        """
+        n = len(signatures)
+        if n <= self.max_bucket:
+            return np.zeros(0, dtype=np.int64)
+        _, inverse, counts = np.unique(signatures, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        first = np.full(len(counts), n, dtype=np.int64)
+        np.minimum.at(first, inverse, np.arange(n))
+        members = np.flatnonzero(counts[inverse] > self.max_bucket)
+        members = members[members != first[inverse[members]]]
+        return first[inverse[members]] * n + members
+
+    @staticmethod
+    def similarity(signatures: np.ndarray, pairs: np.ndarray, chunk: int = 100000) -> np.ndarray:
+        """Estimated Jaccard similarity: the share of signature positions the pair agrees on."""
+        result = np.empty(len(pairs), dtype=np.float32)
+        for start in range(0, len(pairs), chunk):
+            p = pairs[start:start + chunk]
+            result[start:start + chunk] = (signatures[p[:, 0]] == signatures[p[:, 1]]).mean(axis=1)
+        return result
+
+    def find(self, df: pd.DataFrame, texts: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Suspected duplicate pairs among the rows of `df`, above the similarity threshold.
+
+        Rows sharing fingerprint_strict are exact duplicates and are not reported,
+        nor are pairs whose texts contain different numbers. `left`/`right` are
+        row positions; `right` is the lower-rated row of the pair.
+        """
+        if texts is None:
+            texts = [shingle_text(b, n, c) for b, n, c in zip(
+                df['Brand'].astype(object), df['Name'].astype(object), df['Concentration'].astype(object))]
+        texts = list(texts)
+        signatures = self.signatures(texts)
+        pairs = self.candidate_pairs(signatures)
+        similarity = self.similarity(signatures, pairs)
+        logger.info(f"Near duplicates: {len(pairs)} LSH candidate pairs among {len(df)} perfumes")
+
+        keep = similarity >= self.threshold
+        fingerprints = df['fingerprint_strict'].to_numpy(dtype=object)
+        keep &= fingerprints[pairs[:, 0]] != fingerprints[pairs[:, 1]]
+        numbers = np.array([number_tokens(t) for t in texts], dtype=object)
+        keep &= numbers[pairs[:, 0]] == numbers[pairs[:, 1]]
+        pairs, similarity = pairs[keep], similarity[keep]
+
+        # Higher Rating Count (then earlier row) on the left
+        ratings = df['Rating Count'].fillna(0).to_numpy(dtype=np.int64)
+        swap = ratings[pairs[:, 1]] > ratings[pairs[:, 0]]
+        left = np.where(swap, pairs[:, 1], pairs[:, 0])
+        right = np.where(swap, pairs[:, 0], pairs[:, 1])
+
+        years = pd.to_numeric(df['Release Year'], errors='coerce').to_numpy(dtype=float)
+        loose = df['fingerprint_loose'].to_numpy(dtype=object)
+        result = pd.DataFrame({
+            'left': left,
+            'right': right,
+            'similarity': similarity.round(3),
+            'year_diff': np.abs(years[left] - years[right]),
+            'same_loose': loose[left] == loose[right],
+        })
+        result = result.sort_values(['similarity', 'left', 'right'], ascending=[False, True, True], kind='stable')
+        logger.info(f"Near duplicates: {len(result)} pairs at similarity >= {self.threshold}")
+        return result.reset_index(drop=True)
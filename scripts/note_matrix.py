@@ -0,0 +1,126 @@
+"""
+Perfume-by-note incidence matrix and note rarity statistics.
+
+Rows follow catalog order, columns a stable note vocabulary. Cells count
+occurrences, so a note listed in two tiers of the same pyramid counts twice,
+which is how etl_v5 has always weighted note frequencies.
+
+Usage:
+    from note_matrix import NoteIncidenceMatrix
+
+    matrix = NoteIncidenceMatrix.from_note_lists(df['notes_list'], keys=df['fingerprint_strict'])
+    matrix.mean_note_rarity()
+    matrix.save(DEFAULT_MATRIX_PATH)
+
+    matrix = NoteIncidenceMatrix.load(DEFAULT_MATRIX_PATH)
+"""
+
+import os
+from itertools import chain
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+from scipy import sparse
+
+DEFAULT_MATRIX_PATH = os.path.join(os.path.dirname(__file__), '../data/cache/note_matrix.npz')
+
+
+class NoteIncidenceMatrix:
+    def __init__(self, matrix: sparse.csr_matrix, vocabulary: Sequence[str], keys: Optional[Sequence[str]] = None):
+        self.matrix = matrix
+        self.vocabulary = list(vocabulary)
+        self.keys = list(keys) if keys is not None else None
+        self._index = None
+
+    @classmethod
+    def from_note_lists(cls, note_lists: Iterable[List[str]], keys: Optional[Iterable[str]] = None,
+                        vocabulary: Optional[Sequence[str]] = None) -> 'NoteIncidenceMatrix':
+        """Build the CSR matrix from per-perfume note lists.
+
+        Passing the vocabulary of a previous matrix keeps existing note IDs stable;
+        unseen notes are appended in sorted order.
+        """
+        note_lists = list(note_lists)
+        lengths = np.fromiter(map(len, note_lists), dtype=np.int64, count=len(note_lists))
+        flat = list(chain.from_iterable(note_lists))
+
+        vocabulary = list(vocabulary) if vocabulary is not None else []
+        known = set(vocabulary)
+        vocabulary.extend(sorted(set(flat) - known))
+        index = {note: i for i, note in enumerate(vocabulary)}
+
+        indices = np.fromiter((index[n] for n in flat), dtype=np.int32, count=len(flat))
+        indptr = np.zeros(len(note_lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        data = np.ones(len(flat), dtype=np.float64)
+
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(note_lists), len(vocabulary)))
+        # Repeated notes within a perfume collapse into one cell holding the count
+        matrix.sum_duplicates()
+        return cls(matrix, vocabulary, keys=list(keys) if keys is not None else None)
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def note_id(self, note: str) -> Optional[int]:
+        if self._index is None:
+            self._index = {n: i for i, n in enumerate(self.vocabulary)}
+        return self._index.get(note)
+
+    def occurrences(self) -> np.ndarray:
+        """Total occurrences per note (column sums)."""
+        return np.asarray(self.matrix.sum(axis=0)).ravel()
+
+    def note_counts(self) -> np.ndarray:
+        """Occurrences per perfume (row sums), i.e. the length of each note list."""
+        return np.asarray(self.matrix.sum(axis=1)).ravel()
+
+    def document_frequency(self) -> np.ndarray:
+        """Number of perfumes containing each note."""
+        return np.bincount(self.matrix.indices, minlength=len(self.vocabulary))
+
+    def note_frequencies(self) -> np.ndarray:
+        """Share of all note occurrences taken by each note."""
+        occurrences = self.occurrences()
+        total = occurrences.sum()
+        return occurrences / total if total > 0 else np.zeros_like(occurrences)
+
+    def idf(self) -> np.ndarray:
+        """Smoothed inverse document frequency: log((1 + N) / (1 + df)) + 1."""
+        n_docs = self.matrix.shape[0]
+        return np.log((1 + n_docs) / (1 + self.document_frequency())) + 1.0
+
+    def mean_note_rarity(self) -> np.ndarray:
+        """Per-perfume mean of (1 - note frequency); perfumes without notes get 0.0."""
+        rarity = 1.0 - self.note_frequencies()
+        totals = self.matrix @ rarity
+        counts = self.note_counts()
+        return np.divide(totals, counts, out=np.zeros_like(totals), where=counts > 0)
+
+    def mean_idf(self) -> np.ndarray:
+        """Per-perfume mean IDF over its note occurrences."""
+        totals = self.matrix @ self.idf()
+        counts = self.note_counts()
+        return np.divide(totals, counts, out=np.zeros_like(totals), where=counts > 0)
+
+    def save(self, path: str = DEFAULT_MATRIX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        arrays = {
+            'data': self.matrix.data,
+            'indices': self.matrix.indices,
+            'indptr': self.matrix.indptr,
+            'shape': np.array(self.matrix.shape),
+            'vocabulary': np.array(self.vocabulary, dtype=str),
+        }
+        if self.keys is not None:
+            arrays['keys'] = np.array(self.keys, dtype=str)
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MATRIX_PATH) -> 'NoteIncidenceMatrix':
+        with np.load(path, allow_pickle=False) as f:
+            matrix = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+            vocabulary = f['vocabulary'].tolist()
+            keys = f['keys'].tolist() if 'keys' in f else None
+        return cls(matrix, vocabulary, keys=keys)
@@ -172,17 +172,22 @@ CREATE TABLE IF NOT EXISTS perfume_perfumers (
 CREATE TABLE IF NOT EXISTS import_runs (
   id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
   catalog_version text NOT NULL,
-  created_at timestamptz NOT NULL DEFAULT now()
+  created_at timestamptz NOT NULL DEFAULT now(),
+  -- etl_v5.py --profile report: per-stage wall/CPU time, RSS, rows/sec, calls, cache hits
+  stats jsonb
 );
 
 CREATE TABLE IF NOT EXISTS raw_import_rows (
   id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
   import_run_id uuid NOT NULL REFERENCES import_runs(id) ON DELETE CASCADE,
   brand_raw text, name_raw text, concentration_raw text, release_year int,
-  fp_strict text NOT NULL, fp_loose text NOT NULL,
+  -- sha256 digests of perfumes.fingerprint_strict / fingerprint_loose
+  fp_strict bytea NOT NULL CHECK (octet_length(fp_strict) = 32),
+  fp_loose bytea NOT NULL CHECK (octet_length(fp_loose) = 32),
   raw_json jsonb,
   created_at timestamptz NOT NULL DEFAULT now()
 );
+CREATE INDEX IF NOT EXISTS idx_raw_import_rows_run_fp_strict ON raw_import_rows (import_run_id, fp_strict);
 
 CREATE TABLE IF NOT EXISTS perfume_source_urls (
   id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -199,11 +204,15 @@ CREATE TABLE IF NOT EXISTS brand_aliases (
 
 CREATE TABLE IF NOT EXISTS perfume_revisions (
   id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
-  perfume_id uuid NOT NULL REFERENCES perfumes(id) ON DELETE CASCADE,
-  import_run_id uuid REFERENCES import_runs(id),
-  changed_at timestamptz NOT NULL DEFAULT now(),
-  diff_jsonb jsonb NOT NULL
+  perfume_id uuid REFERENCES perfumes(id) ON DELETE CASCADE,
+  fingerprint_strict text NOT NULL,
+  -- {field: {"old": ..., "new": ...}} for the fields an import changed
+  diff_json jsonb NOT NULL,
+  reason text,
+  import_run_id uuid REFERENCES import_runs(id) ON DELETE SET NULL,
+  created_at timestamptz DEFAULT now()
 );
+CREATE INDEX IF NOT EXISTS idx_perfume_revisions_import_run_id ON perfume_revisions (import_run_id);
 
 CREATE TABLE IF NOT EXISTS import_conflicts (
   id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
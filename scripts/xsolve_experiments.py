@@ -0,0 +1,260 @@
+"""
+Weight and eligibility-threshold sweeps for the xSolve difficulty score.
+
+calculate_xsolve_score derives four components per perfume and combines them
+with XSOLVE_WEIGHTS. Only the components of the eligible perfumes (Rating
+Count >= threshold) depend on the threshold, and a weight vector only changes
+the final weighted sum. So the harness:
+
+    1. reads the scoring inputs (Rating Count, gender_norm, note_count,
+       avg_note_rarity) from the scored catalog cache (catalog_cache.py), or
+       scores the CSV once when there is none;
+    2. builds the (eligible perfumes x 4) component matrix once per threshold;
+    3. scores every weight vector at that threshold as one matrix product,
+       in blocks of columns that fit in memory.
+
+Every configuration gets its score distribution (mean, std, quantiles) and
+the Spearman rank correlation of its scores with the production configuration
+(XSOLVE_WEIGHTS at ELIGIBLE_MIN_RATINGS), over the perfumes eligible in both.
+Mean and std cover every eligible perfume. Quantiles and ranks come from one
+sort per configuration of a fixed random sample of SAMPLE_ROWS of them, so a
+sweep costs the same on the full catalog as on a test export (--exact ranks
+everything).
+
+Usage:
+    python xsolve_experiments.py --thresholds 100 200 400 800 --step 0.05
+    python xsolve_experiments.py --random 5000 --out sweep.csv
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from catalog_cache import load_cached_frame
+from etl_v5 import DEDUP_STRATEGIES, ELIGIBLE_MIN_RATINGS, FALLBACK_MIN_RATINGS, XSOLVE_WEIGHTS, ETLPipelineV5
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CSV = os.path.join(os.path.dirname(__file__), '../data/dataset.csv')
+COMPONENTS = list(XSOLVE_WEIGHTS)
+INPUT_COLUMNS = ['fingerprint_strict', 'Rating Count', 'gender_norm', 'note_count', 'avg_note_rarity']
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+# Scores held at once while sweeping (weight vectors x perfumes); 2^22 float64 = 32 MB
+BLOCK_ELEMENTS = 1 << 22
+# Eligible perfumes sorted per configuration for quantiles and Spearman
+SAMPLE_ROWS = 5000
+
+
+def weight_grid(step: float = 0.05) -> np.ndarray:
+    """Every weight vector on a `step` grid whose four weights sum to 1, one per row."""
+    n = int(round(1 / step))
+    rows = [(a, b, c, n - a - b - c) for a, b, c in itertools.product(range(n + 1), repeat=3) if a + b + c <= n]
+    return np.array(rows, dtype=float) / n
+
+
+def random_weights(count: int, seed: int = 0) -> np.ndarray:
+    """`count` weight vectors drawn uniformly from the simplex."""
+    return np.random.default_rng(seed).dirichlet(np.ones(len(COMPONENTS)), size=count)
+
+
+class XsolveExperiment:
+    def __init__(self, inputs: pd.DataFrame, pipeline: Optional[ETLPipelineV5] = None,
+                 sample_rows: Optional[int] = SAMPLE_ROWS, seed: int = 0):
+        self.pipeline = pipeline or ETLPipelineV5(DEFAULT_CSV)
+        # None: quantiles and ranks over every eligible perfume
+        self.sample_rows = sample_rows
+        self.seed = seed
+        self.rating_counts = inputs['Rating Count'].to_numpy()
+        self.genders = inputs['gender_norm'].to_numpy(dtype=object)
+        self.note_counts = inputs['note_count'].to_numpy()
+        rarity = inputs['avg_note_rarity'].to_numpy(dtype=float) if 'avg_note_rarity' in inputs else None
+        self.avg_note_rarity = rarity if rarity is not None and not np.isnan(rarity).all() else None
+        # Threshold-independent statistics, as in score_statistics
+        self.max_notes = max(self.note_counts.max() if len(self.note_counts) else 0, 1)
+        self.p95_rarity = np.percentile(self.avg_note_rarity, 95) if self.avg_note_rarity is not None else None
+        # (threshold, fallback) -> (row indices of the eligible perfumes, their component matrix)
+        self._components: Dict[Tuple[int, bool], Tuple[np.ndarray, np.ndarray]] = {}
+        self._baseline: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @classmethod
+    def from_catalog(cls, csv_path: str, pipeline: Optional[ETLPipelineV5] = None,
+                     **options) -> 'XsolveExperiment':
+        """Inputs from the scored catalog cache of `csv_path`; the CSV is scored (and cached) if there is none."""
+        pipeline = pipeline or ETLPipelineV5(csv_path)
+        inputs = (load_cached_frame(csv_path, 'scored', columns=INPUT_COLUMNS, meta=pipeline.scored_cache_meta())
+                  if pipeline.use_cache else None)
+        if inputs is None:
+            logger.info("No scored catalog cache for this CSV, scoring it")
+            df = pipeline.build_scored_catalog()
+            inputs = df[[c for c in INPUT_COLUMNS if c in df.columns]]
+        return cls(inputs, pipeline, **options)
+
+    def components(self, threshold: int, fallback: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Eligible row indices and their (n_eligible, 4) component matrix at `threshold`, computed once."""
+        key = (threshold, fallback)
+        if key not in self._components:
+            stats = self.pipeline.rating_statistics(self.rating_counts, self.genders, threshold,
+                                                    FALLBACK_MIN_RATINGS if fallback else None)
+            stats.update({'max_notes': self.max_notes, 'p95_rarity': self.p95_rarity})
+            eligible = np.flatnonzero(self.rating_counts >= stats['eligible_threshold'])
+            columns = self.pipeline.xsolve_components(
+                self.rating_counts[eligible], self.genders[eligible], self.note_counts[eligible],
+                self.avg_note_rarity[eligible] if self.avg_note_rarity is not None else None, stats)
+            self._components[key] = (eligible, np.column_stack([columns[c] for c in COMPONENTS]))
+        return self._components[key]
+
+    def baseline(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Eligible rows and scores of the production configuration (what calculate_xsolve_score writes)."""
+        if self._baseline is None:
+            rows, matrix = self.components(ELIGIBLE_MIN_RATINGS, fallback=True)
+            weights = np.array([XSOLVE_WEIGHTS[c] for c in COMPONENTS])
+            self._baseline = (rows, np.clip(matrix @ weights, 0.0, 1.0))
+        return self._baseline
+
+    def _sample(self, n: int) -> np.ndarray:
+        """Sorted positions of the rows ranked per configuration."""
+        if self.sample_rows is None or n <= self.sample_rows:
+            return np.arange(n)
+        return np.sort(np.random.default_rng(self.seed).choice(n, self.sample_rows, replace=False))
+
+    def sweep(self, weights: np.ndarray, thresholds: Sequence[int] = (ELIGIBLE_MIN_RATINGS,)) -> pd.DataFrame:
+        """Score distribution and rank correlation with the baseline of every (threshold, weight vector)."""
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        base_rows, base_scores = self.baseline()
+        reports = []
+        for threshold in thresholds:
+            rows, matrix = self.components(threshold)
+            sample = self._sample(len(rows))
+            # Spearman over the sampled perfumes that the baseline scores too
+            shared = np.isin(rows[sample], base_rows, assume_unique=True)
+            base_scores_shared = base_scores[np.searchsorted(base_rows, rows[sample][shared])][None, :]
+            base_ranks = _average_ranks(base_scores_shared, np.argsort(base_scores_shared, axis=1))[0]
+            block = max(1, BLOCK_ELEMENTS // max(len(rows), 1))
+            for start in range(0, len(weights), block):
+                w = weights[start:start + block]
+                # One matrix product scores every weight vector of the block: (vectors, perfumes)
+                scores = w @ matrix.T
+                np.clip(scores, 0.0, 1.0, out=scores)
+                sampled = scores[:, sample]
+                order = np.argsort(sampled, axis=1)
+                report = pd.DataFrame(w, columns=[f'w_{c}' for c in COMPONENTS])
+                report.insert(0, 'threshold', threshold)
+                report['eligible'] = len(rows)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    mean = scores.sum(axis=1) / len(rows)
+                    # E[x^2] - E[x]^2 in one pass instead of scores.std's temporaries
+                    variance = np.einsum('ij,ij->i', scores, scores) / len(rows) - mean * mean
+                report['mean'] = mean
+                report['std'] = np.sqrt(np.maximum(variance, 0.0))
+                for q, values in zip(QUANTILES, _quantiles(sampled, order)):
+                    report[f'p{int(q * 100)}'] = values
+                report['spearman'] = _spearman(sampled, order, shared, base_ranks)
+                reports.append(report)
+        result = pd.concat(reports, ignore_index=True) if reports else pd.DataFrame()
+        logger.info(f"Swept {len(weights)} weight vectors x {len(thresholds)} thresholds")
+        return result
+
+
+def _average_ranks(values: np.ndarray, order: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """0-based ranks within every row of `values` (given its argsort), ties sharing their average rank.
+
+    With `mask`, the ranks of the masked columns among themselves: the number
+    of masked columns sorted before each one (the others' ranks are meaningless).
+    """
+    n = values.shape[1]
+    ordered = np.take_along_axis(values, order, axis=1)
+    counted = np.ones(order.shape, dtype=bool) if mask is None else mask[order]
+    count = np.cumsum(counted, axis=1)
+    # Runs of equal values: where each run starts and ends, for every sorted position
+    starts = np.ones(order.shape, dtype=bool)
+    starts[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    ends = np.ones(order.shape, dtype=bool)
+    ends[:, :-1] = starts[:, 1:]
+    index = np.arange(n)
+    start = np.maximum.accumulate(np.where(starts, index, 0), axis=1)
+    end = np.minimum.accumulate(np.where(ends, index, n - 1)[:, ::-1], axis=1)[:, ::-1]
+    before = np.take_along_axis(count - counted, start, axis=1)
+    last = np.take_along_axis(count, end, axis=1) - 1
+    ranks = np.empty(order.shape)
+    np.put_along_axis(ranks, order, (before + last) / 2.0, axis=1)
+    return ranks
+
+
+def _quantiles(values: np.ndarray, order: np.ndarray) -> List[np.ndarray]:
+    """QUANTILES of every row of `values` (linear interpolation, like np.quantile), given its argsort."""
+    n = values.shape[1]
+    if n == 0:
+        return [np.full(len(values), np.nan) for _ in QUANTILES]
+    result = []
+    for q in QUANTILES:
+        position = q * (n - 1)
+        lo, hi = int(np.floor(position)), int(np.ceil(position))
+        low = np.take_along_axis(values, order[:, [lo]], axis=1)[:, 0]
+        high = np.take_along_axis(values, order[:, [hi]], axis=1)[:, 0]
+        result.append(low + (high - low) * (position - lo))
+    return result
+
+
+def _spearman(values: np.ndarray, order: np.ndarray, shared: np.ndarray, base_ranks: np.ndarray) -> np.ndarray:
+    """Spearman correlation with `base_ranks` of every row of `values` over its `shared` columns.
+
+    The Pearson correlation of average ranks, so configurations with many tied
+    scores (discrete components) are not ranked by row order.
+    """
+    n = len(base_ranks)
+    if n < 2:
+        return np.full(len(order), np.nan)
+    # Average ranks have the same mean as 0..n-1
+    centre = (n - 1) / 2.0
+    ranks = _average_ranks(values, order, shared)[:, shared] - centre
+    base = base_ranks - centre
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return ranks @ base / np.sqrt(np.einsum('ij,ij->i', ranks, ranks) * (base @ base))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DEFAULT_CSV)
+    parser.add_argument('--thresholds', type=int, nargs='+', default=[ELIGIBLE_MIN_RATINGS],
+                        help="Minimum Rating Count for a perfume to be scored")
+    weights = parser.add_mutually_exclusive_group()
+    weights.add_argument('--step', type=float, default=0.05, help="Grid of weight vectors summing to 1")
+    weights.add_argument('--random', type=int, metavar='N', help="N weight vectors drawn from the simplex instead")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dedup', choices=DEDUP_STRATEGIES, default='merge',
+                        help="Dedup strategy of the import being studied (see etl_v5.py --dedup)")
+    parser.add_argument('--exact', action='store_true',
+                        help=f"Quantiles and ranks over every eligible perfume instead of {SAMPLE_ROWS} of them")
+    parser.add_argument('--out', default='xsolve_sweep.csv', help="Report with one row per configuration")
+    parser.add_argument('--top', type=int, default=10, help="Configurations printed, by descending score spread")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    pipeline = ETLPipelineV5(args.csv)
+    pipeline.dedup_strategy = args.dedup
+    experiment = XsolveExperiment.from_catalog(args.csv, pipeline, sample_rows=None if args.exact else SAMPLE_ROWS,
+                                               seed=args.seed)
+    experiment.baseline()
+    for threshold in args.thresholds:
+        experiment.components(threshold)
+    loaded = time.perf_counter() - start
+
+    candidates = random_weights(args.random, args.seed) if args.random else weight_grid(args.step)
+    start = time.perf_counter()
+    report = experiment.sweep(candidates, args.thresholds)
+    swept = time.perf_counter() - start
+
+    report.to_csv(args.out, index=False)
+    print(f"Components: {loaded:.2f}s. Sweep of {len(report)} configurations: {swept:.2f}s. Report: {args.out}")
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(report.sort_values('std', ascending=False).head(args.top).round(4).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+-- Migration: Store raw_import_rows fingerprints as binary digests
+-- Date: 2026-10-17
+--
+-- Problem: etl_v5.py now stages every source row of an import in raw_import_rows.
+--          fp_strict / fp_loose held the 64-char hex form of sha256 digests, twice
+--          the size of the digest itself, in a table that grows by a catalog per run.
+-- Fix: Convert both columns to bytea (32 bytes). The ETL writes them in the hex
+--      text form ('\x' || hex), so existing hex values convert with decode().
+--
+-- Conflicts are matched back to the staged rows of their run by fingerprint,
+-- hence the (import_run_id, fp_strict) index.
+
+ALTER TABLE public.raw_import_rows
+  ALTER COLUMN fp_strict TYPE bytea USING decode(fp_strict, 'hex'),
+  ALTER COLUMN fp_loose TYPE bytea USING decode(fp_loose, 'hex');
+
+ALTER TABLE public.raw_import_rows
+  ADD CONSTRAINT raw_import_rows_fp_strict_sha256 CHECK (octet_length(fp_strict) = 32),
+  ADD CONSTRAINT raw_import_rows_fp_loose_sha256 CHECK (octet_length(fp_loose) = 32);
+
+CREATE INDEX IF NOT EXISTS idx_raw_import_rows_run_fp_strict
+  ON public.raw_import_rows (import_run_id, fp_strict);
+
+COMMENT ON COLUMN public.raw_import_rows.fp_strict IS
+  'sha256 of brand|name|concentration|year (perfumes.fingerprint_strict, as bytes)';
+COMMENT ON COLUMN public.raw_import_rows.fp_loose IS
+  'sha256 of brand|name (perfumes.fingerprint_loose, as bytes)';
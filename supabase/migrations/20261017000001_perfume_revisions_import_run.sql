@@ -0,0 +1,13 @@
+-- Migration: Link perfume_revisions to the import run that made the change
+-- Date: 2026-10-17
+--
+-- Problem: etl_v5.py now writes a perfume_revisions row (diff_json = changed fields
+--          with their old and new values) for every perfume an import updates,
+--          but a revision could not be traced back to its import.
+-- Fix: Add perfume_revisions.import_run_id, indexed for "what did run X change".
+
+ALTER TABLE public.perfume_revisions
+  ADD COLUMN IF NOT EXISTS import_run_id uuid REFERENCES public.import_runs(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS idx_perfume_revisions_import_run_id
+  ON public.perfume_revisions (import_run_id);
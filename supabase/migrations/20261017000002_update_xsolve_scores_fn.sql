@@ -0,0 +1,28 @@
+-- Migration: Bulk update of xSolve scores for etl_v5.py --rescore
+-- Date: 2026-10-17
+--
+-- Problem: A weight change only touches xsolve_score and xsolve_model_version, but
+--          PostgREST can only PATCH one value per request or upsert whole rows
+--          (a narrow upsert fails the NOT NULL columns of the insert half).
+-- Fix: update_xsolve_scores(scores) sets both columns for a JSON array of
+--      {id, xsolve_score, xsolve_model_version} in one statement and returns the
+--      number of perfumes updated. Callable by service_role only.
+
+CREATE OR REPLACE FUNCTION public.update_xsolve_scores(scores jsonb)
+RETURNS integer
+LANGUAGE sql
+SET search_path TO 'public', 'pg_catalog'
+AS $function$
+  WITH updated AS (
+    UPDATE public.perfumes p
+    SET xsolve_score = s.xsolve_score,
+        xsolve_model_version = s.xsolve_model_version
+    FROM jsonb_to_recordset(scores) AS s(id uuid, xsolve_score float8, xsolve_model_version integer)
+    WHERE p.id = s.id
+    RETURNING 1
+  )
+  SELECT count(*)::integer FROM updated;
+$function$;
+
+REVOKE EXECUTE ON FUNCTION public.update_xsolve_scores(jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.update_xsolve_scores(jsonb) TO service_role;
@@ -0,0 +1,10 @@
+-- Migration: Store etl_v5.py profiling reports on import_runs
+-- Date: 2026-10-17
+--
+-- Problem: A slow import only leaves log lines behind, so it is not possible to tell
+--          afterwards whether parsing, scoring, dimension lookups or upserts took the time.
+-- Fix: Add import_runs.stats, the JSON report of `etl_v5.py --profile` (per stage:
+--      wall/CPU time, peak RSS, rows/sec, sink calls, cache hit rates).
+
+ALTER TABLE public.import_runs
+  ADD COLUMN IF NOT EXISTS stats jsonb;
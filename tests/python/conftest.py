@@ -0,0 +1,187 @@
+import uuid
+import pandas as pd
+import pytest
+from types import SimpleNamespace
+
+# A small export in the catalog's format: one duplicate fingerprint (Sauvage),
+# one perfume without concentration or year, and one uncertain entry
+CATALOG = {
+    'Brand': ['Dior', 'Dior', 'Chanel', 'Guerlain'],
+    'Name': ['Sauvage', 'Sauvage', 'No 5', 'Shalimar'],
+    'Concentration': ['EDT', 'EDT', 'EDP', ''],
+    'Release Year': ['2015', '2015', '1921', ''],
+    'Rating Count': [3000, 450, 1200, 900],
+    'Rating Value': '4,2',
+    'Gender': ['Male', 'Male', 'Female', None],
+    'Manufacturer': 'LVMH',
+    'Top Notes': ['Bergamot, Pepper', 'Bergamot', 'Aldehydes', 'Bergamot'],
+    'Middle Notes': ['Lavender', '', 'Rose, Jasmine', 'Iris'],
+    'Base Notes': ['Ambroxan', '', 'Vanilla', 'Vanilla, Tonka Bean'],
+    'Perfumers': ['Francois Demachy', '', 'Ernest Beaux', 'Jacques Guerlain'],
+    'Main Accords': 'woody',
+    'URL': 'http://x',
+    'Is Uncertain': [False, False, True, False],
+    'Is Linear': False,
+}
+
+
+class FakeQuery:
+    """Chainable stand-in for a postgrest query builder over in-memory rows."""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.action = 'select'
+        self.payload = None
+        self.filters = []
+        self.window = None
+        self.options = {}
+
+    # Builders
+    def select(self, columns='*'):
+        self.action = 'select'
+        self.columns = [c.strip() for c in columns.split(',')]
+        return self
+
+    def insert(self, rows, **options):
+        self.action, self.payload, self.options = 'insert', rows, options
+        return self
+
+    def upsert(self, rows, **options):
+        self.action, self.payload, self.options = 'upsert', rows, options
+        return self
+
+    def update(self, values):
+        self.action, self.payload = 'update', values
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def order(self, column, **_):
+        return self
+
+    def range(self, start, end):
+        self.window = (start, end + 1)
+        return self
+
+    def limit(self, n):
+        self.window = (0, n)
+        return self
+
+    # Execution
+    def _matching(self):
+        rows = self.client.tables.setdefault(self.table, [])
+        return [r for r in rows if all(f(r) for f in self.filters)]
+
+    def execute(self):
+        self.client.calls.append((self.table, self.action))
+        rows = self.client.tables.setdefault(self.table, [])
+        error = self.client.errors.get((self.table, self.action))
+        if error is not None:
+            exc = error(self.payload) if callable(error) else error
+            if exc is not None:
+                raise exc
+
+        if self.action == 'select':
+            data = self._matching()
+            if self.window:
+                data = data[self.window[0]:self.window[1]]
+            if self.columns != ['*']:
+                data = [{c: r.get(c) for c in self.columns} for r in data]
+            return SimpleNamespace(data=data)
+
+        if self.action == 'delete':
+            data = self._matching()
+            removed = {id(r) for r in data}
+            self.client.tables[self.table] = [r for r in rows if id(r) not in removed]
+            return SimpleNamespace(data=data)
+
+        if self.action == 'update':
+            data = self._matching()
+            for r in data:
+                r.update(self.payload)
+            return SimpleNamespace(data=data)
+
+        payload = self.payload if isinstance(self.payload, list) else [self.payload]
+        written = []
+        for row in payload:
+            row = dict(row)
+            keys = self.options.get('on_conflict')
+            existing = None
+            if self.action == 'upsert' and keys:
+                key_cols = keys.split(',')
+                existing = next((r for r in rows if all(r.get(k) == row.get(k) for k in key_cols)), None)
+            if existing is not None:
+                if not self.options.get('ignore_duplicates'):
+                    existing.update(row)
+                written.append(existing)
+            else:
+                row.setdefault('id', str(uuid.uuid4()))
+                rows.append(row)
+                written.append(row)
+        return SimpleNamespace(data=written)
+
+
+class FakeSupabase:
+    """Minimal in-memory Supabase client: tables are lists of dicts, every execute() is recorded."""
+
+    def __init__(self, tables=None):
+        self.tables = tables or {}
+        self.calls = []
+        # (table, action) -> exception, or callable(payload) returning an exception or None
+        self.errors = {}
+        # (function, params) of every rpc() call
+        self.rpc_calls = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, fn, params):
+        self.rpc_calls.append((fn, params))
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=None))
+
+
+@pytest.fixture
+def catalog_csv(tmp_path):
+    """Write tmp_path/dataset.csv and return its path: CATALOG with `columns` replaced, or `rows` instead."""
+    path = str(tmp_path / "dataset.csv")
+
+    def write(columns=None, rows=None):
+        pd.DataFrame(rows if rows is not None else {**CATALOG, **(columns or {})}).to_csv(path, sep=';', index=False)
+        return path
+    return write
+
+
+@pytest.fixture
+def local_pipeline(tmp_path):
+    """Build pipelines over tmp_path/dataset.csv whose checkpoints and reports stay in tmp_path."""
+    from etl_v5 import ETLPipelineV5
+
+    def build(sink=None, use_cache=False):
+        pipeline = ETLPipelineV5(str(tmp_path / "dataset.csv"), sink=sink)
+        pipeline.use_cache = use_cache
+        pipeline.checkpoint_root = str(tmp_path / "checkpoints")
+        pipeline.dead_letter_path = str(tmp_path / "dead_letter.jsonl")
+        pipeline.merge_report_path = str(tmp_path / "merge_report.csv")
+        return pipeline
+    return build
+
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    import etl_v5
+    client = FakeSupabase()
+    # Pipelines build their sink on first use, so this also covers ones created earlier
+    monkeypatch.setattr(etl_v5, 'make_sink', lambda *args, **kwargs: client)
+    return client
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from brand_resolver import BrandResolver, brand_key, trigrams
+
+def test_brand_key_and_trigrams_follow_pg_trgm():
+    assert brand_key("  L'Artisan  Parfumeur ") == 'l artisan parfumeur'
+    assert brand_key('Lancôme') == 'lancome'
+    assert brand_key(None) == ''
+    assert trigrams('cat') == {'  c', ' ca', 'cat', 'at '}
+
+def test_lookup_exact_fuzzy_and_none():
+    resolver = BrandResolver()
+    for brand in ['maison francis kurkdjian', 'lancôme', 'chanel', 'dior']:
+        resolver.add_brand(brand)
+
+    assert resolver.lookup('LANCOME') == ('lancôme', 1.0)
+    match = resolver.lookup('Maison Francis Kurkdijan')
+    assert match.brand == 'maison francis kurkdjian'
+    assert 0.7 < match.similarity < 0.8
+    assert resolver.lookup('Zara') is None
+    assert resolver.lookup('') is None
+
+def test_aliases_match_exactly():
+    resolver = BrandResolver()
+    resolver.add_brand('yves saint laurent')
+    resolver.add_alias('YSL', 'yves saint laurent')
+
+    assert resolver.lookup('ysl') == ('yves saint laurent', 1.0)
+    assert len(resolver) == 1
+
+def test_is_alias_uses_threshold():
+    resolver = BrandResolver(threshold=0.6)
+    resolver.add_brand('chanel')
+    assert resolver.is_alias(resolver.lookup('Chanell'))
+    assert not BrandResolver().is_alias(resolver.lookup('Chanell'))
+    assert not resolver.is_alias(None)
@@ -0,0 +1,64 @@
+import os
+import sys
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from etl_v5 import ETLPipelineV5
+from catalog_cache import cache_path, load_cached_frame, save_cached_frame
+
+CSV = """Brand;Name;Concentration;Release Year;Rating Count;Rating Value;Gender;Manufacturer;Top Notes
+Dior;Sauvage;EDT;2015;900;4,1;men;LVMH;Bergamot, Pepper
+dior;  SAUVAGE ;EDT;2015;100;3,9;men;LVMH;Bergamot
+Chanel;No 5;EDP;;500;4,5;women;;Aldehydes
+"""
+
+def _write_csv(tmp_path, text=CSV):
+    path = tmp_path / "dataset.csv"
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+def test_round_trip_restores_list_columns(tmp_path):
+    csv_path = _write_csv(tmp_path)
+    df = pd.DataFrame({'fingerprint_strict': ['a', 'b'], 'notes_list': [['Rose', 'Oud'], []]})
+
+    path = save_cached_frame(df, csv_path, 'scored')
+
+    assert os.path.exists(path)
+    loaded = load_cached_frame(csv_path, 'scored')
+    assert loaded['notes_list'].tolist() == [['Rose', 'Oud'], []]
+    assert load_cached_frame(csv_path, 'scored', columns=['missing']) is None
+
+def test_meta_mismatch_is_a_miss(tmp_path):
+    csv_path = _write_csv(tmp_path)
+    save_cached_frame(pd.DataFrame({'x': [1]}), csv_path, 'scored', meta={'dedup_strategy': 'merge'})
+
+    assert load_cached_frame(csv_path, 'scored', meta={'dedup_strategy': 'merge'})['x'].tolist() == [1]
+    assert load_cached_frame(csv_path, 'scored', meta={'dedup_strategy': 'keep-first'}) is None
+    # Artifacts written without the setting do not match it either
+    save_cached_frame(pd.DataFrame({'x': [1]}), csv_path, 'scored')
+    assert load_cached_frame(csv_path, 'scored', meta={'dedup_strategy': 'merge'}) is None
+
+def test_changed_csv_invalidates_cache(tmp_path):
+    csv_path = _write_csv(tmp_path)
+    save_cached_frame(pd.DataFrame({'x': [1]}), csv_path, 'raw')
+    old_path = cache_path(csv_path, 'raw')
+
+    _write_csv(tmp_path, CSV + "Guerlain;Shalimar;EDP;1925;800;4,3;women;;Vanilla\n")
+
+    assert load_cached_frame(csv_path, 'raw') is None
+    save_cached_frame(pd.DataFrame({'x': [2]}), csv_path, 'raw')
+    # The stale artifact is replaced, not accumulated
+    assert not os.path.exists(old_path)
+
+def test_load_and_clean_data_uses_raw_cache(tmp_path, monkeypatch):
+    csv_path = _write_csv(tmp_path)
+    first = ETLPipelineV5(csv_path)
+    first.load_and_clean_data()
+    assert os.path.exists(cache_path(csv_path, 'raw'))
+
+    second = ETLPipelineV5(csv_path)
+    monkeypatch.setattr(second, '_parse_and_fingerprint', lambda: (_ for _ in ()).throw(AssertionError("parsed CSV")))
+    second.load_and_clean_data()
+
+    assert len(second.df) == 2
+    pd.testing.assert_frame_equal(second.df, first.df)
@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from etl_async import AsyncBatchUploader, batched
+
+class StubPostgREST(BaseHTTPRequestHandler):
+    """Accepts upserts, sleeps a little, and tracks concurrent requests."""
+    lock = threading.Lock()
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            server.in_flight -= 1
+            server.requests.append((self.path, dict(self.headers), body))
+
+        status = 400 if any(r.get('name') == 'bad' for r in body) else 201
+        self.send_response(status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubPostgREST)
+    server.requests, server.in_flight, server.max_in_flight = [], 0, 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+def _url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+def test_uploads_all_batches_with_bounded_concurrency(stub_server):
+    records = [{'name': f'P{i}'} for i in range(50)]
+    uploader = AsyncBatchUploader(_url(stub_server), 'key', concurrency=3, queue_size=2)
+
+    stats = uploader.run(batched(records, 5))
+
+    assert stats.batches == 10
+    assert stats.rows == 50
+    assert len(stats.latencies) == 10
+    assert 1 < stub_server.max_in_flight <= 3
+    received = sorted(r['name'] for _, _, body in stub_server.requests for r in body)
+    assert received == sorted(r['name'] for r in records)
+
+    path, headers, _ = stub_server.requests[0]
+    assert path.startswith('/rest/v1/perfumes?on_conflict=brand_id')
+    assert headers['apikey'] == 'key'
+    assert 'merge-duplicates' in headers['Prefer']
+
+    summary = stats.summary()
+    assert summary['rows_per_sec'] > 0
+    assert summary['latency_p95_ms'] >= summary['latency_p50_ms'] > 0
+
+def test_failed_batch_is_reported(stub_server):
+    failed, done = [], []
+    records = [{'name': 'ok1'}, {'name': 'bad'}, {'name': 'ok2'}, {'name': 'ok3'}]
+    uploader = AsyncBatchUploader(_url(stub_server), 'key', concurrency=2,
+                                  on_failed_batch=lambda batch, err: failed.append(batch),
+                                  on_batch_done=lambda seq, rows: done.append((seq, rows)))
+
+    stats = uploader.run(batched(records, 2))
+
+    assert stats.batches == 1
+    assert stats.failed_batches == 1
+    assert stats.failed_rows == 2
+    assert failed == [[{'name': 'ok1'}, {'name': 'bad'}]]
+    # Failed batches still count as done once handed to on_failed_batch
+    assert sorted(done) == [(0, 2), (1, 2)]
@@ -0,0 +1,65 @@
+import os
+import sys
+import pytest
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from etl_ingest import peak_rss_mb, read_catalog_csv
+
+CSV = """Brand;Name ;Concentration;Release Year;Rating Count;Rating Value;Gender;Manufacturer;Image URL;Top Notes;Longevity
+Dior;Sauvage;EDT;2015;900;4,1;Male;LVMH;http://img/1;Bergamot, Pepper;long
+Dior;Fahrenheit;EDT;n/a;;3,9;Male;LVMH;http://img/2;Violet;moderate
+;No 5;EDP;1921;500;4,5;Female;;http://img/3;Aldehydes;long
+"""
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "dataset.csv"
+    path.write_text(CSV, encoding='utf-8')
+    return str(path)
+
+@pytest.mark.parametrize('engine', ['c', 'pyarrow'])
+def test_read_catalog_csv_declared_schema(csv_path, engine):
+    pytest.importorskip('pyarrow')
+    df = read_catalog_csv(csv_path, engine=engine)
+
+    # Projection drops undeclared columns; header spaces are stripped
+    assert 'Longevity' not in df.columns
+    assert 'Name' in df.columns and 'Image URL' in df.columns
+    assert isinstance(df['Brand'].dtype, pd.CategoricalDtype)
+    assert isinstance(df['Gender'].dtype, pd.CategoricalDtype)
+    assert str(df['Release Year'].dtype) == 'Int32'
+    assert str(df['Rating Count'].dtype) == 'Int32'
+
+    # Unparseable numerics become missing, like to_numeric(errors='coerce')
+    assert df['Release Year'].isna().tolist() == [False, True, False]
+    assert df['Rating Count'].isna().tolist() == [False, True, False]
+    assert df['Rating Value'].tolist() == pytest.approx([4.1, 3.9, 4.5], abs=1e-6)
+    assert df['Brand'].isna().tolist() == [False, False, True]
+
+@pytest.mark.parametrize('engine', ['c', 'pyarrow'])
+def test_read_catalog_csv_coerces_bad_ratings(tmp_path, engine):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / "dataset.csv"
+    path.write_text("Brand;Name;Rating Value\nDior;Sauvage;4,1\nDior;Fahrenheit;unrated\n", encoding='utf-8')
+
+    df = read_catalog_csv(str(path), engine=engine)
+
+    assert str(df['Rating Value'].dtype) == 'Float32'
+    assert df['Rating Value'][0] == pytest.approx(4.1, abs=1e-6)
+    assert df['Rating Value'].isna().tolist() == [False, True]
+
+@pytest.mark.parametrize('engine', ['c', 'pyarrow'])
+def test_read_catalog_csv_truncates_fractional_integers(tmp_path, engine):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / "dataset.csv"
+    path.write_text("Brand;Name;Release Year;Rating Count\nDior;Sauvage;2015.7;12.9\nDior;Fahrenheit;1988;-3.5\n",
+                    encoding='utf-8')
+
+    df = read_catalog_csv(str(path), engine=engine)
+
+    assert df['Release Year'].tolist() == [2015, 1988]
+    assert df['Rating Count'].tolist() == [12, -3]
+
+def test_peak_rss_mb():
+    assert peak_rss_mb() > 1
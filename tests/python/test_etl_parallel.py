@@ -0,0 +1,64 @@
+import os
+import sys
+import pytest
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+import etl_v5
+from etl_v5 import ETLPipelineV5
+from etl_parallel import ParallelStages
+
+pytest.importorskip('pyarrow')
+
+def _frame(n=300, seed=5):
+    rng = np.random.default_rng(seed)
+    notes = ['Rose', 'Musk Absolute', 'Bergamot™', 'Oud', 'La Réunion Vanilla'] + [f'Note {i}' for i in range(30)]
+    blob = lambda: ', '.join(rng.choice(notes, rng.integers(0, 5))) if rng.random() > 0.1 else None
+    df = pd.DataFrame({
+        'Brand': rng.choice(['Dior', 'Chanel'], n),
+        'Name': [f'P{i}' for i in range(n)],
+        'Concentration': 'EDP',
+        'Release Year': rng.choice([0, 2001], n),
+        'Rating Count': rng.integers(0, 2000, n),
+        'Gender': pd.Categorical(rng.choice(['Male', 'Female', 'Other'], n)),
+        'Top Notes': [blob() for _ in range(n)],
+        'Middle Notes': [blob() for _ in range(n)],
+        'Base Notes': [blob() for _ in range(n)],
+        'Perfumers': [blob() for _ in range(n)],
+        'Main Accords': rng.choice(['woody, citrus', None], n),
+        'URL': 'http://x',
+        # Mixed bools and text, as in real exports
+        'Is Uncertain': pd.Series(rng.choice([True, 'False', None], n), dtype=object),
+        'Is Linear': False,
+    })
+    # Non-default index: results must line up by position
+    df.index = np.arange(n) * 3
+    return df
+
+def _scored(workers, monkeypatch):
+    monkeypatch.setattr(etl_v5, 'PARALLEL_MIN_ROWS', 0)
+    pipeline = ETLPipelineV5("dummy.csv")
+    pipeline.workers = workers
+    pipeline.df = _frame()
+    pipeline.compute_fingerprints(pipeline.df)
+    pipeline.extract_note_pyramids()
+    pipeline.calculate_xsolve_score()
+    pipeline.df['brand_id'] = pipeline.df['Brand'].astype(object)
+    pipeline.df['concentration_id'] = None
+    pipeline.df['manufacturer_id'] = None
+    return pipeline
+
+def test_parallel_stages_match_serial(monkeypatch):
+    serial = _scored(1, monkeypatch)
+    parallel = _scored(3, monkeypatch)
+
+    for column in ['top_notes', 'middle_notes', 'base_notes', 'perfumers', 'notes_list', 'note_count']:
+        assert parallel.df[column].tolist() == serial.df[column].tolist()
+    assert list(parallel.iter_perfume_records()) == list(serial.iter_perfume_records())
+
+def test_shards_cover_rows_in_order():
+    shards = ParallelStages(workers=3)._shards(50)
+    assert shards[0][0] == 0 and shards[-1][1] == 50
+    assert all(a[1] == b[0] for a, b in zip(shards, shards[1:]))
+    assert ParallelStages(workers=8)._shards(3) == [(0, 1), (1, 2), (2, 3)]
@@ -0,0 +1,115 @@
+import os
+import sys
+import uuid
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from etl_postgres import PostgresCopyLoader, copy_text_value, encode_copy_rows
+
+# Integration tests need a disposable Postgres, e.g. the local Supabase DB
+TEST_DATABASE_URL = os.getenv("ETL_TEST_DATABASE_URL")
+
+def test_copy_text_value_escaping():
+    assert copy_text_value(None) == '\\N'
+    assert copy_text_value(True) == 't'
+    assert copy_text_value(False) == 'f'
+    assert copy_text_value(2020) == '2020'
+    assert copy_text_value('Tab\there') == 'Tab\\there'
+    assert copy_text_value('back\\slash') == 'back\\\\slash'
+
+def test_copy_text_value_arrays():
+    assert copy_text_value([]) == '{}'
+    assert copy_text_value(['Rose', 'Musk']) == '{"Rose","Musk"}'
+    # Array quoting first, then COPY escaping of the backslashes it introduced
+    assert copy_text_value(['Say "hi"']) == '{"Say \\\\"hi\\\\""}'
+
+def test_encode_copy_rows_uses_column_order():
+    buf = encode_copy_rows([{'b': 2, 'a': 'x'}, {'a': None}], ['a', 'b'])
+    assert buf.getvalue() == 'x\t2\n\\N\t\\N\n'
+
+def test_merge_sql_dedups_staged_keys():
+    sql = PostgresCopyLoader(conn=None)._merge_sql()
+    assert 'DISTINCT ON (brand_id, name, concentration_id, release_year)' in sql
+    assert 'ON CONFLICT (brand_id, name, concentration_id, release_year) DO UPDATE' in sql
+    assert 'brand_id = EXCLUDED.brand_id' not in sql
+    assert 'xsolve_score = EXCLUDED.xsolve_score' in sql
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="ETL_TEST_DATABASE_URL not set")
+def test_copy_upsert_against_postgres():
+    import psycopg2
+
+    conn = psycopg2.connect(TEST_DATABASE_URL)
+    schema = f"etl_test_{uuid.uuid4().hex[:8]}"
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA {schema}")
+            cur.execute(f"SET search_path TO {schema}")
+            cur.execute("""
+                CREATE TABLE perfumes (
+                    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+                    fingerprint_strict text, fingerprint_loose text,
+                    name text NOT NULL, brand_id uuid NOT NULL,
+                    concentration_id uuid, manufacturer_id uuid, release_year int, gender text,
+                    top_notes text[], middle_notes text[], base_notes text[], perfumers text[],
+                    xsolve_score float, xsolve_model_version int,
+                    is_active boolean, is_uncertain boolean, is_linear boolean,
+                    source_record_slug text NOT NULL UNIQUE,
+                    CONSTRAINT unique_perfume UNIQUE NULLS NOT DISTINCT (brand_id, name, concentration_id, release_year)
+                )
+            """)
+        conn.commit()
+
+        brand = str(uuid.uuid4())
+        base = {'name': 'P1', 'brand_id': brand, 'concentration_id': None, 'release_year': None,
+                'top_notes': ['Rose', 'Say "hi"'], 'source_record_slug': 'a-p1', 'xsolve_score': 0.1}
+        loader = PostgresCopyLoader(conn)
+        assert loader.upsert_perfumes([base]) == 1
+        # Same key staged twice: the last one wins and the NULL key columns still conflict
+        assert loader.upsert_perfumes([dict(base, xsolve_score=0.2), dict(base, xsolve_score=0.3)]) == 1
+
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT count(*), max(xsolve_score), max(top_notes[2]) FROM {schema}.perfumes")
+            assert cur.fetchone() == (1, 0.3, 'Say "hi"')
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        conn.commit()
+        conn.close()
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="ETL_TEST_DATABASE_URL not set")
+def test_replace_links_against_postgres():
+    import psycopg2
+
+    conn = psycopg2.connect(TEST_DATABASE_URL)
+    schema = f"etl_test_{uuid.uuid4().hex[:8]}"
+    p1, p2, n1, n2 = (str(uuid.uuid4()) for _ in range(4))
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA {schema}")
+            cur.execute(f"SET search_path TO {schema}")
+            cur.execute("""
+                CREATE TABLE perfume_notes (
+                    perfume_id uuid NOT NULL, note_id uuid NOT NULL, type text NOT NULL,
+                    qualifiers text[] DEFAULT '{}', PRIMARY KEY (perfume_id, note_id, type)
+                )
+            """)
+            cur.execute("INSERT INTO perfume_notes VALUES (%s, %s, 'top'), (%s, %s, 'base')", (p1, n1, p2, n2))
+        conn.commit()
+
+        loader = PostgresCopyLoader(conn)
+        inserted = loader.replace_links('perfume_notes', ['perfume_id', 'note_id', 'type'],
+                                        [{'perfume_id': p1, 'note_id': n1, 'type': 'top'},
+                                         {'perfume_id': p1, 'note_id': n2, 'type': 'base'}], [p1])
+        assert inserted == 1
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT perfume_id::text, note_id::text, type FROM perfume_notes ORDER BY type")
+            # p2 is outside the relinked set and keeps its link
+            assert sorted(cur.fetchall()) == sorted([(p1, n2, 'base'), (p1, n1, 'top'), (p2, n2, 'base')])
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.commit()
+        conn.close()
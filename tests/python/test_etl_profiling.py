@@ -0,0 +1,75 @@
+import json
+import os
+import pstats
+import sys
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from etl_profiling import StageProfiler
+from etl_sinks import SQLiteSink
+from etl_v5 import ETLPipelineV5, parse_args
+
+from postgrest.exceptions import APIError
+
+def test_profiled_run_reports_every_stage(tmp_path, catalog_csv, local_pipeline):
+    catalog_csv()
+    sink = SQLiteSink(str(tmp_path / "etl.db"))
+    pipeline = local_pipeline(sink)
+    pipeline.profiler = StageProfiler(dump='cprofile', output_dir=str(tmp_path / "profiles"))
+    pipeline.profiler.start()
+
+    pipeline.run()
+    report = pipeline.save_profile()
+
+    stages = report['stages']
+    for name in ['load_and_clean_data', 'calculate_xsolve_score', 'prepoulate_cache',
+                 'resolve_dimensions', 'sync_to_supabase', '_batch_upsert', 'stage_raw_import_rows']:
+        assert stages[name]['calls'] >= 1, name
+        assert stages[name]['wall_s'] >= 0 and stages[name]['peak_rss_mb'] > 0
+    # The merge strategy deduplicates after loading
+    assert stages['load_and_clean_data']['rows'] == 4
+    assert stages['calculate_xsolve_score']['rows'] == 3
+    assert stages['stage_raw_import_rows']['rows'] == 4
+    assert stages['_batch_upsert']['rows'] == 3
+    # Upserts are part of the sync, and counted in both
+    assert 0 < stages['_batch_upsert']['network_calls'] <= stages['sync_to_supabase']['network_calls']
+    assert stages['calculate_xsolve_score']['network_calls'] == 0
+    assert report['run_id'] == pipeline.import_run_id and report['status'] == 'completed'
+    assert report['note_cache']['misses'] > 0
+
+    path = tmp_path / "profiles" / f"{pipeline.import_run_id}.json"
+    assert json.loads(path.read_text())['stages'].keys() == stages.keys()
+    assert pstats.Stats(report['dump']).total_calls > 0
+    stored = sink.table('import_runs').select('stats').eq('id', pipeline.import_run_id).execute().data[0]
+    assert stored['stats']['stages']['sync_to_supabase']['rows'] == 3
+    sink.close()
+
+def test_lookup_cache_hits_and_bisected_upserts(tmp_path, fake_supabase):
+    pipeline = ETLPipelineV5("dummy.csv")
+    pipeline.dead_letter_path = str(tmp_path / "dead_letter.jsonl")
+    pipeline.profiler = StageProfiler(output_dir=str(tmp_path))
+    pipeline.profiler.start()
+
+    for brand in ['Dior', 'Dior', 'Chanel', 'dior']:
+        pipeline._get_or_create_lookup('brands', 'name', brand, has_slug=True)
+
+    def reject_bad(payload):
+        if any(r['name'] == 'bad' for r in payload):
+            return APIError({'message': 'violates check constraint', 'code': '23514'})
+    fake_supabase.errors[('perfumes', 'upsert')] = reject_bad
+    pipeline._batch_upsert([{'name': 'bad' if i == 1 else f'P{i}'} for i in range(4)])
+
+    stages = pipeline.profiler.report()['stages']
+    lookups = stages['_get_or_create_lookup']
+    assert (lookups['calls'], lookups['cache_hits'], lookups['cache_misses']) == (4, 2, 2)
+    assert lookups['cache_hit_rate'] == 0.5
+    # select + insert per miss
+    assert lookups['network_calls'] == 4
+    # The bisection is one call of the stage: 1 + 2 + 2 upsert requests
+    upserts = stages['_batch_upsert']
+    assert (upserts['calls'], upserts['rows'], upserts['network_calls']) == (1, 4, 5)
+
+def test_profile_flags():
+    assert parse_args(['--profile-dump', 'cprofile']).profile_dump == 'cprofile'
+    with pytest.raises(ValueError):
+        StageProfiler(dump='perf')
@@ -0,0 +1,100 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from etl_rescore import XsolveRescorer
+from etl_sinks import SQLiteSink
+from etl_v5 import XSOLVE_MODEL_VERSION, XSOLVE_WEIGHTS, ETLPipelineV5, parse_args
+
+def _scores(sink):
+    rows = sink.table('perfumes').select('fingerprint_strict, xsolve_score, xsolve_model_version').execute().data
+    return {r['fingerprint_strict']: (r['xsolve_score'], r['xsolve_model_version']) for r in rows}
+
+@pytest.fixture
+def imported(tmp_path, catalog_csv, local_pipeline):
+    # Shalimar is under the fallback rating threshold and gets no score
+    catalog_csv({'Rating Count': [3000, 450, 1200, 5]})
+    sink = SQLiteSink(str(tmp_path / "etl.db"))
+    pipeline = local_pipeline(sink, use_cache=True)
+    pipeline.run()
+    yield pipeline, sink
+    sink.close()
+
+def test_rescore_writes_only_changed_scores(imported, local_pipeline, monkeypatch):
+    full, sink = imported
+    pipeline = local_pipeline(sink, use_cache=True)
+    # The components come from the scored cache of the import, not from the CSV
+    monkeypatch.setattr(pipeline, 'build_scored_catalog', lambda: pytest.fail("catalog was rescored"))
+
+    assert pipeline.rescore()['updated'] == 0
+
+    weights = dict(zip(XSOLVE_WEIGHTS, [0.7, 0.1, 0.1, 0.1]))
+    stats = pipeline.rescore(weights=weights, model_version=XSOLVE_MODEL_VERSION + 1)
+    assert stats == {'scored': 3, 'matched': 3, 'updated': 3}
+
+    expected = ETLPipelineV5.combine_xsolve_components(full.df, weights)
+    assert np.isnan(expected).sum() == 1
+    scores = _scores(sink)
+    for fp, score in zip(full.df['fingerprint_strict'], expected):
+        if np.isnan(score):
+            # Non-eligible perfumes keep a NULL score but get the new model version
+            assert scores[fp] == (None, XSOLVE_MODEL_VERSION + 1)
+        else:
+            assert scores[fp][0] == pytest.approx(score)
+            assert scores[fp][1] == XSOLVE_MODEL_VERSION + 1
+
+    # Only the perfumes whose score moved are written again
+    weights['note_rarity_raw'] = 0.2
+    stats = pipeline.rescore(weights=weights, model_version=XSOLVE_MODEL_VERSION + 1)
+    assert stats['updated'] == int(np.isfinite(expected).sum())
+
+def test_rescore_without_cache_scores_the_csv(imported, local_pipeline):
+    _, sink = imported
+    pipeline = local_pipeline(sink)
+
+    stats = pipeline.rescore(model_version=XSOLVE_MODEL_VERSION + 1)
+
+    assert stats['updated'] == 3
+    assert {version for _, version in _scores(sink).values()} == {XSOLVE_MODEL_VERSION + 1}
+
+def test_rescore_ignores_cache_of_another_dedup_strategy(imported, local_pipeline):
+    _, sink = imported
+    pipeline = local_pipeline(sink, use_cache=True)
+    pipeline.dedup_strategy = 'keep-first'
+    build = pipeline.build_scored_catalog
+    calls = []
+
+    def build_scored_catalog():
+        calls.append('scored')
+        return build()
+    pipeline.build_scored_catalog = build_scored_catalog
+
+    # The import cached a merge-scored catalog
+    pipeline.rescore()
+
+    assert calls == ['scored']
+
+def test_rest_rescore_updates_through_rpc_in_batches(fake_supabase):
+    fake_supabase.tables['perfumes'] = [
+        {'id': f'id-{fp}', 'fingerprint_strict': fp, 'xsolve_score': 0.5, 'xsolve_model_version': 1}
+        for fp in 'abc'
+    ]
+    components = pd.DataFrame({'fingerprint_strict': ['a', 'b', 'c', 'new']})
+    for column in XSOLVE_WEIGHTS:
+        components[column] = [0.5, 1.0, 0.5, 0.5]
+    rescorer = XsolveRescorer(ETLPipelineV5("dummy.csv"), XSOLVE_WEIGHTS, model_version=1, batch_size=1)
+    rescorer.load_components = lambda: components
+
+    assert rescorer.run() == {'scored': 4, 'matched': 3, 'updated': 1}
+    assert fake_supabase.rpc_calls == [
+        ('update_xsolve_scores', {'scores': [{'id': 'id-b', 'xsolve_score': 1.0, 'xsolve_model_version': 1}]}),
+    ]
+
+def test_weights_only_with_rescore():
+    args = parse_args(['--rescore', '--weights', '0.5', '0.2', '0.15', '0.15', '--model-version', '2'])
+    assert args.weights == [0.5, 0.2, 0.15, 0.15] and args.model_version == 2
+    with pytest.raises(SystemExit):
+        parse_args(['--weights', '0.5', '0.2', '0.15', '0.15'])
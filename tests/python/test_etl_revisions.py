@@ -0,0 +1,98 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from etl_revisions import field_diffs
+from etl_sinks import SQLiteSink
+from etl_v5 import CONTENT_HASH_FIELDS, ETLPipelineV5, parse_args
+
+FIELDS = ['name', 'release_year', 'top_notes', 'xsolve_score', 'is_active']
+
+def _row(fp, **overrides):
+    row = {'fingerprint_strict': fp, 'name': 'Sauvage', 'release_year': 2015, 'top_notes': ['Bergamot'],
+           'xsolve_score': 41.2, 'is_active': True}
+    row.update(overrides)
+    return row
+
+def test_field_diffs_reports_only_real_changes():
+    snapshot = [
+        {'id': 'id-a', **_row('a')},
+        {'id': 'id-b', **_row('b', release_year=None)},
+        {'id': 'id-c', **_row('c', top_notes=None)},
+        {'id': 'id-d', **_row('d')},
+    ]
+    records = [
+        # Float noise from the text round-trip is not a change
+        _row('a', xsolve_score=41.2 + 1e-13),
+        _row('b', top_notes=['Bergamot', 'Pepper']),
+        # Missing and empty arrays are the same
+        _row('c', top_notes=[]),
+        _row('d', is_active=False, xsolve_score=43.0),
+        # New perfumes have no revision
+        _row('e', name='Other'),
+    ]
+
+    diffs = field_diffs(records, snapshot, FIELDS).set_index('fingerprint_strict')
+
+    assert diffs.index.tolist() == ['b', 'd']
+    assert diffs.loc['b', 'perfume_id'] == 'id-b'
+    assert diffs.loc['b', 'diff'] == {
+        'release_year': {'old': None, 'new': 2015},
+        'top_notes': {'old': ['Bergamot'], 'new': ['Bergamot', 'Pepper']},
+    }
+    assert diffs.loc['d', 'diff'] == {
+        'xsolve_score': {'old': 41.2, 'new': 43.0},
+        'is_active': {'old': True, 'new': False},
+    }
+
+def test_failed_upserts_get_no_revision(fake_supabase):
+    etl = ETLPipelineV5("dummy.csv")
+    etl.revisions = pd.DataFrame({
+        'fingerprint_strict': ['a', 'b'],
+        'perfume_id': ['id-a', 'id-b'],
+        'diff': [{'name': {'old': 'x', 'new': 'y'}}, {'name': {'old': 'p', 'new': 'q'}}],
+    })
+    etl.dead_letters = [{'record': {'fingerprint_strict': 'b'}, 'error': 'boom', 'error_code': '23514'}]
+
+    etl.record_revisions()
+
+    rows = fake_supabase.tables['perfume_revisions']
+    assert [(r['perfume_id'], r['diff_json']) for r in rows] == [('id-a', {'name': {'old': 'x', 'new': 'y'}})]
+    assert rows[0]['import_run_id'] == etl.import_run_id
+
+def test_reimport_records_changed_fields(tmp_path, catalog_csv, local_pipeline):
+    sink = SQLiteSink(str(tmp_path / "etl.db"))
+
+    def run(linear):
+        catalog_csv({'Is Linear': [False, False, linear, False]})
+        pipeline = local_pipeline(sink)
+        pipeline.track_revisions = True
+        pipeline.run()
+        return pipeline
+
+    run(linear=False)
+    assert sink.table('perfume_revisions').select('*').execute().data == []
+
+    second = run(linear=True)
+    revisions = sink.table('perfume_revisions').select('*').execute().data
+    assert len(revisions) == 1
+    assert revisions[0]['diff_json'] == {'is_linear': {'old': False, 'new': True}}
+    assert revisions[0]['import_run_id'] == second.import_run_id
+    no5 = sink.table('perfumes').select('id').eq('name', 'No 5').execute().data[0]
+    assert revisions[0]['perfume_id'] == no5['id']
+    assert set(revisions[0]['diff_json']) <= set(CONTENT_HASH_FIELDS)
+    sink.close()
+
+def test_revisions_are_opt_in(fake_supabase, monkeypatch):
+    assert parse_args([]).track_revisions is False
+    assert parse_args(['--track-revisions']).track_revisions is True
+
+    etl = ETLPipelineV5("dummy.csv")
+    monkeypatch.setattr(etl, 'resolve_dimensions', lambda: None)
+    monkeypatch.setattr(etl, 'iter_perfume_records', lambda: iter([{'fingerprint_strict': 'a', 'name': 'x'}]))
+    monkeypatch.setattr(etl, 'fetch_perfume_snapshot', lambda: pytest.fail("perfumes table was read"))
+    etl.sync_to_supabase()
+
+    assert fake_supabase.calls == [('perfumes', 'upsert')]
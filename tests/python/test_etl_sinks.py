@@ -0,0 +1,92 @@
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from etl_sinks import SQLSink, SQLiteSink, SupabaseSink, make_sink
+
+@pytest.fixture
+def sink(tmp_path):
+    sink = SQLiteSink(str(tmp_path / "etl.db"))
+    yield sink
+    sink.close()
+
+def _brand(sink, name):
+    return sink.table('brands').insert({'name': name, 'slug': name.lower()}).execute().data[0]
+
+def test_insert_select_and_filters(sink):
+    dior = _brand(sink, 'Dior')
+    _brand(sink, 'Chanel')
+    _brand(sink, 'Guerlain')
+
+    assert len(dior['id']) == 36
+    names = sink.table('brands').select('name').order('name').range(0, 1).execute().data
+    assert names == [{'name': 'Chanel'}, {'name': 'Dior'}]
+    found = sink.table('brands').select('id, name').in_('name', ['Dior', 'Nope']).execute().data
+    assert found == [{'id': dior['id'], 'name': 'Dior'}]
+    assert sink.table('brands').select('*').eq('slug', 'guerlain').limit(1).execute().data[0]['name'] == 'Guerlain'
+
+def test_perfume_upsert_treats_nulls_as_equal(sink):
+    brand = _brand(sink, 'Dior')
+    row = {'name': 'Sauvage', 'brand_id': brand['id'], 'concentration_id': None, 'release_year': None,
+           'top_notes': ['bergamot'], 'is_active': True, 'source_record_slug': 'dior-sauvage'}
+    first = sink.table('perfumes').upsert(row, on_conflict='brand_id,name,concentration_id,release_year').execute().data
+    second = sink.table('perfumes').upsert({**row, 'top_notes': ['pepper', 'bergamot'], 'is_active': False},
+                                           on_conflict='brand_id,name,concentration_id,release_year').execute().data
+
+    rows = sink.table('perfumes').select('*').execute().data
+    assert len(rows) == 1
+    assert second[0]['id'] == first[0]['id']
+    # JSON and BOOLEAN columns come back as Python values
+    assert rows[0]['top_notes'] == ['pepper', 'bergamot']
+    assert rows[0]['is_active'] is False
+
+def test_upsert_ignore_duplicates_update_and_delete(sink):
+    brand = _brand(sink, 'Dior')
+    table = sink.table('brand_aliases')
+    table.upsert({'alias_norm': 'dior', 'brand_id': brand['id']}, on_conflict='alias_norm').execute()
+    sink.table('brand_aliases').upsert({'alias_norm': 'dior', 'brand_id': 'other'}, on_conflict='alias_norm',
+                                       ignore_duplicates=True).execute()
+    assert sink.table('brand_aliases').select('brand_id').execute().data == [{'brand_id': brand['id']}]
+
+    sink.table('brands').update({'slug': 'christian-dior'}).eq('id', brand['id']).execute()
+    assert sink.table('brands').select('slug').execute().data == [{'slug': 'christian-dior'}]
+    sink.table('brand_aliases').delete().eq('alias_norm', 'dior').execute()
+    assert sink.table('brand_aliases').select('*').execute().data == []
+
+def test_make_sink_is_lazy():
+    # No credentials: nothing fails until the first query
+    sink = make_sink('supabase')
+    assert isinstance(sink, SupabaseSink)
+    with pytest.raises(RuntimeError):
+        sink.table('brands')
+    with pytest.raises(ValueError):
+        make_sink('duckdb')
+
+def test_incomplete_sql_sink_cannot_be_created():
+    class NoBulkSink(SQLSink):
+        def run(self, table, sql, params):
+            return []
+
+    with pytest.raises(TypeError):
+        NoBulkSink()
+
+def test_full_run_into_sqlite(catalog_csv, local_pipeline, sink):
+    catalog_csv()
+    pipeline = local_pipeline(sink)
+
+    # async needs PostgREST and falls back to rest
+    pipeline.run(backend='async')
+
+    perfumes = sink.table('perfumes').select('*').execute().data
+    assert len(perfumes) == len(pipeline.df)
+    assert {p['fingerprint_strict'] for p in perfumes} == set(pipeline.df['fingerprint_strict'])
+    assert len(sink.table('import_runs').select('id').execute().data) == 1
+    links = sink.table('perfume_notes').select('perfume_id').execute().data
+    assert {l['perfume_id'] for l in links} <= {p['id'] for p in perfumes}
+    assert links
+    assert len(sink.table('perfume_perfumers').select('*').execute().data) == 3
+
+    # A second run updates in place
+    local_pipeline(sink).run()
+    assert len(sink.table('perfumes').select('id').execute().data) == len(perfumes)
@@ -0,0 +1,77 @@
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from etl_postgres import encode_copy_rows
+from etl_sinks import SQLiteSink
+from etl_staging import RAW_ROW_COLUMNS, RawRowStager
+from etl_v5 import ETLPipelineV5
+
+# Raw values are staged as-is: a missing brand, an unparseable year, a duplicate
+RAW_CATALOG = {
+    'Brand': ['Dior', 'Dior', None, 'Guerlain', 'Chanel'],
+    'Name': ['Sauvage', 'Sauvage', 'Mystery', 'Shalimar', 'No 5'],
+    'Concentration': ['EDT', 'EDT', 'EDP', '', 'EDP'],
+    'Release Year': ['2015', '2015', 'n/a', '1925', '1921'],
+    'Rating Count': [3000, 450, 10, 900, 1200],
+    'Rating Value': '4,2',
+    'Gender': 'Unisex',
+    'Manufacturer': 'LVMH',
+    'Top Notes': 'Bergamot',
+    'URL': 'http://x',
+}
+
+@pytest.fixture
+def csv_path(catalog_csv):
+    return catalog_csv(rows=RAW_CATALOG)
+
+def test_stage_every_source_row_into_sqlite(tmp_path, csv_path, local_pipeline):
+    sink = SQLiteSink(str(tmp_path / "etl.db"))
+    pipeline = local_pipeline(sink)
+    run_id = pipeline._ensure_import_run()
+
+    assert RawRowStager(pipeline, chunk_size=2).run(run_id) == 5
+
+    rows = sink.table('raw_import_rows').select('*').execute().data
+    reference = local_pipeline()
+    reference.load_and_clean_data(dedup=False)
+    expected = reference.df
+    assert [r['fp_strict'] for r in rows] == ['\\x' + fp for fp in expected['fingerprint_strict']]
+    assert {r['import_run_id'] for r in rows} == {run_id}
+    # Duplicates are staged too, and the raw values are the uncleaned ones
+    assert [r['name_raw'] for r in rows] == ['Sauvage', 'Sauvage', 'Mystery', 'Shalimar', 'No 5']
+    assert rows[2]['brand_raw'] is None and rows[2]['release_year'] is None
+    assert rows[0]['raw_json']['Rating Value'] == 4.2
+    assert rows[0]['raw_json']['Brand'] == 'Dior'
+
+    # Stored as 32-byte digests, not 64 hex characters
+    sizes = sink.conn.execute("SELECT DISTINCT length(fp_strict), length(fp_loose) FROM raw_import_rows").fetchall()
+    assert [tuple(s) for s in sizes] == [(32, 32)]
+    sink.close()
+
+def test_rest_staging_sends_json_in_batches(csv_path, fake_supabase):
+    pipeline = ETLPipelineV5(csv_path)
+    staged = RawRowStager(pipeline, batch_size=2).run('run-1')
+
+    rows = fake_supabase.tables['raw_import_rows']
+    assert staged == len(rows) == 5
+    assert fake_supabase.calls.count(('raw_import_rows', 'insert')) == 3
+    assert rows[3]['raw_json']['Name'] == 'Shalimar'
+    assert rows[3]['fp_loose'].startswith('\\x') and len(rows[3]['fp_loose']) == 66
+
+def test_resumed_run_restages_from_scratch(tmp_path, csv_path, local_pipeline):
+    sink = SQLiteSink(str(tmp_path / "etl.db"))
+    pipeline = local_pipeline(sink)
+    pipeline.stage_raw_import_rows()
+    pipeline.stage_raw_import_rows(resume=True)
+
+    assert len(sink.table('raw_import_rows').select('id').execute().data) == 5
+    sink.close()
+
+def test_copy_encoding_of_raw_rows():
+    row = dict.fromkeys(RAW_ROW_COLUMNS)
+    row.update({'import_run_id': 'r', 'fp_strict': '\\xab', 'fp_loose': '\\xcd', 'raw_json': '{"Name":"a\\tb"}'})
+    # COPY text unescapes \\x to the bytea hex input \x
+    assert encode_copy_rows([row], RAW_ROW_COLUMNS).getvalue() == (
+        'r\t\\N\t\\N\t\\N\t\\N\t\\\\xab\t\\\\xcd\t{"Name":"a\\\\tb"}\n')
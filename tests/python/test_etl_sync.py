@@ -0,0 +1,270 @@
+import json
+import os
+import sys
+import httpx
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+import etl_v5
+from etl_v5 import ETLPipelineV5, is_transient_error
+
+from postgrest.exceptions import APIError
+
+@pytest.fixture
+def etl(tmp_path):
+    pipeline = ETLPipelineV5("dummy.csv")
+    pipeline.dead_letter_path = str(tmp_path / "dead_letter.jsonl")
+    return pipeline
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(etl_v5.time, 'sleep', lambda s: None)
+
+def _records(n, bad=()):
+    return [{'name': 'bad' if i in bad else f'P{i}', 'fingerprint_strict': f'fp{i}', 'fingerprint_loose': f'fl{i}'}
+            for i in range(n)]
+
+def _reject_bad(payload):
+    if any(r['name'] == 'bad' for r in payload):
+        return APIError({'message': 'violates check constraint', 'code': '23514'})
+    return None
+
+def test_is_transient_error():
+    assert is_transient_error(httpx.ConnectError("boom"))
+    assert is_transient_error(APIError({'message': 'gateway', 'code': 502}))
+    assert is_transient_error(APIError({'message': 'deadlock', 'code': '40P01'}))
+    assert not is_transient_error(APIError({'message': 'dup', 'code': '23505'}))
+    assert not is_transient_error(APIError({'message': 'bad request', 'code': 400}))
+    assert not is_transient_error(ValueError("nope"))
+
+def test_bisect_isolates_bad_row(etl, fake_supabase):
+    fake_supabase.errors[('perfumes', 'upsert')] = _reject_bad
+
+    etl._batch_upsert(_records(16, bad={5}))
+
+    assert len(fake_supabase.tables['perfumes']) == 15
+    # 1 failed full batch + 2 calls per level down to the single bad row
+    assert fake_supabase.calls.count(('perfumes', 'upsert')) == 1 + 2 * 4
+    assert [d['record']['name'] for d in etl.dead_letters] == ['bad']
+
+    with open(etl.dead_letter_path) as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0]['error_code'] == '23514'
+    assert lines[0]['record']['fingerprint_strict'] == 'fp5'
+
+def test_transient_errors_are_retried(etl, fake_supabase):
+    failures = iter([httpx.ReadTimeout("slow"), httpx.ConnectError("blip")])
+    fake_supabase.errors[('perfumes', 'upsert')] = lambda payload: next(failures, None)
+
+    etl._batch_upsert(_records(4))
+
+    assert len(fake_supabase.tables['perfumes']) == 4
+    assert fake_supabase.calls.count(('perfumes', 'upsert')) == 3
+    assert etl.dead_letters == []
+
+def test_exhausted_retries_dead_letter_without_bisecting(etl, fake_supabase):
+    fake_supabase.errors[('perfumes', 'upsert')] = httpx.ConnectError("down")
+
+    etl._batch_upsert(_records(8))
+
+    assert fake_supabase.calls.count(('perfumes', 'upsert')) == etl_v5.MAX_RETRIES + 1
+    assert len(etl.dead_letters) == 8
+
+def test_record_dead_letters_writes_import_conflicts(etl, fake_supabase):
+    fake_supabase.errors[('perfumes', 'upsert')] = _reject_bad
+    etl._batch_upsert(_records(4, bad={1, 3}))
+
+    etl.record_dead_letters()
+
+    assert len(fake_supabase.tables['import_runs']) == 1
+    raw_rows = fake_supabase.tables['raw_import_rows']
+    conflicts = fake_supabase.tables['import_conflicts']
+    assert [r['fp_strict'] for r in raw_rows] == ['\\xfp1', '\\xfp3']
+    assert [c['raw_row_id'] for c in conflicts] == [r['id'] for r in raw_rows]
+    assert all(c['conflict_type'] == 'upsert_failed' for c in conflicts)
+    assert conflicts[0]['import_run_id'] == etl.import_run_id
+
+def _perfume(fp, **overrides):
+    record = {
+        'fingerprint_strict': fp, 'fingerprint_loose': f'l-{fp}', 'name': fp.upper(),
+        'brand_id': 'b1', 'concentration_id': None, 'manufacturer_id': None,
+        'release_year': 2020, 'gender': 'Unisex',
+        'top_notes': ['Rose'], 'middle_notes': [], 'base_notes': ['Musk'], 'perfumers': [],
+        'xsolve_score': 0.1234567890123, 'xsolve_model_version': 1,
+        'is_active': True, 'is_uncertain': False, 'is_linear': False,
+        'source_record_slug': f'slug-{fp}',
+    }
+    record.update(overrides)
+    return record
+
+def test_content_hash_ignores_float_noise(etl):
+    a = _perfume('a')
+    b = _perfume('a', xsolve_score=0.1234567890123 + 1e-14, top_notes=('Rose',))
+    assert etl.content_hash(a) == etl.content_hash(b)
+    assert etl.content_hash(a) != etl.content_hash(_perfume('a', base_notes=['Amber']))
+
+def test_plan_delta_counts_and_selection(etl, fake_supabase):
+    fake_supabase.tables['perfumes'] = [
+        dict(_perfume('same'), id='1'),
+        dict(_perfume('changed', xsolve_score=0.9), id='2'),
+        dict(_perfume('gone'), id='3'),
+        dict(_perfume('gone-inactive', is_active=False), id='4'),
+    ]
+    local = [_perfume('same'), _perfume('changed'), _perfume('new')]
+
+    to_send, removed, counts = etl.plan_delta(local)
+
+    assert counts == {'new': 1, 'changed': 1, 'unchanged': 1, 'removed': 1}
+    assert [r['fingerprint_strict'] for r in to_send] == ['changed', 'new']
+    assert removed == ['gone']
+
+def test_deactivate_fingerprints(etl, fake_supabase, monkeypatch):
+    monkeypatch.setattr(etl_v5, 'DEACTIVATE_CHUNK', 2)
+    fake_supabase.tables['perfumes'] = [dict(_perfume(fp), id=fp) for fp in ['a', 'b', 'c', 'd']]
+
+    etl.deactivate_fingerprints(['a', 'b', 'c'])
+
+    active = {r['fingerprint_strict']: r['is_active'] for r in fake_supabase.tables['perfumes']}
+    assert active == {'a': False, 'b': False, 'c': False, 'd': True}
+    assert fake_supabase.calls.count(('perfumes', 'update')) == 2
+
+def _staged_pipeline(tmp_path, monkeypatch, n_rows, fail_on_batch=None):
+    """Pipeline whose stages are stubbed; upserts are recorded and may crash once."""
+    import pandas as pd
+
+    pipeline = ETLPipelineV5("dummy.csv")
+    pipeline.checkpoint_root = str(tmp_path / "checkpoints")
+    pipeline.use_cache = False
+    pipeline.dedup_strategy = 'keep-first'
+    pipeline.write_links = False
+    pipeline.stage_raw_rows = False
+    pipeline.sent = []
+    stages = []
+
+    def load(dedup=True):
+        stages.append('load')
+        pipeline.df = pd.DataFrame({'fingerprint_strict': [f'fp{i}' for i in range(n_rows)]})
+
+    def upsert(records):
+        if len(pipeline.sent) == fail_on_batch:
+            raise ConnectionError("network blip")
+        pipeline.sent.append([r['fingerprint_strict'] for r in records])
+
+    monkeypatch.setattr(pipeline, 'load_and_clean_data', load)
+    monkeypatch.setattr(pipeline, 'extract_note_pyramids', lambda: stages.append('extract'))
+    monkeypatch.setattr(pipeline, 'calculate_xsolve_score', lambda: stages.append('score'))
+    monkeypatch.setattr(pipeline, 'save_note_matrix', lambda: None)
+    monkeypatch.setattr(pipeline, 'resolve_dimensions', lambda: stages.append('resolve'))
+    monkeypatch.setattr(pipeline, 'iter_perfume_records',
+                        lambda: ({'fingerprint_strict': fp} for fp in pipeline.df['fingerprint_strict']))
+    monkeypatch.setattr(pipeline, '_batch_upsert', upsert)
+    return pipeline, stages
+
+def test_resume_skips_finished_stages_and_batches(tmp_path, fake_supabase, monkeypatch):
+    monkeypatch.setattr(etl_v5, 'BATCH_SIZE', 2)
+
+    first, first_stages = _staged_pipeline(tmp_path, monkeypatch, 7, fail_on_batch=2)
+    with pytest.raises(ConnectionError):
+        first.run()
+    run_id = first.import_run_id
+    assert fake_supabase.tables['import_runs'][0]['id'] == run_id
+    assert first_stages == ['load', 'extract', 'score', 'resolve']
+    assert first.checkpoint.stage == 'resolved'
+    assert first.checkpoint.batch_offset == 4
+    assert os.path.isdir(first.checkpoint.dir)
+
+    second, second_stages = _staged_pipeline(tmp_path, monkeypatch, 7)
+    second.run(resume=run_id)
+
+    assert second_stages == []
+    assert second.sent == [['fp4', 'fp5'], ['fp6']]
+    assert second.checkpoint.stage == 'synced'
+    assert second.checkpoint.batch_offset == 7
+    # A completed run leaves no snapshot behind
+    assert not os.path.exists(second.checkpoint.dir)
+    # Resuming does not register another run
+    assert len(fake_supabase.tables['import_runs']) == 1
+
+def test_batch_progress_waits_for_earlier_batches(tmp_path):
+    from etl_checkpoint import BatchProgress, RunCheckpoint
+
+    checkpoint = RunCheckpoint.create('run-1', root=str(tmp_path))
+    progress = BatchProgress(checkpoint, start=10)
+
+    progress.batch_done(1, 5)
+    progress.batch_done(2, 5)
+    assert RunCheckpoint.load('run-1', root=str(tmp_path)).batch_offset == 0
+
+    progress.batch_done(0, 5)
+    assert RunCheckpoint.load('run-1', root=str(tmp_path)).batch_offset == 25
+
+def test_record_near_duplicates_queues_lower_rated_row(etl, fake_supabase):
+    etl.df = pd.DataFrame({
+        'Brand': ['Dior', 'Dior', 'Guerlain'],
+        'Name': ['Sauvage', 'Sauvage', 'Shalimar'],
+        'Concentration': ['Eau de Parfum', 'EDP', 'Eau de Toilette'],
+        'Release Year': [2018, 2018, 1925],
+        'Rating Count': [900, 40, 300],
+        'fingerprint_strict': ['fp0', 'fp1', 'fp2'],
+        'fingerprint_loose': ['fl0', 'fl0', 'fl2'],
+    })
+
+    etl.record_near_duplicates()
+
+    raw_rows = fake_supabase.tables['raw_import_rows']
+    conflicts = fake_supabase.tables['import_conflicts']
+    assert [r['fp_strict'] for r in raw_rows] == ['\\xfp1']
+    assert raw_rows[0]['concentration_raw'] == 'EDP'
+    assert conflicts[0]['conflict_type'] == 'near_duplicate'
+    assert conflicts[0]['raw_row_id'] == raw_rows[0]['id']
+    assert conflicts[0]['details']['duplicate_of'] == 'fp0'
+    assert conflicts[0]['details']['similarity'] == 1.0
+
+def _linked_frame():
+    return pd.DataFrame({
+        'fingerprint_strict': ['fp0', 'fp1', 'fp2'],
+        'top_notes': [['Bergamot', 'Pepper'], ['Bergamot'], []],
+        'middle_notes': [['Lavender', 'Lavender'], [], []],
+        'base_notes': [['Ambroxan'], ['Ylang-Ylang'], ['Ylang Ylang']],
+        'perfumers': [['François Demachy'], ['François Demachy', 'Olivier Polge'], []],
+    })
+
+def test_sync_note_links_builds_vocabularies_and_junctions(etl, fake_supabase):
+    fake_supabase.tables['perfumes'] = [{'id': f'p{i}', 'fingerprint_strict': f'fp{i}'} for i in range(3)]
+    fake_supabase.tables['notes'] = [{'id': 'n-berg', 'name': 'Bergamot', 'slug': 'bergamot', 'display_name': 'Bergamot'}]
+    # A stale link that the new pyramid no longer has
+    fake_supabase.tables['perfume_notes'] = [{'perfume_id': 'p0', 'note_id': 'n-old', 'type': 'top'}]
+    etl.df = _linked_frame()
+
+    etl.sync_note_links()
+
+    notes = {n['slug']: n['id'] for n in fake_supabase.tables['notes']}
+    # Spellings with the same slug share one note
+    assert sorted(notes) == ['ambroxan', 'bergamot', 'lavender', 'pepper', 'ylang-ylang']
+    links = {(l['perfume_id'], l['note_id'], l['type']) for l in fake_supabase.tables['perfume_notes']}
+    assert links == {
+        ('p0', 'n-berg', 'top'), ('p0', notes['pepper'], 'top'), ('p0', notes['lavender'], 'middle'),
+        ('p0', notes['ambroxan'], 'base'), ('p1', 'n-berg', 'top'), ('p1', notes['ylang-ylang'], 'base'),
+        ('p2', notes['ylang-ylang'], 'base'),
+    }
+    assert len(fake_supabase.tables['perfume_notes']) == 7
+    perfumers = {p['name']: p['id'] for p in fake_supabase.tables['perfumers']}
+    assert {(l['perfume_id'], l['perfumer_id']) for l in fake_supabase.tables['perfume_perfumers']} == {
+        ('p0', perfumers['François Demachy']), ('p1', perfumers['François Demachy']), ('p1', perfumers['Olivier Polge']),
+    }
+    # Bulk: one insert per vocabulary, one delete + insert per junction table for these 3 perfumes
+    assert fake_supabase.calls.count(('notes', 'insert')) == 1
+    assert fake_supabase.calls.count(('perfume_notes', 'delete')) == 1
+    assert fake_supabase.calls.count(('perfume_notes', 'insert')) == 1
+
+def test_sync_note_links_after_delta_only_touches_sent_perfumes(etl, fake_supabase):
+    fake_supabase.tables['perfumes'] = [{'id': f'p{i}', 'fingerprint_strict': f'fp{i}'} for i in range(3)]
+    fake_supabase.tables['perfume_perfumers'] = [{'perfume_id': 'p0', 'perfumer_id': 'kept'}]
+    etl.df = _linked_frame()
+    etl.synced_fingerprints = ['fp1']
+
+    etl.sync_note_links()
+
+    assert {l['perfume_id'] for l in fake_supabase.tables['perfume_notes']} == {'p1'}
+    assert {'perfume_id': 'p0', 'perfumer_id': 'kept'} in fake_supabase.tables['perfume_perfumers']
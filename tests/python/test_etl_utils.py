@@ -1,18 +1,10 @@
 import os
 import sys
 import pytest
-from unittest.mock import MagicMock, patch
+import pandas as pd
 
-# Mock environment before importing
-os.environ["SUPABASE_URL"] = "http://mock"
-os.environ["SUPABASE_SERVICE_ROLE_KEY"] = "mock"
-
-# Mock Supabase before importing the module that initializes it
-with patch('supabase.create_client') as mock_create:
-    mock_create.return_value = MagicMock()
-    # Add scripts directory to path to allow import
-    sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
-    from etl_v5 import ETLPipelineV5
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from etl_v5 import ETLPipelineV5, NoteNormalizer
 
 @pytest.fixture
 def etl():
@@ -53,3 +45,170 @@ def test_generate_fingerprint_strict(etl):
 def test_slugify(etl):
     assert etl.slugify("Hello World!") == "hello-world"
     assert etl.slugify("Brand (New) Name") == "brand-new-name"
+
+def test_compute_fingerprints_matches_scalar(etl):
+    df = pd.DataFrame({
+        'Brand': ['Chanel', ' CHANEL ', 'Dior  Parfums', None, 42, 'Tab\tBrand\u00a0Ex'],
+        'Name': ['N°5', ' n°5 ', 'Sauvage', 'Unknown', 'X', float('nan')],
+        'Concentration': ['EDP', ' edp ', 'EDT', 'Unknown', 'EDP', 'Parfum'],
+        'Release Year': [1921, '1921.0', None, '', 'abc', 2015.0],
+    })
+    etl.compute_fingerprints(df)
+
+    for _, row in df.iterrows():
+        assert row['fingerprint_strict'] == etl.generate_fingerprint_strict(
+            row['Brand'], row['Name'], row['Concentration'], row['Release Year']
+        )
+        assert row['fingerprint_loose'] == etl.generate_fingerprint_loose(row['Brand'], row['Name'])
+        legacy_slug = f"{etl.normalize_text(row['Brand'])}-{etl.normalize_text(row['Name'])}-{etl.normalize_text(row['Concentration'])}-{etl.normalize_text(str(row['Release Year']))}"[:250]
+        assert row['source_record_slug'] == legacy_slug
+
+    assert df.loc[0, 'fingerprint_strict'] == df.loc[1, 'fingerprint_strict']
+
+def test_note_normalizer_cache_counters():
+    normalizer = NoteNormalizer(cache_size=2)
+    assert normalizer.clean("Rose Absolute") == "Rose"
+    assert normalizer.clean("Rose Absolute") == "Rose"
+    assert normalizer.clean("Iris (Orris)") == "Iris"
+    assert normalizer.clean("") == ""  # short-circuits, never reaches the cache
+
+    stats = normalizer.cache_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['size'] == 2
+    assert stats['hit_rate'] == pytest.approx(1 / 3)
+
+    # Bounded: a third distinct note evicts the least recently used entry
+    normalizer.clean("Oud Orpur")
+    assert normalizer.cache_stats()['size'] == 2
+
+def test_clean_note_uses_shared_normalizer(etl):
+    etl._clean_note("Vanilla Absolute")
+    etl._clean_note("Vanilla Absolute")
+    assert etl.note_normalizer.cache_stats()['hits'] == 1
+
+def test_resolve_dimensions_bulk(etl, fake_supabase):
+    fake_supabase.tables['brands'] = [{'id': 'b-chanel', 'name': 'Chanel', 'slug': 'chanel'}]
+    etl.df = pd.DataFrame({
+        'Brand': ['Chanel', ' CHANEL', 'Dior', 'dior', 'Unknown', 'Guerlain'],
+        'Concentration': ['EDP', 'EDP', 'EDT', 'EDT', 'EDP', 'Unknown'],
+        'Manufacturer': ['Unknown', 'Unknown', 'LVMH', 'LVMH', 'Unknown', 'LVMH'],
+    })
+
+    etl.resolve_dimensions()
+
+    assert etl.df['brand_id'].iloc[0] == 'b-chanel'
+    assert etl.df['brand_id'].iloc[1] == 'b-chanel'
+    assert etl.df['brand_id'].iloc[2] == etl.df['brand_id'].iloc[3] is not None
+    assert etl.df['brand_id'].iloc[4] is None
+    assert etl.df['concentration_id'].iloc[5] is None
+    assert etl.df['manufacturer_id'].iloc[0] is None
+
+    # One paginated fetch + at most one insert per table, regardless of row count
+    inserts = [c for c in fake_supabase.calls if c[1] == 'insert']
+    assert sorted(t for t, _ in inserts) == ['brands', 'concentrations', 'manufacturers']
+    new_brands = [r['name'] for r in fake_supabase.tables['brands']]
+    assert new_brands == ['Chanel', 'Dior', 'Guerlain']
+
+def test_prepopulate_cache_paginates(etl, fake_supabase, monkeypatch):
+    import etl_v5
+    monkeypatch.setattr(etl_v5, 'PAGE_SIZE', 2)
+    fake_supabase.tables['brands'] = [{'id': f'b{i}', 'name': f'Brand {i}'} for i in range(5)]
+
+    etl.prepoulate_cache()
+
+    assert len(etl.db_cache['brands']) == 5
+    assert fake_supabase.calls.count(('brands', 'select')) == 3
+
+def _pyramid_frame():
+    df = pd.DataFrame({
+        'fingerprint_strict': ['a', 'b', 'a', 'a', 'c'],
+        'Name': ['Sauvage', 'No 5', 'Sauvage', 'Sauvage', 'Shalimar'],
+        'Brand': ['Dior', 'Chanel', 'Dior', 'Dior', 'Guerlain'],
+        'Rating Count': [100, 50, 900, 100, 10],
+        'Top Notes': ['Pepper, Lavender', 'Aldehydes', 'Bergamot, Pepper', 'Elemi', ''],
+        'Middle Notes': ['', 'Rose', '', 'Geranium', ''],
+        'Base Notes': ['', '', 'Ambroxan', '', ''],
+        'Perfumers': ['', '', 'Demachy', 'Demachy, Flores-Roux', ''],
+        'Main Accords': ['', '', '', '', 'vanilla, amber'],
+    })
+    return df
+
+def test_merge_duplicate_rows_unions_lists(etl):
+    etl.df = _pyramid_frame()
+    etl.extract_note_pyramids()
+
+    report = etl.merge_duplicate_rows()
+
+    # Same rows and order as keep-first: highest Rating Count first, ties in CSV order
+    assert etl.df.index.tolist() == [2, 1, 4]
+    sauvage = etl.df.loc[2]
+    assert sauvage['top_notes'] == ['Bergamot', 'Pepper', 'Lavender', 'Elemi']
+    assert sauvage['middle_notes'] == ['Geranium']
+    assert sauvage['base_notes'] == ['Ambroxan']
+    assert sauvage['perfumers'] == ['Demachy', 'Flores-Roux']
+    assert sauvage['notes_list'] == ['Bergamot', 'Pepper', 'Lavender', 'Elemi', 'Geranium', 'Ambroxan']
+    assert sauvage['note_count'] == 6
+    # Untouched rows keep their lists (and the Main Accords fallback)
+    assert etl.df.loc[4, 'notes_list'] == ['vanilla', 'amber']
+
+    assert report.to_dict('records') == [{
+        'fingerprint_strict': 'a', 'name': 'Sauvage', 'brand': 'Dior', 'rows_merged': 3,
+        'primary_rating_count': 900, 'max_duplicate_rating_count': 100,
+        'top_notes_added': 2, 'middle_notes_added': 1, 'base_notes_added': 0, 'perfumers_added': 1,
+    }]
+
+def test_merge_without_duplicates_matches_keep_first(etl):
+    df = _pyramid_frame().drop_duplicates('fingerprint_strict')
+    etl.df = df.copy()
+    etl.extract_note_pyramids()
+    etl.merge_duplicate_rows()
+
+    keep_first = ETLPipelineV5("dummy.csv")
+    keep_first.df = df.sort_values('Rating Count', ascending=False, kind='stable')
+    keep_first.extract_note_pyramids()
+
+    pd.testing.assert_frame_equal(etl.df, keep_first.df)
+    assert etl.merge_report.empty
+
+def test_resolve_dimensions_matches_brand_spellings(etl, fake_supabase):
+    fake_supabase.tables['brands'] = [
+        {'id': 'b-mfk', 'name': 'Maison Francis Kurkdjian', 'slug': 'maison-francis-kurkdjian'},
+        {'id': 'b-chanel', 'name': 'Chanel', 'slug': 'chanel'},
+    ]
+    fake_supabase.tables['brand_aliases'] = [{'alias_norm': 'mfk', 'brand_id': 'b-mfk'}]
+    etl.df = pd.DataFrame({
+        'Brand': ['Maison Francis Kurkdjan', 'MFK', 'Chanell', 'Maison Margiela', 'Maison Margiella'],
+        'Concentration': ['EDP'] * 5,
+        'Manufacturer': ['Unknown'] * 5,
+        'fingerprint_strict': [f'fp{i}' for i in range(5)],
+        'fingerprint_loose': [f'fl{i}' for i in range(5)],
+    })
+
+    etl.resolve_dimensions()
+
+    # One dropped letter in a long name is an alias; the stored alias matches exactly
+    assert etl.df['brand_id'].tolist()[:2] == ['b-mfk', 'b-mfk']
+    saved = {r['alias_norm']: r['brand_id'] for r in fake_supabase.tables['brand_aliases']}
+    assert saved['maison francis kurkdjan'] == 'b-mfk'
+    # Weaker matches become new brands queued for review; variants within the batch share one brand
+    assert etl.df['brand_id'].iloc[2] not in ('b-chanel', None)
+    assert etl.df['brand_id'].iloc[3] == etl.df['brand_id'].iloc[4] == saved['maison margiella']
+    assert [r['name'] for r in fake_supabase.tables['brands'][2:]] == ['Chanell', 'Maison Margiela']
+    assert [(r['brand_raw'], r['candidate']) for r in etl.brand_reviews] == [('Chanell', 'chanel')]
+
+    etl.record_brand_reviews()
+    conflict = fake_supabase.tables['import_conflicts'][0]
+    assert conflict['conflict_type'] == 'brand_review'
+    assert conflict['details']['candidate_brand'] == 'chanel'
+    assert fake_supabase.tables['raw_import_rows'][0]['fp_strict'] == '\\xfp2'
+
+def test_resolve_dimensions_without_fuzzy_brands(etl, fake_supabase):
+    fake_supabase.tables['brands'] = [{'id': 'b-mfk', 'name': 'Maison Francis Kurkdjian', 'slug': 'mfk'}]
+    etl.fuzzy_brands = False
+    etl.df = pd.DataFrame({'Brand': ['Maison Francis Kurkdjan'], 'Concentration': ['EDP'], 'Manufacturer': ['LVMH']})
+
+    etl.resolve_dimensions()
+
+    assert etl.df['brand_id'].iloc[0] != 'b-mfk'
+    assert 'brand_aliases' not in fake_supabase.tables
@@ -0,0 +1,67 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from near_duplicates import NearDuplicateFinder, shingle_text
+
+def _catalog(rows):
+    df = pd.DataFrame(rows, columns=['Brand', 'Name', 'Concentration', 'Release Year', 'Rating Count'])
+    df['fingerprint_strict'] = [f'fp{i}' for i in range(len(df))]
+    df['fingerprint_loose'] = (df['Brand'] + '|' + df['Name']).str.lower()
+    return df
+
+def test_shingle_text_unaccents_and_expands_abbreviations():
+    assert shingle_text('Hermès', "Terre d'Hermès", 'EDP') == 'hermes terre d hermes eau de parfum'
+    assert shingle_text('Dior', None, 'Eau de Parfum') == 'dior eau de parfum'
+    assert shingle_text(None, None, None) == '   '
+
+def test_signatures_estimate_jaccard():
+    finder = NearDuplicateFinder()
+    sig = finder.signatures(['chanel coco mademoiselle', 'chanel coco mademoiselle', 'guerlain shalimar'])
+    pairs = [[0, 1], [0, 2]]
+    similarity = finder.similarity(sig, pd.DataFrame(pairs).to_numpy())
+    assert similarity[0] == 1.0
+    assert similarity[1] < 0.2
+
+def test_find_reports_variants_and_skips_unrelated():
+    df = _catalog([
+        ['Dior', 'Sauvage', 'Eau de Parfum', 2018, 900],
+        ['Chanel', 'Coco Mademoiselle', 'Eau de Parfum', 2001, 500],
+        ['Dior', 'Sauvage', 'EDP', 2018, 40],                    # abbreviation
+        ['Chanel', 'Coco Mademoisele', 'Eau de Parfum', 2001, 20],  # misspelled flanker
+        ['Guerlain', 'Shalimar', 'Eau de Toilette', 1925, 300],
+        ['Chanel', 'No 5', 'Parfum', 1921, 800],
+        ['Chanel', 'No 19', 'Parfum', 1970, 100],                # different number, different perfume
+        ['Guerlain', 'Shalimar', 'Eau de Toilette', 1926, 10],   # year off by one
+    ])
+
+    pairs = NearDuplicateFinder().find(df)
+
+    found = {(l, r) for l, r in zip(pairs['left'], pairs['right'])}
+    assert found == {(0, 2), (1, 3), (4, 7)}
+    shalimar = pairs[pairs['right'] == 7].iloc[0]
+    assert shalimar['similarity'] == 1.0
+    assert shalimar['year_diff'] == 1
+    assert shalimar['same_loose']
+
+def test_find_ignores_exact_duplicates():
+    df = _catalog([['Dior', 'Sauvage', 'EDT', 2015, 10], ['Dior', 'Sauvage', 'EDT', 2015, 5]])
+    df['fingerprint_strict'] = 'same'
+    assert NearDuplicateFinder().find(df).empty
+
+def test_large_buckets_pair_identical_signatures_with_one_row():
+    df = _catalog([['Brand', 'Cologne', 'EDC', 2000 + i, i] for i in range(30)])
+    finder = NearDuplicateFinder(max_bucket=10)
+    sig = finder.signatures(shingle_text(b, n, c) for b, n, c in zip(df['Brand'], df['Name'], df['Concentration']))
+    assert len(NearDuplicateFinder().candidate_pairs(sig)) == 30 * 29 // 2
+
+    # The identical texts land in an oversized bucket of every band: a star instead of every pair
+    assert finder.candidate_pairs(sig).tolist() == [[0, i] for i in range(1, 30)]
+    # so the year variants of a boilerplate name are still reported
+    assert len(finder.find(df)) == 29
+
+def test_bands_must_divide_permutations():
+    with pytest.raises(ValueError):
+        NearDuplicateFinder(num_perm=64, num_bands=10)
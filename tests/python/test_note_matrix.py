@@ -0,0 +1,55 @@
+import os
+import sys
+import pytest
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from note_matrix import NoteIncidenceMatrix
+
+@pytest.fixture
+def note_lists():
+    return [
+        ['Rose', 'Musk', 'Rose'],  # Repeated across tiers
+        ['Musk', 'Amber'],
+        [],
+        ['Oud'],
+    ]
+
+def test_incidence_counts(note_lists):
+    m = NoteIncidenceMatrix.from_note_lists(note_lists)
+
+    assert m.vocabulary == ['Amber', 'Musk', 'Oud', 'Rose']
+    assert m.shape == (4, 4)
+    assert m.note_counts().tolist() == [3, 2, 0, 1]
+    assert m.occurrences().tolist() == [1, 2, 1, 2]
+    assert m.document_frequency().tolist() == [1, 2, 1, 1]
+
+def test_mean_note_rarity_matches_list_mean(note_lists):
+    m = NoteIncidenceMatrix.from_note_lists(note_lists)
+    freqs = dict(zip(m.vocabulary, m.note_frequencies()))
+
+    expected = [np.mean([1.0 - freqs[n] for n in notes]) if notes else 0.0 for notes in note_lists]
+    np.testing.assert_allclose(m.mean_note_rarity(), expected)
+
+def test_idf_is_higher_for_rarer_notes(note_lists):
+    m = NoteIncidenceMatrix.from_note_lists(note_lists)
+    idf = m.idf()
+    assert idf[m.note_id('Oud')] > idf[m.note_id('Musk')]
+
+def test_existing_vocabulary_keeps_ids_stable(note_lists):
+    first = NoteIncidenceMatrix.from_note_lists(note_lists)
+    second = NoteIncidenceMatrix.from_note_lists([['Vanilla', 'Rose']], vocabulary=first.vocabulary)
+
+    assert second.vocabulary[:4] == first.vocabulary
+    assert second.note_id('Rose') == first.note_id('Rose')
+    assert second.note_id('Vanilla') == 4
+
+def test_save_and_load_roundtrip(tmp_path, note_lists):
+    path = tmp_path / 'note_matrix.npz'
+    m = NoteIncidenceMatrix.from_note_lists(note_lists, keys=['a', 'b', 'c', 'd'])
+    m.save(str(path))
+
+    loaded = NoteIncidenceMatrix.load(str(path))
+    assert loaded.vocabulary == m.vocabulary
+    assert loaded.keys == ['a', 'b', 'c', 'd']
+    assert (loaded.matrix != m.matrix).nnz == 0
@@ -0,0 +1,83 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import spearmanr
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from etl_v5 import ELIGIBLE_MIN_RATINGS, XSOLVE_WEIGHTS, ETLPipelineV5
+from xsolve_experiments import XsolveExperiment, random_weights, weight_grid
+
+NOTES = ['Bergamot', 'Lemon', 'Rose', 'Musk', 'Amber', 'Vanilla', 'Iris', 'Oud']
+
+@pytest.fixture
+def scored():
+    rng = np.random.default_rng(7)
+    n = 120
+    pipeline = ETLPipelineV5("dummy.csv")
+    pipeline.df = pd.DataFrame({
+        'Brand': [f'B{i % 9}' for i in range(n)],
+        'Name': [f'P{i}' for i in range(n)],
+        # Enough perfumes over 400 ratings that no fallback threshold is used
+        'Rating Count': rng.integers(50, 5000, n),
+        'Gender': rng.choice(['Male', 'Female', 'Unisex'], n),
+        'Top Notes': [', '.join(rng.choice(NOTES, rng.integers(1, 4), replace=False)) for _ in range(n)],
+        'Middle Notes': [', '.join(rng.choice(NOTES, rng.integers(0, 3), replace=False)) for _ in range(n)],
+        'Base Notes': [', '.join(rng.choice(NOTES, rng.integers(1, 3), replace=False)) for _ in range(n)],
+        'URL': 'http://x',
+    })
+    pipeline.df['fingerprint_strict'] = [f'fp{i}' for i in range(n)]
+    pipeline.calculate_xsolve_score()
+    return pipeline
+
+def test_weight_grid_covers_the_simplex():
+    grid = weight_grid(0.25)
+    # C(4 + 3, 3) vectors of quarters summing to 1
+    assert grid.shape == (35, 4)
+    np.testing.assert_allclose(grid.sum(axis=1), 1.0)
+    assert len(np.unique(grid, axis=0)) == 35
+    np.testing.assert_allclose(random_weights(10).sum(axis=1), 1.0)
+
+def test_baseline_reproduces_the_pipeline_scores(scored):
+    experiment = XsolveExperiment(scored.df, scored)
+    rows, scores = experiment.baseline()
+
+    expected = scored.df['xsolve_score'].to_numpy(dtype=float)
+    assert rows.tolist() == np.flatnonzero(~np.isnan(expected)).tolist()
+    np.testing.assert_allclose(scores, expected[rows], rtol=1e-12)
+
+def test_exact_sweep_matches_direct_computation(scored):
+    experiment = XsolveExperiment(scored.df, scored, sample_rows=None)
+    weights = np.vstack([[XSOLVE_WEIGHTS[c] for c in XSOLVE_WEIGHTS], [0.0, 0.0, 1.0, 0.0], random_weights(3)])
+
+    report = experiment.sweep(weights, thresholds=[200, ELIGIBLE_MIN_RATINGS])
+
+    assert len(report) == 10
+    production = report.iloc[5]
+    assert production['threshold'] == ELIGIBLE_MIN_RATINGS
+    assert production['spearman'] == pytest.approx(1.0)
+
+    base_rows, base_scores = experiment.baseline()
+    counts = scored.df['Rating Count'].to_numpy()
+    for i, row in report.iterrows():
+        rows, matrix = experiment.components(row['threshold'])
+        assert row['eligible'] == (counts >= row['threshold']).sum() == len(rows)
+        scores = np.clip(matrix @ weights[i % 5], 0.0, 1.0)
+        assert row['mean'] == pytest.approx(scores.mean())
+        assert row['std'] == pytest.approx(scores.std(), abs=1e-9)
+        assert [row['p10'], row['p50'], row['p90']] == pytest.approx(np.quantile(scores, [0.1, 0.5, 0.9]))
+        # The note count component alone is full of ties
+        shared = np.isin(rows, base_rows)
+        expected = spearmanr(scores[shared], base_scores[np.isin(base_rows, rows)]).statistic
+        assert row['spearman'] == pytest.approx(expected)
+
+def test_sampled_sweep_keeps_exact_moments(scored):
+    weights = weight_grid(0.2)
+    exact = XsolveExperiment(scored.df, scored, sample_rows=None).sweep(weights)
+    sampled = XsolveExperiment(scored.df, scored, sample_rows=40).sweep(weights)
+
+    np.testing.assert_allclose(sampled['mean'], exact['mean'])
+    np.testing.assert_allclose(sampled['std'], exact['std'], atol=1e-9)
+    assert sampled['p50'].between(0, 1).all()
+    assert sampled['spearman'].dropna().between(-1, 1).all()
@@ -3,17 +3,10 @@ import sys
 import pytest
 import pandas as pd
 import numpy as np
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
-# Mock environment
-os.environ["SUPABASE_URL"] = "http://mock"
-os.environ["SUPABASE_SERVICE_ROLE_KEY"] = "mock"
-
-# Mock Supabase before importing
-with patch('supabase.create_client') as mock_create:
-    mock_create.return_value = MagicMock()
-    sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
-    from etl_v5 import ETLPipelineV5
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+from etl_v5 import ETLPipelineV5
 
 @pytest.fixture
 def etl():
@@ -77,3 +70,44 @@ def test_note_extraction_robustness(etl):
     p1_notes = etl.df.iloc[0]['notes_list']
     assert "Citrus" in p1_notes
     assert "Woody" in p1_notes
+
+def test_extract_note_pyramids_tiers(etl):
+    etl.df.loc[0, 'Top Notes'] = 'Bergamot Absolute, Lemon, Bergamot'
+    etl.extract_note_pyramids()
+
+    row = etl.df.iloc[0]
+    assert row['top_notes'] == ['Bergamot', 'Lemon']
+    assert row['middle_notes'] == ['Rose']
+    assert row['base_notes'] == ['Musk']
+    # No 'Perfumers' column in the fixture
+    assert row['perfumers'] == []
+    assert row['notes_list'] == ['Bergamot', 'Lemon', 'Rose', 'Musk']
+    assert row['note_count'] == 4
+
+    # Scoring reuses the parsed pyramids instead of re-extracting them
+    with patch.object(etl, '_extract_list_cleaned') as extract:
+        etl.calculate_xsolve_score()
+        extract.assert_not_called()
+
+def test_xsolve_scores_match_reference_values(etl):
+    # Reference values produced by the row-wise (apply-based) implementation
+    expected = {
+        'obscurity_raw': [0.0, 0.4296458322731458, 0.09821351960280555, 0.6521591519140078],
+        'gender_adj_raw': [0.5, 1.0, 1.0, 1.0],
+        'note_count_factor_raw': [1.0, 0.8613531161467861, 0.8613531161467861, 0.8613531161467861],
+        'note_rarity_raw': [0.9100529100529101, 1.0, 0.9029982363315698, 0.8747795414462082],
+        'xsolve_score': [0.4365079365079365, 0.7510613003312763, 0.6039381107128756, 0.8212835594045523],
+    }
+    etl.calculate_xsolve_score()
+
+    for column, values in expected.items():
+        np.testing.assert_allclose(etl.df[column].to_numpy(dtype=float), values, rtol=1e-9)
+
+def test_xsolve_non_eligible_rows_are_null(etl):
+    etl.df['Rating Count'] = [1000, 5, 500, 10]
+    etl.calculate_xsolve_score()
+
+    p2 = etl.df[etl.df['Name'] == 'P2'].iloc[0]
+    assert np.isnan(p2['xsolve_score'])
+    assert np.isnan(p2['gender_adj_raw'])
+    assert etl.df['xsolve_score'].dropna().between(0, 1).all()